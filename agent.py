@@ -3,11 +3,18 @@ from typing import TypedDict, Annotated, Sequence
 from langchain_openai import ChatOpenAI
 from langchain_tavily import TavilySearch
 from langchain_core.messages import BaseMessage
+from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.prebuilt import ToolNode, tools_condition
 from dotenv import load_dotenv
+from scan_tool import get_scan_tool
+from knowledge_base import get_knowledge_base
+from prefetch import PREFETCH_WAIT, Prefetcher
+from compact_checkpoint import CompactSerializer
+from message_search import IndexedSqliteSaver
+from llm_resilience import ResilientCaller
 import sqlite3
 
 # Load .env file and override any existing environment variables
@@ -26,26 +33,76 @@ if tavily_key:
 else:
     print("WARNING: TAVILY_API_KEY not found - search functionality will not work")
 
+# Check the scan allowlist now, so a bad SCAN_ALLOWED_NETWORKS is reported at startup
+if not get_scan_tool().networks:
+    print("Port scanning is disabled (set SCAN_ALLOWED_NETWORKS to enable it)")
+
 # Define the state of our agent with memory support
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
 
 # Initialize Tavily search tool for real-time information
 search_tool = TavilySearch(max_results=3)
-tools = [search_tool]
+
+@tool
+def knowledge_base_search(query: str) -> str:
+    """Search Greenfield's vetted local guides for standard cybersecurity guidance and
+    instructions for our tools. Fast and offline; try this before web search."""
+    # The index is built with `python knowledge_base.py --build` and opened on first use
+    return get_knowledge_base().format_results(query)
+
+@tool
+def port_scan(target: str, ports: str = "top100") -> str:
+    """Check which ports are open on a host the customer asks about, e.g. "is port 3389 open on my server".
+    `target` is a hostname or IPv4 address. `ports` is a port list such as "3389", "22,80,443",
+    "8000-8100", "top100" (most common TCP ports) or "U:53,161" for UDP. Only hosts on networks
+    this service is allowed to scan can be checked; recent results are reused for a few minutes.
+    Returns JSON listing the open ports, or an error to explain to the customer."""
+    return get_scan_tool().run(target, ports)
+
+tools = [knowledge_base_search, search_tool, port_scan]
+
+# Background searches started by the prefetch node for messages naming CVEs, advisories or malware
+prefetcher = Prefetcher(search_tool.invoke)
+
+# How to use the knowledge base; kept separate so knowledge_base.py --tool-calls can leave it out
+KNOWLEDGE_BASE_PROMPT = """You have access to a knowledge_base_search tool over Greenfield's vetted guides. Use it first when you need reference material for standard guidance or questions about our tools.
+
+"""
 
 # System prompt for cybersecurity customer support
-SYSTEM_PROMPT = """You are an AI customer support chat bot for a cybersecurity firm. You will identify yourself at the start of each new conversation as Greenfield the CyberSecurity Professional and you will politely ask for the user's name. When they have provided their name to you, you will politely ask how you can help them with their cyber security request or concern. If you receive requests which do not seem to be related to the topic of cyber security you will politely request to refer them to a human agent. Please refrain from identifying yourself as an AI entity during any conversation, as end users are already aware of this information.
+SYSTEM_PROMPT = f"""You are an AI customer support chat bot for a cybersecurity firm. You will identify yourself at the start of each new conversation as Greenfield the CyberSecurity Professional and you will politely ask for the user's name. When they have provided their name to you, you will politely ask how you can help them with their cyber security request or concern. If you receive requests which do not seem to be related to the topic of cyber security you will politely request to refer them to a human agent. Please refrain from identifying yourself as an AI entity during any conversation, as end users are already aware of this information.
 
-You have access to a search tool that can look up current information about cybersecurity threats, vulnerabilities, best practices, and recent security news. Use this tool when you need up-to-date information or when answering questions about specific threats, CVEs, or recent security incidents.
+{KNOWLEDGE_BASE_PROMPT}You also have a web search tool that can look up current information about cybersecurity threats, vulnerabilities, and recent security news. Use it only when the knowledge base has nothing relevant, or when the question needs up-to-date information such as specific recent threats, CVEs, or security incidents.
+
+You also have a port_scan tool that checks which ports are open on a host. Use it when the user asks whether specific ports or services are exposed on one of their hosts, checking only the ports relevant to the question. If it returns an error (for example, the host is outside the networks you are permitted to scan), explain that to the user instead of retrying.
 
 IMPORTANT: When the user says "Good bye" (or variations like "Goodbye", "good-bye"), you must acknowledge their farewell and ALWAYS end your response with exactly: "Thank you for using Greenfield"""
 
+# Deadlines, hedged requests, retries and the circuit breaker for model calls
+llm_caller = ResilientCaller()
+
 # Initialize the model with system prompt and bind tools
-model = ChatOpenAI(model="gpt-4o", temperature=0).bind_tools(tools)
+# The client's own retries are off; llm_caller retries, and its timeout bounds abandoned hedges
+model = ChatOpenAI(model="gpt-4o", temperature=0, timeout=llm_caller.timeout, max_retries=0).bind_tools(tools)
+
+def prefetch_search(state: AgentState, config: RunnableConfig):
+    """
+    Entry node: if the new message names a CVE, advisory or malware family,
+    start a web search for it now, so call_model can give the results to the
+    model on its first call instead of a separate search round-trip.
+    """
+    from langchain_core.messages import HumanMessage
+    
+    last_message = state['messages'][-1]
+    if isinstance(last_message, HumanMessage):
+        entities = prefetcher.start(config["configurable"]["thread_id"], last_message.content)
+        if entities:
+            print(f"Prefetching search results for: {', '.join(entities)}")
+    return {}
 
 # Define the logic: a simple node that calls the LLM
-def call_model(state: AgentState):
+def call_model(state: AgentState, config: RunnableConfig):
     messages = state['messages']
     
     # Add system prompt as the first message if this is a new conversation
@@ -73,7 +130,23 @@ def call_model(state: AgentState):
         goodbye_variations = ["good bye", "goodbye", "good-bye", "goodby"]
         is_goodbye = any(variation in last_user_message for variation in goodbye_variations)
     
-    response = model.invoke(messages_with_system)
+    # The /chat endpoint passes the end of its request budget as __deadline
+    deadline = config["configurable"].get("__deadline")
+    
+    # First call of a turn: wait (bounded) for prefetched search results, so one model call can answer
+    thread_id = config["configurable"]["thread_id"]
+    first_call = isinstance(messages[-1], HumanMessage)
+    context = prefetcher.poll(thread_id, PREFETCH_WAIT) if first_call else None
+    if context:
+        # Prefetched search results go just before the question (not saved to history)
+        messages_with_system = list(messages_with_system[:-1]) + [SystemMessage(content=context), messages[-1]]
+    
+    response = llm_caller.call(lambda: model.invoke(messages_with_system), deadline=deadline)
+    
+    # A search still in flight answers the web search the model asked for (see run_tools), and is dropped otherwise
+    if first_call and prefetcher.has(thread_id):
+        if not any(call["name"] == search_tool.name for call in getattr(response, "tool_calls", None) or []):
+            prefetcher.discard(thread_id)
     
     # Ensure proper ending for goodbye messages
     if is_goodbye:
@@ -90,16 +163,48 @@ def call_model(state: AgentState):
     
     return {"messages": [response]}
 
+tool_node = ToolNode(tools)
+
+def run_tools(state: AgentState, config: RunnableConfig):
+    """
+    Run the tool calls of the model's last response. A web search the model
+    asked for while the prefetched search was still running is answered with
+    the prefetched results; every other call runs as usual.
+    """
+    from langchain_core.messages import AIMessage, ToolMessage
+    
+    last_message = state['messages'][-1]
+    calls = list(last_message.tool_calls)
+    thread_id = config["configurable"]["thread_id"]
+    results = {}
+    for call in calls:
+        if call["name"] == search_tool.name and prefetcher.has(thread_id):
+            context = prefetcher.take(thread_id)
+            if context:
+                results[call["id"]] = ToolMessage(content=context, name=call["name"], tool_call_id=call["id"])
+    
+    remaining = [call for call in calls if call["id"] not in results]
+    if remaining:
+        output = tool_node.invoke({"messages": [AIMessage(content=last_message.content, tool_calls=remaining)]}, config)
+        for message in output["messages"]:
+            results[message.tool_call_id] = message
+    
+    return {"messages": [results[call["id"]] for call in calls if call["id"] in results]}
+
 # Initialize SQLite connection and checkpointer for memory persistence
+# Messages are stored once as shared compressed blobs instead of in every checkpoint,
+# and new messages are added to the full-text search index as checkpoints are written
 conn = sqlite3.connect("checkpoints.db", check_same_thread=False)
-memory = SqliteSaver(conn)
+memory = IndexedSqliteSaver(conn, serde=CompactSerializer("checkpoints.db"))
 
 # Define the Graph with tools
 workflow = StateGraph(AgentState)
+workflow.add_node("prefetch", prefetch_search)
 workflow.add_node("agent", call_model)
-workflow.add_node("tools", ToolNode(tools))
+workflow.add_node("tools", run_tools)
 
-workflow.set_entry_point("agent")
+workflow.set_entry_point("prefetch")
+workflow.add_edge("prefetch", "agent")
 
 # Add conditional edges - if tools are called, go to tools node, otherwise end
 workflow.add_conditional_edges(
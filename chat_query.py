@@ -1,11 +1,80 @@
 import requests
+import argparse
 import json
+import math
+import random
 import sys
 import os
+import threading
+import time
+import uuid
+from requests.adapters import HTTPAdapter
 
 # File to store the current thread ID for conversation persistence
 THREAD_FILE = ".chat_thread_id"
 
+# Retries for dropped connections, timeouts and gateway errors. Every attempt
+# sends the same Idempotency-Key, so the server runs the message only once.
+MAX_RETRIES = 3
+RETRY_STATUSES = (502, 503, 504)
+REQUEST_TIMEOUT = 120
+
+DEFAULT_URL = "http://localhost:8000/chat"
+
+# Questions load-test users pick from
+LOAD_MESSAGES = [
+    "Hi, my name is Sam.",
+    "How do I set up two-factor authentication for my team?",
+    "What should I do if I clicked a phishing link?",
+    "Is CVE-2024-3400 being actively exploited?",
+    "How often should we rotate our VPN credentials?",
+    "What are the signs of a ransomware infection?",
+    "Can you recommend a backup strategy for a small office?",
+    "How do I check whether port 3389 is exposed on my server?",
+]
+
+def create_session(pool_size=10):
+    """HTTP session that keeps connections to the server open between requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+_session = None
+
+def get_session():
+    """Shared keep-alive session for this process."""
+    global _session
+    if _session is None:
+        _session = create_session()
+    return _session
+
+def post_chat(message, url=DEFAULT_URL, thread_id=None, session=None, retries=MAX_RETRIES):
+    """
+    POST a message to the chat API and return the response. Connection
+    errors, timeouts and 502/503/504 are retried up to `retries` times with
+    the same Idempotency-Key; other errors are left to the caller.
+    """
+    session = session or get_session()
+    body = {"message": message}
+    if thread_id:
+        body["thread_id"] = thread_id
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(url, headers=headers, json=body, timeout=REQUEST_TIMEOUT)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+        delay = 2 ** attempt
+        print(f"\033[93mRequest failed, retrying in {delay}s ({attempt + 1}/{retries})...\033[0m", file=sys.stderr)
+        time.sleep(delay)
+
 def load_thread_id():
     """Load the thread ID from file if it exists."""
     if os.path.exists(THREAD_FILE):
@@ -25,7 +94,7 @@ def clear_thread_id():
         print("\033[93mCleared conversation history. Starting new conversation.\033[0m")
         print()
 
-def query_chat_api(message, url="http://localhost:8000/chat", thread_id=None):
+def query_chat_api(message, url=DEFAULT_URL, thread_id=None, session=None):
     """
     Send a message to the chat API and return the response.
     
@@ -33,22 +102,14 @@ def query_chat_api(message, url="http://localhost:8000/chat", thread_id=None):
         message: The message to send to the API
         url: The API endpoint URL (default: http://localhost:8000/chat)
         thread_id: Optional thread ID to continue a conversation
+        session: Optional requests session (default: a shared keep-alive session)
     
     Returns:
         dict: The JSON response from the API
     """
-    # Format the request body
-    body = {"message": message}
-    if thread_id:
-        body["thread_id"] = thread_id
-    
     try:
-        # Submit the query via POST request
-        response = requests.post(
-            url,
-            headers={"Content-Type": "application/json"},
-            json=body
-        )
+        # Submit the query via POST request on the keep-alive session
+        response = post_chat(message, url, thread_id, session)
         
         # Check if request was successful
         response.raise_for_status()
@@ -56,8 +117,8 @@ def query_chat_api(message, url="http://localhost:8000/chat", thread_id=None):
         # Parse the JSON response
         result = response.json()
         
-        # Save thread ID for conversation continuity
-        if "thread_id" in result:
+        # Save thread ID for conversation continuity (only when it changes)
+        if result.get("thread_id") and result["thread_id"] != thread_id:
             save_thread_id(result["thread_id"])
         
         # Print status
@@ -84,17 +145,178 @@ def query_chat_api(message, url="http://localhost:8000/chat", thread_id=None):
         sys.exit(1)
 
 
+def print_response(result):
+    """Display the response in a user-friendly format."""
+    print("\033[96mResponse:\033[0m")
+    if "response" in result:
+        print(result["response"])
+    else:
+        # If response structure is different, print the entire result
+        print(json.dumps(result, indent=2))
+
+
+def interactive(url=DEFAULT_URL):
+    """
+    Chat in a loop over one keep-alive connection. The thread ID is kept in
+    memory and written to THREAD_FILE only when it changes.
+    Commands: /new starts a new conversation, /thread shows the thread ID,
+    /quit (or Ctrl-D) exits.
+    """
+    session = get_session()
+    thread_id = load_thread_id()
+    if thread_id:
+        print(f"\033[94mContinuing conversation (thread: {thread_id[:8]}...)\033[0m")
+    print("Type /new for a new conversation, /quit to exit.")
+    print()
+    
+    while True:
+        try:
+            message = input("\033[92mYou:\033[0m ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not message:
+            continue
+        if message in ("/quit", "/exit"):
+            break
+        if message == "/new":
+            clear_thread_id()
+            thread_id = None
+            continue
+        if message == "/thread":
+            print(thread_id or "No conversation yet")
+            continue
+        
+        started = time.perf_counter()
+        try:
+            response = post_chat(message, url, thread_id, session)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"\033[91mError: {e}\033[0m", file=sys.stderr)
+            continue
+        
+        if result.get("thread_id") and result["thread_id"] != thread_id:
+            thread_id = result["thread_id"]
+            save_thread_id(thread_id)
+        print_response(result)
+        print(f"\033[90m({time.perf_counter() - started:.1f}s)\033[0m")
+        print()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile: the smallest value with at least `fraction` of the values at or below it."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+def run_load(users, url=DEFAULT_URL, duration=60.0, turns=None, think_time=2.0):
+    """
+    Simulate `users` concurrent users, each holding its own conversation
+    thread and keep-alive session, sending messages with an exponentially
+    distributed think time between them. Runs for `duration` seconds, or until
+    each user has sent `turns` messages. Failed requests are not retried, so
+    the error rate is what the server returned.
+    """
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def user(number):
+        session = create_session(pool_size=1)
+        thread_id = None
+        rng = random.Random(number)
+        # Spread user start times so they do not all arrive at once
+        if stop.wait(rng.uniform(0, think_time)):
+            return
+        sent = 0
+        while not stop.is_set() and (turns is None or sent < turns):
+            started = time.perf_counter()
+            error = None
+            try:
+                response = post_chat(rng.choice(LOAD_MESSAGES), url, thread_id, session, retries=0)
+                if response.ok:
+                    thread_id = response.json().get("thread_id", thread_id)
+                else:
+                    error = f"HTTP {response.status_code}"
+            except requests.exceptions.Timeout:
+                error = "timeout"
+            except requests.exceptions.ConnectionError:
+                error = "connection error"
+            except (requests.exceptions.RequestException, ValueError) as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    latencies.append(elapsed)
+            sent += 1
+            stop.wait(rng.expovariate(1 / think_time) if think_time > 0 else 0)
+        session.close()
+
+    print(f"Load test: {users} users against {url}, think time {think_time}s, "
+          + (f"{turns} turns each" if turns else f"{duration:.0f}s"))
+    workers = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(users)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    try:
+        deadline = started + duration if turns is None else None
+        for worker in workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    stop.set()
+    for worker in workers:
+        worker.join(REQUEST_TIMEOUT)
+    elapsed = time.perf_counter() - started
+
+    failed = sum(errors.values())
+    total = len(latencies) + failed
+    print(f"\nRequests:   {total} in {elapsed:.1f}s ({total / elapsed:.2f}/s)")
+    print(f"Succeeded:  {len(latencies)}")
+    print(f"Errors:     {failed} ({failed / total:.1%})" if total else "Errors:     0")
+    for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+        print(f"  {error}: {count}")
+    if latencies:
+        print("Latency (successful requests):")
+        for label, fraction in (("p50", 0.50), ("p90", 0.90), ("p95", 0.95), ("p99", 0.99)):
+            print(f"  {label}: {percentile(latencies, fraction) * 1000:8.0f} ms")
+        print(f"  max: {max(latencies) * 1000:8.0f} ms")
+
+
 def main():
-    # Check for special commands
-    if len(sys.argv) > 1 and sys.argv[1] == "--new":
+    parser = argparse.ArgumentParser(description='Chat with the AI agent from the command line')
+    parser.add_argument('message', nargs='*', help='Message to send (default: a sample question)')
+    parser.add_argument('--new', action='store_true', help='Start a new conversation')
+    parser.add_argument('-i', '--interactive', action='store_true', help='Chat in a loop over one keep-alive connection')
+    parser.add_argument('--url', default=DEFAULT_URL, help=f'Chat endpoint (default: {DEFAULT_URL})')
+    parser.add_argument('--load', type=int, metavar='USERS', help='Simulate this many concurrent users and report latency')
+    parser.add_argument('--duration', type=float, default=60.0, help='Load test length in seconds (default: 60)')
+    parser.add_argument('--turns', type=int, help='Messages per user, instead of a fixed duration')
+    parser.add_argument('--think-time', type=float, default=2.0, help='Mean seconds between a user\'s messages (default: 2)')
+    args = parser.parse_args()
+    
+    if args.load:
+        run_load(args.load, args.url, args.duration, args.turns, args.think_time)
+        return
+    
+    if args.new:
         clear_thread_id()
-        if len(sys.argv) > 2:
-            message = " ".join(sys.argv[2:])
-        else:
-            print("Usage: python chat_query.py --new <message>")
-            sys.exit(0)
-    elif len(sys.argv) > 1:
-        message = " ".join(sys.argv[1:])
+    
+    if args.interactive:
+        interactive(args.url)
+        return
+    
+    if args.message:
+        message = " ".join(args.message)
+    elif args.new:
+        print("Usage: python chat_query.py --new <message>")
+        sys.exit(0)
     else:
         message = "Who will win the Super Bowl in 2026?"
     
@@ -102,15 +324,8 @@ def main():
     thread_id = load_thread_id()
     
     # Query the API
-    result = query_chat_api(message, thread_id=thread_id)
-    
-    # Display the response in a user-friendly format
-    print("\033[96mResponse:\033[0m")
-    if "response" in result:
-        print(result["response"])
-    else:
-        # If response structure is different, print the entire result
-        print(json.dumps(result, indent=2))
+    result = query_chat_api(message, url=args.url, thread_id=thread_id)
+    print_response(result)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,380 @@
+"""
+Compact Checkpoints - Deduplicated, Compressed Serializer for SqliteSaver
+SqliteSaver stores the whole message history in every checkpoint, so a long
+thread keeps many near-identical copies of it. CompactSerializer is a drop-in
+`serde` for SqliteSaver that stores each message once as a content-addressed
+blob (keyed by its hash) and writes checkpoints as a list of blob references
+plus the compressed remainder. A turn only writes blobs for its new messages.
+
+Payloads are compressed with zstd when the zstandard package is installed and
+zlib otherwise. Checkpoints written by the default serializer are still read.
+
+Usage:
+    memory = SqliteSaver(conn, serde=CompactSerializer("checkpoints.db"))
+
+    python compact_checkpoint.py --benchmark    # size of a 50-turn thread
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPACT_TYPE = "compact"
+COMPRESSED_TYPE = "z"
+
+# Values smaller than this are stored uncompressed
+MIN_COMPRESS_SIZE = 256
+
+# Serialized messages remembered per process, to skip re-hashing them every turn
+CACHE_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_blobs (
+    hash TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    raw_size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_lists (
+    list_hash TEXT PRIMARY KEY,
+    parent TEXT,
+    refs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compact_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Bumped by every prune that deletes rows, so serializers drop cached row knowledge
+PRUNE_GENERATION = "prune_generation"
+
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 9)
+    return data
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Checkpoint was written with zstd; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def pack_payload(header: Dict, body: bytes) -> bytes:
+    """Checkpoint payload: 4-byte header length, JSON header, compressed body."""
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return struct.pack(">I", len(header_bytes)) + header_bytes + body
+
+
+def unpack_header(payload: bytes) -> Tuple[Dict, int]:
+    """Read a payload's header without decompressing its body; returns (header, body offset)."""
+    (length,) = struct.unpack(">I", payload[:4])
+    return json.loads(payload[4:4 + length]), 4 + length
+
+
+def prune_generation(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM compact_meta WHERE key = ?", (PRUNE_GENERATION,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_prune_generation(conn: sqlite3.Connection):
+    """Record that blobs or lists were deleted; call inside the deleting transaction."""
+    conn.execute(
+        "INSERT INTO compact_meta (key, value) VALUES (?, 1) ON CONFLICT (key) DO UPDATE SET value = value + 1",
+        (PRUNE_GENERATION,),
+    )
+
+
+def _chain(parent: str, digest: str) -> str:
+    return hashlib.blake2b(f"{parent}:{digest}".encode(), digest_size=16).hexdigest()
+
+
+class CompactSerializer:
+    """
+    SerializerProtocol implementation that deduplicates message lists.
+    Each message is a blob keyed by its hash. A message list is stored as a
+    chain: its id hashes the id of its prefix with the last message, and a
+    row holds only the messages appended since the longest prefix already
+    stored. A checkpoint keeps just the list id, so a turn writes rows for its
+    new messages only, whatever the thread length.
+
+    The caches of known hashes, blobs and lists are only touched under
+    self.lock and only filled with committed rows. prune_message_blobs bumps a
+    generation counter in the database, which makes every serializer using it
+    drop its caches before its next read or write.
+    """
+
+    def __init__(self, db_path: str = "checkpoints.db", inner: Any = None, codec: str = None):
+        if inner is None:
+            from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+            inner = JsonPlusSerializer()
+        self.inner = inner
+        self.codec = codec or default_codec()
+        # Own connection: SqliteSaver serializes outside its lock for checkpoints
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # id(message) -> (message, hash, raw_size); holding the message keeps its id unique
+        self.hashes: "OrderedDict[int, Tuple[Any, str, int]]" = OrderedDict()
+        # hash -> (type, serialized bytes) for loads
+        self.blobs: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        # list hashes known to be stored
+        self.lists: "OrderedDict[str, bool]" = OrderedDict()
+        # The caches above are only valid while no prune has run since they were filled
+        self.generation = prune_generation(self.conn)
+
+    def _remember(self, cache: OrderedDict, key, value):
+        """Add a cache entry; the caller holds self.lock."""
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+    def _check_generation(self):
+        """Forget cached rows if a prune has deleted rows since; the caller holds self.lock."""
+        generation = prune_generation(self.conn)
+        if generation != self.generation:
+            self.hashes.clear()
+            self.blobs.clear()
+            self.lists.clear()
+            self.generation = generation
+
+    def _store_list(self, messages: List[Any]) -> Tuple[str, int]:
+        """Store a message list; returns its list hash and total serialized size."""
+        refs = []
+        raw_total = 0
+        new_hashes = []
+        new_blobs: Dict[str, Tuple[str, bytes]] = {}
+        with self.lock:
+            # Write lock first, so a prune cannot delete rows the caches vouch for until this commits
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._check_generation()
+                for message in messages:
+                    cached = self.hashes.get(id(message))
+                    if cached is not None and cached[0] is message:
+                        _, digest, raw_size = cached
+                    else:
+                        type_, data = self.inner.dumps_typed(message)
+                        digest = hashlib.blake2b(type_.encode() + b"\0" + data, digest_size=16).hexdigest()
+                        raw_size = len(data)
+                        new_hashes.append((message, digest, raw_size))
+                        if digest not in self.blobs:
+                            new_blobs[digest] = (type_, data)
+                    refs.append(digest)
+                    raw_total += raw_size
+
+                chain = [""]
+                for digest in refs:
+                    chain.append(_chain(chain[-1], digest))
+
+                if new_blobs:
+                    rows = []
+                    for digest, (type_, data) in new_blobs.items():
+                        codec = self.codec if len(data) >= MIN_COMPRESS_SIZE else "none"
+                        rows.append((digest, type_, codec, len(data), compress(data, codec)))
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO message_blobs (hash, type, codec, raw_size, data) VALUES (?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                if chain[-1] not in self.lists:
+                    # Longest prefix already stored: usually the previous checkpoint's list
+                    stored = 0
+                    for i in range(len(chain) - 1, 0, -1):
+                        if chain[i] in self.lists or self.conn.execute(
+                                "SELECT 1 FROM message_lists WHERE list_hash = ?", (chain[i],)).fetchone():
+                            stored = i
+                            break
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO message_lists (list_hash, parent, refs) VALUES (?, ?, ?)",
+                        (chain[-1], chain[stored] or None, json.dumps(refs[stored:])),
+                    )
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+            # Only rows that are now committed go into the caches
+            for message, digest, raw_size in new_hashes:
+                self._remember(self.hashes, id(message), (message, digest, raw_size))
+            for digest, blob in new_blobs.items():
+                self._remember(self.blobs, digest, blob)
+            self._remember(self.lists, chain[-1], True)
+        return chain[-1], raw_total
+
+    def _load_list(self, list_hash: str) -> List[Any]:
+        with self.lock:
+            self._check_generation()
+            rows = self.conn.execute(
+                "WITH RECURSIVE chain(list_hash, parent, refs, depth) AS ("
+                " SELECT list_hash, parent, refs, 0 FROM message_lists WHERE list_hash = ?"
+                " UNION ALL SELECT l.list_hash, l.parent, l.refs, c.depth + 1"
+                " FROM message_lists l JOIN chain c ON l.list_hash = c.parent)"
+                " SELECT refs FROM chain ORDER BY depth DESC",
+                (list_hash,),
+            ).fetchall()
+            if not rows:
+                raise KeyError(f"Checkpoint references a missing message list: {list_hash}")
+            refs = [digest for (row_refs,) in rows for digest in json.loads(row_refs)]
+            self._remember(self.lists, list_hash, True)
+
+            blobs = {digest: self.blobs[digest] for digest in set(refs) if digest in self.blobs}
+            missing = [digest for digest in set(refs) if digest not in blobs]
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                for digest, type_, codec, data in self.conn.execute(
+                        f"SELECT hash, type, codec, data FROM message_blobs WHERE hash IN ({','.join('?' * len(batch))})",
+                        batch):
+                    blobs[digest] = (type_, decompress(data, codec))
+                    self._remember(self.blobs, digest, blobs[digest])
+
+        messages = []
+        loaded = []
+        for digest in refs:
+            if digest not in blobs:
+                raise KeyError(f"Checkpoint references a missing message blob: {digest}")
+            message = self.inner.loads_typed(blobs[digest])
+            loaded.append((message, digest, len(blobs[digest][1])))
+            messages.append(message)
+        with self.lock:
+            # The next checkpoint of this thread will contain these same objects
+            for message, digest, raw_size in loaded:
+                self._remember(self.hashes, id(message), (message, digest, raw_size))
+        return messages
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if isinstance(obj, dict) and isinstance(obj.get("channel_values"), dict):
+            lists = {}
+            raw_size = 0
+            channel_values = dict(obj["channel_values"])
+            for channel, value in obj["channel_values"].items():
+                if isinstance(value, list) and value:
+                    lists[channel], size = self._store_list(value)
+                    raw_size += size
+                    channel_values[channel] = None
+            type_, data = self.inner.dumps_typed(dict(obj, channel_values=channel_values))
+            header = {"type": type_, "codec": self.codec, "lists": lists, "raw_size": raw_size + len(data)}
+            return COMPACT_TYPE, pack_payload(header, compress(data, self.codec))
+
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) < MIN_COMPRESS_SIZE:
+            return type_, data
+        header = {"type": type_, "codec": self.codec, "raw_size": len(data)}
+        return COMPRESSED_TYPE, pack_payload(header, compress(data, self.codec))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ not in (COMPACT_TYPE, COMPRESSED_TYPE):
+            return self.inner.loads_typed(data)
+        header, offset = unpack_header(payload)
+        obj = self.inner.loads_typed((header["type"], decompress(payload[offset:], header["codec"])))
+        if type_ == COMPACT_TYPE:
+            for channel, list_hash in header["lists"].items():
+                obj["channel_values"][channel] = self._load_list(list_hash)
+        return obj
+
+
+class _JsonSerializer:
+    """Plain JSON serializer used by the benchmark in place of LangGraph's."""
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return "json", json.dumps(obj).encode("utf-8")
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return json.loads(data[1])
+
+
+def benchmark(turns: int = 50):
+    """
+    Simulate a thread of `turns` question/answer pairs, writing one checkpoint
+    per turn the way SqliteSaver does, with and without compaction.
+    """
+    directory = tempfile.mkdtemp()
+    inner = _JsonSerializer()
+    compact = CompactSerializer(os.path.join(directory, "compact.db"), inner=inner)
+    compact.conn.execute("CREATE TABLE checkpoints (id INTEGER PRIMARY KEY, type TEXT, checkpoint BLOB)")
+    plain = sqlite3.connect(os.path.join(directory, "plain.db"))
+    plain.execute("CREATE TABLE checkpoints (id INTEGER PRIMARY KEY, type TEXT, checkpoint BLOB)")
+
+    filler = ("Enable multi-factor authentication on all administrator accounts, review firewall rules "
+              "for exposed management ports, and patch internet-facing services promptly. ")
+    messages = []
+    timings = {"plain": [], "compact": []}
+    for turn in range(turns):
+        messages = messages + [
+            {"type": "human", "id": f"h{turn}", "content": f"Question {turn}: how should we handle incident {turn}?"},
+            {"type": "ai", "id": f"a{turn}", "content": f"For incident {turn}: " + filler * 6},
+        ]
+        checkpoint = {"v": 1, "id": f"checkpoint-{turn}", "channel_values": {"messages": messages},
+                      "channel_versions": {"messages": turn}, "versions_seen": {}}
+
+        started = time.perf_counter()
+        plain.execute("INSERT INTO checkpoints (type, checkpoint) VALUES (?, ?)", inner.dumps_typed(checkpoint))
+        plain.commit()
+        timings["plain"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with compact.conn:
+            compact.conn.execute("INSERT INTO checkpoints (type, checkpoint) VALUES (?, ?)",
+                                 compact.dumps_typed(checkpoint))
+        timings["compact"].append(time.perf_counter() - started)
+
+    row = compact.conn.execute("SELECT type, checkpoint FROM checkpoints ORDER BY id DESC LIMIT 1").fetchone()
+    assert compact.loads_typed(row) == checkpoint, "round trip failed"
+
+    plain.close()
+    sizes = {}
+    for name, conn in (("plain", sqlite3.connect(os.path.join(directory, "plain.db"))), ("compact", compact.conn)):
+        conn.execute("VACUUM")
+        sizes[name] = conn.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()").fetchone()[0]
+
+    print(f"{turns}-turn thread, {len(messages)} messages, codec {compact.codec}:")
+    print(f"  Default serializer: {sizes['plain'] / 1024:8.1f} KB")
+    print(f"  Compact serializer: {sizes['compact'] / 1024:8.1f} KB ({sizes['plain'] / sizes['compact']:.1f}x smaller)")
+    for name in ("plain", "compact"):
+        first = sum(timings[name][:5]) / 5 * 1000
+        last = sum(timings[name][-5:]) / 5 * 1000
+        print(f"  {name:>7} write per turn: {first:.2f} ms at turn 1-5, {last:.2f} ms at turn {turns - 4}-{turns}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact checkpoint serializer')
+    parser.add_argument('--benchmark', action='store_true', help='Compare database size and write time for a simulated thread')
+    parser.add_argument('--turns', type=int, default=50, help='Turns in the simulated thread (default: 50)')
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.turns)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Pytest configuration. test_memory.py is a walkthrough script against a
+running server (python main.py), not a unit test, so it is not collected.
+"""
+
+collect_ignore = ["test_memory.py"]
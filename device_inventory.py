@@ -0,0 +1,219 @@
+"""
+Device Inventory - Persistent Record of Network Devices
+Keeps every device the network scanner has seen in a local SQLite database so
+that rescans can skip re-enriching hosts that have not changed, and reports
+what changed between runs (devices appearing, disappearing, ports changing).
+"""
+
+import ipaddress
+import json
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+DEFAULT_DB_PATH = "devices.db"
+
+# Re-enrich a known device at least this often even if nothing changed
+DEFAULT_MAX_AGE = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    device_key TEXT PRIMARY KEY,
+    mac TEXT,
+    ip TEXT NOT NULL,
+    hostname TEXT,
+    vendor TEXT,
+    open_ports TEXT NOT NULL DEFAULT '[]',
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_enriched REAL NOT NULL,
+    present INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices (ip);
+"""
+
+
+def device_key(ip: str, mac: str = None) -> str:
+    """Devices are identified by MAC where known, since IPs move around."""
+    if mac and mac != "Unknown":
+        return f"mac:{mac.upper()}"
+    return f"ip:{ip}"
+
+
+class DeviceInventory:
+    """SQLite-backed inventory of devices seen on the network."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _row_to_device(self, row: sqlite3.Row) -> Dict:
+        return {
+            'ip': row['ip'],
+            'mac': row['mac'] or "Unknown",
+            'vendor': row['vendor'] or "Unknown",
+            'hostname': row['hostname'] or "Unknown",
+            'open_ports': json.loads(row['open_ports']),
+        }
+
+    def get(self, ip: str, mac: str = None) -> Optional[sqlite3.Row]:
+        """
+        The stored record for a device, by MAC where known. Without a MAC (no
+        neighbour table, e.g. on macOS/Windows) the most recently seen record
+        at that IP is used, whether it was stored by MAC or by IP.
+        """
+        key = device_key(ip, mac)
+        row = self.conn.execute("SELECT * FROM devices WHERE device_key = ?", (key,)).fetchone()
+        if row is None and key.startswith("ip:"):
+            row = self.conn.execute(
+                "SELECT * FROM devices WHERE ip = ? ORDER BY last_seen DESC LIMIT 1", (ip,)
+            ).fetchone()
+        return row
+
+    def _merge_ip_record(self, ip: str, mac: str = None):
+        """Fold the record stored by IP for this address into the device's MAC record once the MAC is known."""
+        key = device_key(ip, mac)
+        ip_key = device_key(ip)
+        if key == ip_key:
+            return
+        ip_row = self.conn.execute("SELECT * FROM devices WHERE device_key = ?", (ip_key,)).fetchone()
+        if ip_row is None:
+            return
+        if self.conn.execute("SELECT 1 FROM devices WHERE device_key = ?", (key,)).fetchone() is None:
+            self.conn.execute("UPDATE devices SET device_key = ?, mac = ? WHERE device_key = ?", (key, mac, ip_key))
+        else:
+            self.conn.execute("UPDATE devices SET first_seen = MIN(first_seen, ?) WHERE device_key = ?",
+                              (ip_row['first_seen'], key))
+            self.conn.execute("DELETE FROM devices WHERE device_key = ?", (ip_key,))
+
+    def all_devices(self) -> List[Dict]:
+        rows = self.conn.execute("SELECT * FROM devices ORDER BY last_seen DESC").fetchall()
+        return [dict(self._row_to_device(row), first_seen=row['first_seen'],
+                     last_seen=row['last_seen'], present=bool(row['present'])) for row in rows]
+
+    def cached_device(self, ip: str, mac: str = None, max_age: float = DEFAULT_MAX_AGE) -> Optional[Dict]:
+        """
+        Return the stored record for a live host if it can be reused as-is:
+        the device is known, still at the same IP, and was enriched recently.
+        Returns None when the host is new, changed or stale.
+        """
+        row = self.get(ip, mac)
+        if row is None or row['ip'] != ip:
+            return None
+        if time.time() - row['last_enriched'] > max_age:
+            return None
+        return self._row_to_device(row)
+
+    def record_scan(self, devices: Iterable[Dict], network_ranges: Iterable[str],
+                    enriched: Iterable[str] = None) -> Dict[str, List]:
+        """
+        Store the results of a scan and return what changed since the last one.
+
+        `enriched` lists the IPs that were fully re-enriched this run (all of
+        them if omitted); only those refresh hostname, ports and last_enriched.
+        Devices previously present in the scanned ranges but not seen now are
+        marked absent and reported as disappeared. A host stored by IP because
+        its MAC was unknown is merged into its MAC record once the MAC is seen.
+        """
+        now = time.time()
+        devices = list(devices)
+        enriched = None if enriched is None else set(enriched)
+        networks = [ipaddress.ip_network(r, strict=False) for r in network_ranges]
+        changes = {'appeared': [], 'disappeared': [], 'changed': []}
+        seen_keys = set()
+
+        with self.conn:
+            for device in devices:
+                self._merge_ip_record(device['ip'], device['mac'])
+                row = self.get(device['ip'], device['mac'])
+                key = row['device_key'] if row is not None else device_key(device['ip'], device['mac'])
+                seen_keys.add(key)
+                was_enriched = enriched is None or device['ip'] in enriched
+                ports_json = json.dumps(sorted(device['open_ports']))
+
+                if row is None:
+                    changes['appeared'].append(device)
+                    self.conn.execute(
+                        "INSERT INTO devices (device_key, mac, ip, hostname, vendor, open_ports, "
+                        "first_seen, last_seen, last_enriched, present) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                        (key, device['mac'], device['ip'], device['hostname'], device.get('vendor'),
+                         ports_json, now, now, now if was_enriched else 0),
+                    )
+                    continue
+
+                change = self._diff(row, device, was_enriched)
+                if not row['present']:
+                    changes['appeared'].append(device)
+                elif change:
+                    changes['changed'].append(dict(change, ip=device['ip'], mac=device['mac']))
+
+                if was_enriched:
+                    self.conn.execute(
+                        "UPDATE devices SET ip = ?, hostname = ?, vendor = ?, open_ports = ?, "
+                        "last_seen = ?, last_enriched = ?, present = 1 WHERE device_key = ?",
+                        (device['ip'], device['hostname'], device.get('vendor'), ports_json, now, now, key),
+                    )
+                else:
+                    self.conn.execute(
+                        "UPDATE devices SET ip = ?, last_seen = ?, present = 1 WHERE device_key = ?",
+                        (device['ip'], now, key),
+                    )
+
+            for row in self.conn.execute("SELECT * FROM devices WHERE present = 1").fetchall():
+                if row['device_key'] in seen_keys:
+                    continue
+                address = ipaddress.ip_address(row['ip'])
+                if any(address in network for network in networks):
+                    changes['disappeared'].append(self._row_to_device(row))
+                    self.conn.execute("UPDATE devices SET present = 0 WHERE device_key = ?", (row['device_key'],))
+
+        return changes
+
+    def _diff(self, row: sqlite3.Row, device: Dict, was_enriched: bool) -> Dict:
+        change = {}
+        if row['ip'] != device['ip']:
+            change['old_ip'] = row['ip']
+        if not was_enriched:
+            return change
+        if (row['hostname'] or "Unknown") != device['hostname']:
+            change['old_hostname'] = row['hostname']
+            change['hostname'] = device['hostname']
+        old_ports = set(json.loads(row['open_ports']))
+        new_ports = set(device['open_ports'])
+        if old_ports != new_ports:
+            change['ports_opened'] = sorted(new_ports - old_ports)
+            change['ports_closed'] = sorted(old_ports - new_ports)
+        return change
+
+
+def print_changes(changes: Dict[str, List]):
+    """Print a scan diff in the scanner's report style."""
+    print("\n" + "=" * 60)
+    print("CHANGES SINCE LAST SCAN")
+    print("=" * 60)
+
+    if not any(changes.values()):
+        print("No changes detected.")
+        return
+
+    for device in changes['appeared']:
+        print(f"  + Appeared:    {device['ip']} - {device['hostname']} ({device['mac']})")
+    for device in changes['disappeared']:
+        print(f"  - Disappeared: {device['ip']} - {device['hostname']} ({device['mac']})")
+    for change in changes['changed']:
+        details = []
+        if 'old_ip' in change:
+            details.append(f"IP was {change['old_ip']}")
+        if 'hostname' in change:
+            details.append(f"hostname {change['old_hostname']} -> {change['hostname']}")
+        if change.get('ports_opened'):
+            details.append(f"ports opened {change['ports_opened']}")
+        if change.get('ports_closed'):
+            details.append(f"ports closed {change['ports_closed']}")
+        print(f"  ~ Changed:     {change['ip']} ({change['mac']}): {'; '.join(details)}")
@@ -0,0 +1,218 @@
+"""
+Fast Responses - orjson Encoding and Negotiated Compression for Chat Payloads
+/history returns the whole message list of a thread and /chat returns the
+model's answer, both of which grow with the conversation. This module encodes
+them with orjson, writing message lists straight from the checkpoint's message
+objects as JSON fragments instead of building a dict per message. Bodies above
+COMPRESS_MIN_SIZE are compressed with brotli or gzip, whichever the client
+accepts (brotli only when the brotli package is installed).
+
+Usage:
+    return json_response(request, {"thread_id": thread_id, "response": text})
+    return json_response(request, encode_history(thread_id, messages))
+
+    python fast_response.py --benchmark    # encode time and bytes vs. thread length
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from starlette.responses import Response
+except ImportError:
+    Response = None
+
+
+# Bodies smaller than this are sent uncompressed; the saving would not cover the CPU cost
+COMPRESS_MIN_SIZE = 1024
+
+# Fast settings suited to compressing every response on the fly
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Encoded `"type":"<ClassName>"` fragments, by message class
+_type_fragments: Dict[type, bytes] = {}
+
+
+def _type_fragment(cls: type) -> bytes:
+    fragment = _type_fragments.get(cls)
+    if fragment is None:
+        fragment = _type_fragments[cls] = b'{"type":' + orjson.dumps(cls.__name__) + b',"content":'
+    return fragment
+
+
+def encode_messages(messages: List[Any]) -> bytes:
+    """JSON array of {"type", "content"} for each message, without an intermediate dict per message."""
+    return b"[" + b",".join(_type_fragment(type(m)) + orjson.dumps(m.content) + b"}" for m in messages) + b"]"
+
+
+def encode_history(thread_id: str, messages: List[Any]) -> bytes:
+    """The /history response body for a thread's messages."""
+    return b'{"thread_id":' + orjson.dumps(thread_id) + b',"messages":' + encode_messages(messages) + b"}"
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best coding both sides support: brotli, then gzip, or None for identity."""
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress_body(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Compress a body for the client if it is large enough; returns (body, Content-Encoding or None)."""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    coding = choose_encoding(accept_encoding)
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), coding
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), coding
+    return body, None
+
+
+def _default(obj: Any):
+    # Pydantic models, e.g. response models handed over as they are
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def json_response(request: Any, content: Any, status_code: int = 200,
+                  headers: Dict[str, str] = None) -> "Response":
+    """
+    A JSON response for a Starlette/FastAPI request. `content` is encoded with
+    orjson unless it is already bytes (e.g. from encode_history), then
+    compressed according to the request's Accept-Encoding.
+    """
+    body = content if isinstance(content, bytes) else orjson.dumps(content, default=_default)
+    body, coding = compress_body(body, request.headers.get("accept-encoding", ""))
+    response = Response(body, status_code=status_code, headers=headers, media_type="application/json")
+    # Caches must key on Accept-Encoding whenever compression could apply
+    response.headers["Vary"] = "Accept-Encoding"
+    if coding:
+        response.headers["Content-Encoding"] = coding
+    return response
+
+
+def benchmark(lengths: List[int] = None, runs: int = 20):
+    """
+    Encode /history bodies for threads of increasing length: the previous path
+    (a dict per message, then the standard json encoder) against encode_history,
+    and the bytes sent with each compression.
+    """
+    lengths = lengths or [10, 50, 200, 1000]
+    # Messages of random words and addresses, so compression ratios are not flattered by repetition
+    words = ("we saw repeated failed logins on our vpn gateway from several countries overnight what should "
+             "check start by confirming mfa is enforced for every account then review the logs source addresses "
+             "and lock out accounts with failures known vulnerabilities such as on appliance apply vendor patches "
+             "firewall rule endpoint agent ransomware backup restore phishing email user password reset token "
+             "certificate expired server port open exposed scan alert incident response team escalate").split()
+    rng = random.Random(7)
+
+    # Stand-ins for LangChain messages; only the class name and content are encoded
+    class Message:
+        def __init__(self, content: str):
+            self.content = content
+
+    class HumanMessage(Message):
+        pass
+
+    class AIMessage(Message):
+        pass
+
+    def text(word_count: int) -> str:
+        parts = rng.choices(words, k=word_count)
+        parts.insert(rng.randrange(word_count), f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}")
+        parts.insert(rng.randrange(word_count), f"CVE-2024-{rng.randrange(1000, 9999)}")
+        return " ".join(parts).capitalize() + "."
+
+    try:
+        from fastapi.encoders import jsonable_encoder
+    except ImportError:
+        jsonable_encoder = None
+
+    def previous(thread_id: str, messages: List[Any]) -> bytes:
+        data = {"thread_id": thread_id,
+                "messages": [{"type": m.__class__.__name__, "content": m.content} for m in messages]}
+        if jsonable_encoder is not None:
+            data = jsonable_encoder(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def timed(fn, *args) -> Tuple[float, Any]:
+        result = None
+        started = time.perf_counter()
+        for _ in range(runs):
+            result = fn(*args)
+        return (time.perf_counter() - started) / runs * 1000, result
+
+    baseline_label = "dicts+jsonable_encoder+json" if jsonable_encoder is not None else "dicts+json"
+    print(f"/history encoding, {runs} runs per size (previous path: {baseline_label})")
+    print(f"{'messages':>8} {'previous ms':>12} {'orjson ms':>10} {'speedup':>8} {'raw KB':>8} "
+          f"{'gzip KB':>8} {'gzip ms':>8} {'br KB':>7} {'br ms':>7}")
+    for length in lengths:
+        messages = [HumanMessage(text(25)) if i % 2 == 0 else AIMessage(text(120)) for i in range(length)]
+        previous_ms, expected = timed(previous, "thread", messages)
+        fast_ms, body = timed(encode_history, "thread", messages)
+        assert orjson.loads(body) == json.loads(expected)
+        gzip_ms, gzipped = timed(lambda b: gzip.compress(b, compresslevel=GZIP_LEVEL, mtime=0), body)
+        if brotli is not None:
+            br_ms, brotlied = timed(lambda b: brotli.compress(b, quality=BROTLI_QUALITY), body)
+            br = f"{len(brotlied) / 1024:7.1f} {br_ms:7.2f}"
+        else:
+            br = f"{'n/a':>7} {'n/a':>7}"
+        print(f"{length:>8} {previous_ms:12.2f} {fast_ms:10.2f} {previous_ms / fast_ms:7.1f}x "
+              f"{len(body) / 1024:8.1f} {len(gzipped) / 1024:8.1f} {gzip_ms:8.2f} {br}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='orjson encoding and compression for chat responses')
+    parser.add_argument('--benchmark', action='store_true', help='Time /history encoding and compression by thread length')
+    parser.add_argument('--lengths', type=int, nargs='+', help='Thread lengths to benchmark (default: 10 50 200 1000)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.lengths)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Device Fingerprinting - Declarative Rule Engine
+Classifies device records (from network_scanner / passive_discovery) into
+device types using rules loaded from a JSON or YAML file. Rules are compiled
+once into indexed matchers: every regex for a field is folded into a single
+combined pattern, port conditions become bitmasks, and service types are
+looked up in a dict, so each device only evaluates the rules that one of its
+features can trigger.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Set
+
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fingerprint_rules.json")
+
+REGEX_FIELDS = ("hostname", "vendor", "announced", "banner")
+PORT_FIELDS = ("ports_all", "ports_any")
+MATCH_FIELDS = REGEX_FIELDS + PORT_FIELDS + ("services",)
+
+
+class CombinedRegex:
+    """
+    Match many patterns against a text in one pass. Each pattern becomes an
+    optional lookahead with a named group anchored at the start of the text,
+    so a single match() reports every pattern that occurs anywhere in it.
+    """
+
+    def __init__(self, patterns: Dict[int, str]):
+        self.pattern = None
+        if not patterns:
+            return
+        for rule_id, pattern in patterns.items():
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regex for rule #{rule_id}: {pattern!r} ({e})") from None
+        parts = "".join(f"(?=.*?(?P<r{rule_id}>(?:{pattern})))?" for rule_id, pattern in patterns.items())
+        self.pattern = re.compile("^" + parts, re.IGNORECASE | re.DOTALL)
+
+    def matches(self, text: str) -> Set[int]:
+        if self.pattern is None or not text:
+            return set()
+        found = self.pattern.match(text).groupdict()
+        return {int(name[1:]) for name, value in found.items() if value is not None}
+
+
+class RuleEngine:
+    """Compiled set of fingerprinting rules."""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = []
+        for rule in rules:
+            match = rule.get("match") or {}
+            unknown = set(match) - set(MATCH_FIELDS)
+            if not match or unknown:
+                raise ValueError(f"Rule {rule.get('name', '?')!r} needs match conditions from "
+                                 f"{', '.join(MATCH_FIELDS)}" + (f"; unknown: {sorted(unknown)}" if unknown else ""))
+            if not 0 < float(rule.get("score", 0)) <= 1:
+                raise ValueError(f"Rule {rule.get('name', '?')!r} needs a score between 0 and 1")
+            self.rules.append({
+                "name": rule.get("name", f"rule-{len(self.rules)}"),
+                "device_type": rule["device_type"],
+                "score": float(rule["score"]),
+                "match": match,
+            })
+        self._compile()
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_RULES_PATH) -> "RuleEngine":
+        """Load rules from a JSON file, or YAML if PyYAML is installed."""
+        with open(path, "r", encoding="utf-8") as f:
+            if path.lower().endswith((".yml", ".yaml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError("PyYAML is required to load YAML rule files") from None
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return cls(data["rules"] if isinstance(data, dict) else data)
+
+    def _compile(self):
+        # One bit per port that any rule mentions
+        ports = sorted({p for rule in self.rules for field in PORT_FIELDS for p in rule["match"].get(field, [])})
+        self.port_bits = {port: 1 << i for i, port in enumerate(ports)}
+
+        self.regexes = {}
+        for field in REGEX_FIELDS:
+            patterns = {i: rule["match"][field] for i, rule in enumerate(self.rules) if field in rule["match"]}
+            self.regexes[field] = CombinedRegex(patterns)
+
+        self.port_index: Dict[int, List[int]] = {}
+        self.service_index: Dict[str, List[int]] = {}
+        self.masks = []
+        for i, rule in enumerate(self.rules):
+            match = rule["match"]
+            all_mask = self._mask(match.get("ports_all", []))
+            any_mask = self._mask(match.get("ports_any", []))
+            self.masks.append((all_mask, any_mask))
+            for port in match.get("ports_all", []) + match.get("ports_any", []):
+                self.port_index.setdefault(port, []).append(i)
+            for service in match.get("services", []):
+                self.service_index.setdefault(service.lower(), []).append(i)
+
+    def _mask(self, ports: Iterable[int]) -> int:
+        mask = 0
+        for port in ports:
+            mask |= self.port_bits.get(port, 0)
+        return mask
+
+    @staticmethod
+    def _texts(device: Dict) -> Dict[str, str]:
+        announced = list(device.get("names") or [])
+        if device.get("ssdp_server"):
+            announced.append(device["ssdp_server"])
+        banners = device.get("banners") or []
+        if isinstance(banners, dict):
+            banners = list(banners.values())
+        return {
+            "hostname": "" if device.get("hostname") in (None, "Unknown") else device["hostname"],
+            "vendor": "" if device.get("vendor") in (None, "Unknown") else device["vendor"],
+            "announced": "\n".join(announced),
+            "banner": "\n".join(str(b) for b in banners),
+        }
+
+    def classify(self, device: Dict) -> List[Dict]:
+        """
+        Return the device types a device matches, highest confidence first,
+        as [{'device_type', 'confidence', 'rules'}]. Scores of rules for the
+        same type combine as independent evidence: 1 - prod(1 - score).
+        """
+        texts = self._texts(device)
+        regex_hits = {field: self.regexes[field].matches(texts[field]) for field in REGEX_FIELDS}
+        open_ports = device.get("open_ports") or []
+        port_mask = self._mask(open_ports)
+        service_hits = set()
+        for service in device.get("services") or []:
+            service_hits.update(self.service_index.get(service.lower(), []))
+
+        candidates = set(service_hits)
+        for hits in regex_hits.values():
+            candidates |= hits
+        for port in open_ports:
+            candidates.update(self.port_index.get(port, []))
+
+        results: Dict[str, Dict] = {}
+        for i in candidates:
+            rule = self.rules[i]
+            match = rule["match"]
+            if any(field in match and i not in regex_hits[field] for field in REGEX_FIELDS):
+                continue
+            all_mask, any_mask = self.masks[i]
+            if "ports_all" in match and port_mask & all_mask != all_mask:
+                continue
+            if "ports_any" in match and not port_mask & any_mask:
+                continue
+            if "services" in match and i not in service_hits:
+                continue
+
+            result = results.setdefault(rule["device_type"], {
+                "device_type": rule["device_type"], "confidence": 0.0, "rules": []})
+            result["confidence"] = 1 - (1 - result["confidence"]) * (1 - rule["score"])
+            result["rules"].append(rule["name"])
+
+        for result in results.values():
+            result["confidence"] = round(result["confidence"], 3)
+        return sorted(results.values(), key=lambda r: r["confidence"], reverse=True)
+
+    def classify_devices(self, devices: Iterable[Dict]) -> List[List[Dict]]:
+        return [self.classify(device) for device in devices]
+
+
+_default_engine = None
+
+
+def get_default_engine() -> RuleEngine:
+    """Load and compile the bundled rules once."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = RuleEngine.load(DEFAULT_RULES_PATH)
+    return _default_engine
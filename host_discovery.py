@@ -0,0 +1,293 @@
+"""
+Host Discovery - Fast Asynchronous Liveness Sweep
+Finds live hosts without forking a `ping` process per address. Each address is
+probed with concurrent TCP connects to a handful of ports (a refused connection
+still proves the host is up) and, where the kernel allows it, an unprivileged
+ICMP echo over a datagram socket. MAC addresses are read once from the kernel
+neighbor table instead of running `arp` per host.
+"""
+
+import asyncio
+import errno
+import socket
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Ports used for TCP "ping"; a mix of services found on PCs, servers and IoT devices
+DISCOVERY_PORTS = [80, 443, 22, 445, 139, 8080, 8443, 5000]
+
+# connect() errors that still mean something answered at that address
+ALIVE_ERRNOS = {errno.ECONNREFUSED, errno.ECONNRESET}
+
+NEIGHBOR_TABLE = "/proc/net/arp"
+
+_icmp_available = None
+
+
+def icmp_available() -> bool:
+    """Check once whether unprivileged ICMP datagram sockets are permitted."""
+    global _icmp_available
+    if _icmp_available is None:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            sock.close()
+            _icmp_available = True
+        except (OSError, AttributeError):
+            _icmp_available = False
+    return _icmp_available
+
+
+def _icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _icmp_echo_request(seq: int) -> bytes:
+    # The kernel rewrites the identifier on ping sockets, so 0 is fine here
+    payload = b"netscan"
+    header = struct.pack("!BBHHH", 8, 0, 0, 0, seq)
+    checksum = _icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", 8, 0, checksum, 0, seq) + payload
+
+
+async def icmp_ping(ip: str, timeout: float = 1.0) -> bool:
+    """Send one ICMP echo over an unprivileged datagram socket."""
+    loop = asyncio.get_running_loop()
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except OSError:
+        return False
+
+    try:
+        sock.setblocking(False)
+        sock.connect((ip, 0))
+        sock.send(_icmp_echo_request(1))
+        data = await asyncio.wait_for(loop.sock_recv(sock, 1024), timeout)
+        # Linux returns the bare ICMP message, macOS prefixes the IP header
+        if data and data[0] & 0xF0 == 0x40 and len(data) > 20:
+            data = data[(data[0] & 0x0F) * 4:]
+        return bool(data) and data[0] == 0
+    except (asyncio.TimeoutError, OSError):
+        return False
+    finally:
+        sock.close()
+
+
+async def tcp_ping(ip: str, port: int, timeout: float = 1.0) -> bool:
+    """Attempt a TCP connect; an accept or a reset both mean the host is up."""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        return True
+    except OSError as e:
+        return e.errno in ALIVE_ERRNOS
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        sock.close()
+
+
+def default_concurrency(ports: List[int] = None, fd_share: float = 1.0) -> int:
+    """
+    Pick a worker count that keeps open sockets well under the fd limit.
+    `fd_share` limits it to that fraction of the limit, for scans run inside
+    a process that needs file descriptors of its own.
+    """
+    sockets_per_host = len(DISCOVERY_PORTS if ports is None else ports) + 1
+    try:
+        import resource
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, ValueError, OSError):
+        return max(4, int(64 * fd_share))
+    if soft_limit == resource.RLIM_INFINITY:
+        return max(4, int(256 * fd_share))
+    return max(4, min(256, int((soft_limit - 64) * fd_share) // sockets_per_host))
+
+
+async def probe_host(ip: str, ports: List[int] = None, timeout: float = 1.0,
+                     use_icmp: bool = None) -> Tuple[str, bool]:
+    """Probe one address with ICMP and TCP in parallel; the first positive answer wins."""
+    ports = DISCOVERY_PORTS if ports is None else ports
+    if use_icmp is None:
+        use_icmp = icmp_available()
+
+    probes = [asyncio.ensure_future(tcp_ping(ip, port, timeout)) for port in ports]
+    if use_icmp:
+        probes.append(asyncio.ensure_future(icmp_ping(ip, timeout)))
+
+    try:
+        for probe in asyncio.as_completed(probes):
+            if await probe:
+                return (ip, True)
+        return (ip, False)
+    finally:
+        for probe in probes:
+            probe.cancel()
+
+
+async def discover_hosts_async(ip_list: Iterable[str], ports: List[int] = None, timeout: float = 1.0,
+                               concurrency: int = None,
+                               on_result: Callable[[str, bool], None] = None) -> List[str]:
+    """
+    Sweep addresses with a fixed number of workers pulling from `ip_list`.
+    The iterable is consumed lazily, so large ranges never need to be expanded
+    into a list. `on_result(ip, is_alive)` is called as each probe finishes.
+    """
+    concurrency = concurrency or default_concurrency(ports)
+    use_icmp = icmp_available()
+    addresses = iter(ip_list)
+    alive = []
+
+    async def worker():
+        for ip in addresses:
+            ip, is_alive = await probe_host(ip, ports, timeout, use_icmp)
+            if is_alive:
+                alive.append(ip)
+            if on_result:
+                on_result(ip, is_alive)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return alive
+
+
+def discover_hosts(ip_list: Iterable[str], ports: List[int] = None, timeout: float = 1.0,
+                   concurrency: int = None,
+                   on_result: Callable[[str, bool], None] = None) -> List[str]:
+    """Synchronous wrapper around discover_hosts_async."""
+    return asyncio.run(discover_hosts_async(ip_list, ports, timeout, concurrency, on_result))
+
+
+async def check_ports_async(ip: str, ports: List[int], timeout: float = 0.5) -> List[int]:
+    """Return the subset of ports accepting TCP connections, probed concurrently."""
+    loop = asyncio.get_running_loop()
+
+    async def check(port: int) -> bool:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            sock.close()
+
+    results = await asyncio.gather(*(check(port) for port in ports))
+    return [port for port, is_open in zip(ports, results) if is_open]
+
+
+def read_neighbor_table(path: str = NEIGHBOR_TABLE) -> Optional[Dict[str, str]]:
+    """
+    Read the kernel ARP/neighbor table into {ip: MAC}.
+    Returns None when the table is not available (e.g. on Windows or macOS).
+    """
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return None
+
+    neighbors = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+        ip, flags, mac = fields[0], fields[2], fields[3]
+        # Flags 0x0 marks an incomplete entry
+        if flags == "0x0" or mac == "00:00:00:00:00:00":
+            continue
+        neighbors[ip] = mac.upper()
+    return neighbors
+
+
+def benchmark(live: int = 40, silent: int = 214, timeout: float = 1.0):
+    """
+    Compare the legacy thread-per-address `ping` sweep with this engine on a
+    simulated loopback network. Live hosts are 127.0.0.x addresses, which
+    refuse connections immediately; silent hosts are 127.0.2.x addresses
+    whose probe ports have saturated listeners, so connects hang until the
+    timeout exactly as they would for an address with nothing behind it.
+
+    The legacy sweep is modelled as one fork/exec per address (the cost of
+    running `ping`) plus the 1 s reply wait for silent hosts, on 50 threads.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import subprocess
+
+    ports = [9, 80]
+    live_ips = [f"127.0.0.{i + 2}" for i in range(live)]
+    silent_ips = [f"127.0.2.{i + 1}" for i in range(silent)]
+    ip_list = live_ips + silent_ips
+    live_set = set(live_ips)
+
+    def silent_listener(ip: str, port: int) -> List[socket.socket]:
+        # A listener whose accept queue is full, so further SYNs are dropped
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind((ip, port))
+        listener.listen(0)
+        sockets = [listener]
+        for _ in range(2):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(False)
+            filler.connect_ex((ip, port))
+            sockets.append(filler)
+        return sockets
+
+    held = []
+    for ip in silent_ips:
+        for port in ports:
+            held.extend(silent_listener(ip, port))
+
+    def legacy_probe(ip):
+        subprocess.run([sys.executable, "-c", "pass"] if sys.platform == "win32" else ["true"])
+        if ip not in live_set:
+            time.sleep(timeout)
+        return (ip, ip in live_set)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=50) as executor:
+            legacy_alive = [ip for ip, ok in executor.map(legacy_probe, ip_list) if ok]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        alive = discover_hosts(ip_list, ports=ports, timeout=timeout)
+        engine_time = time.perf_counter() - start
+    finally:
+        for sock in held:
+            sock.close()
+
+    print(f"Simulated network: {live} live + {silent} silent addresses")
+    print(f"  Legacy sweep (fork/exec per address, 50 threads): {legacy_time:.2f}s, {len(legacy_alive)} alive")
+    print(f"  Async discovery (ICMP {'on' if icmp_available() else 'off'}, TCP ports {ports}): "
+          f"{engine_time:.2f}s, {len(alive)} alive")
+    print(f"  Speedup: {legacy_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fast asynchronous host discovery')
+    parser.add_argument('network', nargs='?', help='Network range to sweep (e.g., 192.168.1.0/24)')
+    parser.add_argument('--timeout', '-t', type=float, default=1.0, help='Probe timeout in seconds (default: 1.0)')
+    parser.add_argument('--benchmark', action='store_true', help='Compare against the legacy ping sweep on a simulated network')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(timeout=args.timeout)
+    elif args.network:
+        import ipaddress
+        hosts = (str(ip) for ip in ipaddress.ip_network(args.network, strict=False).hosts())
+        for ip in discover_hosts(hosts, timeout=args.timeout):
+            print(ip)
+    else:
+        parser.print_help()
@@ -0,0 +1,97 @@
+"""
+Idempotency Keys - Run a Request Once, However Often the Client Retries
+Clients send an Idempotency-Key header with each logical request and reuse it
+on retries. The first request with a key runs; duplicates that arrive while it
+is running wait for that same execution, and later duplicates get the stored
+response from a bounded store whose entries expire after a TTL. Failed
+executions are not stored, so a retry after an error runs again.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Tuple
+
+
+DEFAULT_TTL = 600.0
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused with a different request body."""
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of the request fields a key must always be sent with."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """In-memory store of in-flight and completed executions by key."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (fingerprint, future, completed_at or None)
+        self.entries: "OrderedDict[str, Tuple[str, Future, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'executed': 0, 'attached': 0, 'replayed': 0}
+
+    def _expire(self, now: float):
+        # Completed entries are kept in completion order, so expired ones come first
+        expired = []
+        for key, (_, _, completed_at) in self.entries.items():
+            if completed_at is None:
+                continue
+            if now - completed_at < self.ttl:
+                break
+            expired.append(key)
+        for key in expired:
+            del self.entries[key]
+
+    def run(self, key: str, request_fingerprint: str, execute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Execute `execute()` once per key. Returns (result, replayed), where
+        replayed is True if the result came from an earlier or concurrent
+        execution. Exceptions from a shared execution propagate to every
+        caller waiting on it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self.entries.get(key)
+            if entry is not None:
+                stored_fingerprint, future, completed_at = entry
+                if stored_fingerprint != request_fingerprint:
+                    raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+                self.stats['attached' if completed_at is None else 'replayed'] += 1
+            else:
+                future = Future()
+                self.entries[key] = (request_fingerprint, future, None)
+                self.stats['executed'] += 1
+
+        if entry is not None:
+            return future.result(), True
+
+        try:
+            result = execute()
+        except BaseException as e:
+            with self.lock:
+                self.entries.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.entries[key] = (request_fingerprint, future, time.monotonic())
+            self.entries.move_to_end(key)
+            # Bound memory by dropping the oldest completed responses first
+            while len(self.entries) > self.max_entries:
+                oldest = next((k for k, (_, _, done) in self.entries.items() if done is not None), None)
+                if oldest is None:
+                    break
+                del self.entries[oldest]
+        future.set_result(result)
+        return result, False
@@ -0,0 +1,432 @@
+"""
+Knowledge Base - Local Retrieval over Vetted Markdown Docs
+Splits the support guides in knowledge/ into heading-aware chunks, embeds them
+offline with hashed word and bigram features, and stores the embeddings as a
+float32 matrix in an .npy file that is memory-mapped for search. Queries are
+answered with a top-k dot-product search, so standard guidance can be found
+without a web search round-trip. Re-indexing only re-embeds files whose
+content changed. The index is built explicitly and only loaded by the agent.
+
+Usage:
+    python knowledge_base.py --build             # index (or update) the guides
+    python knowledge_base.py "how do I turn on MFA"
+    python knowledge_base.py --benchmark         # latency and retrieval hit rate
+    python knowledge_base.py --tool-calls        # agent tool calls with and without the KB
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Only the vetted support guides; the repo's developer docs are not support material
+DEFAULT_SOURCES = [os.path.join(BASE_DIR, "knowledge")]
+DEFAULT_INDEX_DIR = os.path.join(BASE_DIR, "kb_index")
+
+# Embedding width; hashed features collide rarely at this size for a few MB of docs
+DIMENSIONS = 1024
+
+# Target chunk size in characters, and how much of the previous chunk to repeat
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+
+# Below this cosine score a result is not considered an answer. On the guides in
+# knowledge/, chunks answering a question score about 0.13-0.3 and unrelated
+# ones below 0.1
+MIN_SCORE = 0.12
+
+# Never indexed: VCS data, caches, virtualenvs and installed or built packages,
+# whose bundled READMEs would otherwise crowd out the vetted docs
+SKIP_DIRS = {".git", "__pycache__", "node_modules", "frontend", "kb_index", "v0900BAK",
+             "venv", "env", "site-packages", "dist", "build"}
+
+STOPWORDS = set("""
+a an and are as at be by can do does for from has have how i if in into is it its my of on or
+our that the their then there these this to was we what when where which who why will with you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def stem(token: str) -> str:
+    """Crude suffix stripping so "scan", "scanning", "scanned" and "scans" match."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and not token.endswith("ss") and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            if len(token) >= 4 and token[-1] == token[-2] and token[-1] not in "lsz":
+                token = token[:-1]
+            break
+    if len(token) >= 4 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(t) for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def embed(text: str, dimensions: int = DIMENSIONS, idf: np.ndarray = None) -> np.ndarray:
+    """
+    Hash unigrams and bigrams into a fixed-size vector with sublinear term
+    weights and a hash-derived sign, then L2-normalize so a dot product is a
+    cosine similarity. crc32 keeps hashes stable across processes. Only
+    queries are weighted by `idf`, so stored chunk vectors never depend on
+    the rest of the corpus and survive incremental re-indexing.
+    """
+    tokens = tokenize(text)
+    counts: Dict[str, int] = {}
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        counts[feature] = counts.get(feature, 0) + 1
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, count in counts.items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        weight = 1.0 + math.log(count)
+        vector[h % dimensions] += weight if h & 0x80000000 else -weight
+    if idf is not None:
+        vector *= idf
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def chunk_markdown(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Dict]:
+    """
+    Split markdown into sections at headings, then pack each section's
+    paragraphs into chunks of about `size` characters. Every chunk carries its
+    heading path, which is also embedded so section titles count as context.
+    """
+    sections = []
+    headings: List[str] = []
+    lines: List[str] = []
+    in_code = False
+    for line in text.splitlines():
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        match = None if in_code else HEADING_PATTERN.match(line)
+        if match:
+            sections.append((" > ".join(headings), "\n".join(lines)))
+            level = len(match.group(1))
+            headings = headings[:level - 1] + [match.group(2)]
+            lines = []
+        else:
+            lines.append(line)
+    sections.append((" > ".join(headings), "\n".join(lines)))
+
+    chunks = []
+    for heading, body in sections:
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", body) if p.strip()]
+        current = ""
+        for paragraph in paragraphs:
+            if current and len(current) + len(paragraph) > size:
+                chunks.append({'heading': heading, 'text': current})
+                current = current[-overlap:] if overlap else ""
+            current = f"{current}\n\n{paragraph}".strip()
+            # A single oversized paragraph is split on its own
+            while len(current) > size * 1.5:
+                chunks.append({'heading': heading, 'text': current[:size]})
+                current = current[size - overlap:]
+        if current:
+            chunks.append({'heading': heading, 'text': current})
+    return chunks
+
+
+def find_documents(sources: List[str]) -> List[str]:
+    """Markdown files under the source directories (or given directly), deduplicated."""
+    paths = []
+    seen = set()
+    for source in sources:
+        if os.path.isfile(source):
+            candidates = [source]
+        elif os.path.isdir(source):
+            candidates = []
+            for root, dirs, files in os.walk(source):
+                dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+                candidates.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".md"))
+        else:
+            continue
+        for path in candidates:
+            real = os.path.realpath(path)
+            if real not in seen:
+                seen.add(real)
+                paths.append(real)
+    return paths
+
+
+class KnowledgeBase:
+    """Chunked markdown docs with a memory-mapped embedding matrix."""
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, sources: List[str] = None):
+        self.index_dir = index_dir
+        self.sources = sources or [s.strip() for s in os.getenv("KB_SOURCES", "").split(",") if s.strip()] \
+            or DEFAULT_SOURCES
+        self.matrix_path = os.path.join(index_dir, "embeddings.npy")
+        self.meta_path = os.path.join(index_dir, "chunks.json")
+        self.matrix: Optional[np.ndarray] = None
+        self.chunks: List[Dict] = []
+        self.files: Dict[str, Dict] = {}
+        self.idf: Optional[np.ndarray] = None
+        self.stats = {'queries': 0, 'answered': 0, 'seconds': 0.0}
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.meta_path)):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get('dimensions') != DIMENSIONS:
+            return
+        self.chunks = meta['chunks']
+        self.files = meta['files']
+        self.matrix = np.load(self.matrix_path, mmap_mode="r")
+        self.idf = self._idf(meta['df'])
+
+    def _idf(self, df: List[int]) -> np.ndarray:
+        """Inverse document frequency per hash bucket, counted over chunks."""
+        return (np.log((len(self.chunks) + 1) / (np.asarray(df, dtype=np.float32) + 1)) + 1).astype(np.float32)
+
+    def reindex(self) -> Dict[str, int]:
+        """
+        Bring the index up to date with the source files. Rows for unchanged
+        files are copied from the existing matrix; only new or modified files
+        are chunked and embedded. Returns counts of files by outcome.
+        """
+        summary = {'unchanged': 0, 'updated': 0, 'removed': 0}
+        paths = find_documents(self.sources)
+        rows: List[np.ndarray] = []
+        chunks: List[Dict] = []
+        files: Dict[str, Dict] = {}
+
+        for path in paths:
+            with open(path, "rb") as f:
+                content = f.read()
+            digest = hashlib.sha1(content).hexdigest()
+            old = self.files.get(path)
+            start = len(chunks)
+            if old and old['sha1'] == digest and self.matrix is not None:
+                rows.append(np.asarray(self.matrix[old['start']:old['end']]))
+                chunks.extend(self.chunks[old['start']:old['end']])
+                summary['unchanged'] += 1
+            else:
+                text = content.decode("utf-8", errors="replace")
+                source = os.path.relpath(path, BASE_DIR)
+                if source.startswith(".."):
+                    source = path
+                new_chunks = [dict(c, source=source) for c in chunk_markdown(text)]
+                if new_chunks:
+                    rows.append(np.stack([embed(f"{c['heading']}\n{c['text']}") for c in new_chunks]))
+                chunks.extend(new_chunks)
+                summary['updated'] += 1
+            files[path] = {'sha1': digest, 'start': start, 'end': len(chunks)}
+        summary['removed'] = len(set(self.files) - set(files))
+
+        if not summary['updated'] and not summary['removed'] and self.matrix is not None:
+            return summary
+
+        matrix = np.concatenate(rows) if rows else np.zeros((0, DIMENSIONS), dtype=np.float32)
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Release the old mapping before replacing the file (required on Windows)
+        self.matrix = None
+        tmp_matrix = self.matrix_path + ".tmp.npy"
+        np.save(tmp_matrix, matrix.astype(np.float32))
+        os.replace(tmp_matrix, self.matrix_path)
+        df = np.count_nonzero(matrix, axis=0).tolist()
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({'dimensions': DIMENSIONS, 'files': files, 'chunks': chunks, 'df': df}, f)
+        os.replace(tmp_meta, self.meta_path)
+
+        self.chunks = chunks
+        self.files = files
+        self.matrix = np.load(self.matrix_path, mmap_mode="r")
+        self.idf = self._idf(df)
+        return summary
+
+    def search(self, query: str, k: int = 3, min_score: float = MIN_SCORE) -> List[Dict]:
+        """Top-k chunks by cosine similarity, best first, dropping those below min_score."""
+        started = time.perf_counter()
+        results = []
+        if self.matrix is not None and len(self.chunks):
+            scores = self.matrix @ embed(query, idf=self.idf)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            for i in top[np.argsort(-scores[top])]:
+                if scores[i] >= min_score:
+                    results.append(dict(self.chunks[i], score=round(float(scores[i]), 3)))
+
+        self.stats['queries'] += 1
+        self.stats['answered'] += bool(results)
+        self.stats['seconds'] += time.perf_counter() - started
+        return results
+
+    def format_results(self, query: str, k: int = 3) -> str:
+        """Search results as compact text for the agent."""
+        results = self.search(query, k)
+        if not results:
+            return "No matching guidance in the local knowledge base. Use web search if the question needs it."
+        return "\n\n".join(
+            f"[{r['source']}{' > ' + r['heading'] if r['heading'] else ''}] (score {r['score']})\n{r['text']}"
+            for r in results
+        )
+
+
+_default_kb: Optional[KnowledgeBase] = None
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """
+    Open the default index on first use. It is never built here; run
+    `python knowledge_base.py --build` after changing the guides.
+    """
+    global _default_kb
+    if _default_kb is None:
+        _default_kb = KnowledgeBase()
+        if _default_kb.matrix is None:
+            print("WARNING: knowledge base index not found - run 'python knowledge_base.py --build'")
+        else:
+            print(f"Knowledge base: {len(_default_kb.chunks)} chunks from {len(_default_kb.files)} files")
+    return _default_kb
+
+
+BENCHMARK_QUERIES = [
+    "How do I turn on two-factor authentication for my team?",
+    "I clicked a link in a phishing email, what should I do?",
+    "Our files were encrypted and there is a ransom note, what now?",
+    "Is it safe to have RDP open to the internet?",
+    "How often should we install security patches?",
+    "How should we prioritize which CVEs to patch first?",
+    "How do I secure my home router and smart devices?",
+    "What makes a strong password?",
+    "How should we back up our data so ransomware cannot destroy it?",
+    "There is a device on my Wi-Fi I don't recognize, what should I do?",
+    "What is the latest ransomware campaign this week?",
+    "Is CVE-2024-3400 being exploited in the wild?",
+]
+
+
+def benchmark(kb: KnowledgeBase, queries: List[str], repeat: int = 50) -> Tuple[float, float, float]:
+    """
+    Time searches and report the retrieval hit rate: the share of questions
+    with at least one result scoring MIN_SCORE or more. This measures the
+    index, not the agent; whether the model then skips web search is up to it.
+    """
+    latencies = []
+    answered = 0
+    for query in queries:
+        results = kb.search(query)
+        answered += bool(results)
+        print(f"  {'hit ' if results else 'miss'}  {query}"
+              + (f"  -> {results[0]['source']} ({results[0]['score']})" if results else ""))
+        for _ in range(repeat):
+            started = time.perf_counter()
+            kb.search(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95)]
+    share = answered / len(queries) if queries else 0.0
+    return p50, p95, share
+
+
+def measure_tool_calls(questions: List[str], with_knowledge_base: bool, max_rounds: int = 5) -> Dict[str, float]:
+    """
+    Ask each question in its own conversation with the agent's model, system
+    prompt and tools, running tool calls until the model answers, and count
+    the tool calls it makes. Without the knowledge base, the
+    knowledge_base_search tool and its prompt paragraph are left out, as
+    before the knowledge base existed. Needs the OpenAI and Tavily API keys,
+    and the Tavily calls are real searches. Returns mean calls per conversation.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+    from langchain_openai import ChatOpenAI
+
+    import agent
+
+    tools = [t for t in agent.tools if with_knowledge_base or t.name != agent.knowledge_base_search.name]
+    prompt = agent.SYSTEM_PROMPT if with_knowledge_base else agent.SYSTEM_PROMPT.replace(agent.KNOWLEDGE_BASE_PROMPT, "")
+    model = ChatOpenAI(model="gpt-4o", temperature=0).bind_tools(tools)
+    by_name = {t.name: t for t in tools}
+
+    counts: Dict[str, int] = {t.name: 0 for t in tools}
+    for question in questions:
+        # The persona asks for a name first, so start past the introductions
+        messages = [SystemMessage(content=prompt), HumanMessage(content="Hi, I'm Alex."),
+                    AIMessage(content="Nice to meet you, Alex. How can I help with your cyber security request or concern?"),
+                    HumanMessage(content=question)]
+        calls = []
+        for _ in range(max_rounds):
+            response = model.invoke(messages)
+            messages.append(response)
+            if not response.tool_calls:
+                break
+            for call in response.tool_calls:
+                counts[call["name"]] = counts.get(call["name"], 0) + 1
+                calls.append(call["name"])
+                output = by_name[call["name"]].invoke(call["args"]) if call["name"] in by_name else "Unknown tool"
+                messages.append(ToolMessage(content=str(output), tool_call_id=call["id"]))
+        print(f"  {len(calls)} tool calls ({', '.join(calls) or 'none'})  {question}")
+
+    per_conversation = {name: count / len(questions) for name, count in counts.items()}
+    per_conversation['total'] = sum(counts.values()) / len(questions)
+    return per_conversation
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local knowledge base over markdown docs')
+    parser.add_argument('query', nargs='?', help='Question to search for')
+    parser.add_argument('--build', action='store_true', help='Index new or changed documents')
+    parser.add_argument('--sources', help='Comma-separated directories or files to index (default: knowledge/)')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR, help='Where the index is stored (default: kb_index/)')
+    parser.add_argument('-k', type=int, default=3, help='Number of results (default: 3)')
+    parser.add_argument('--benchmark', action='store_true', help='Measure search latency and the retrieval hit rate on sample questions')
+    parser.add_argument('--tool-calls', action='store_true', help='Count the agent\'s tool calls per conversation on the sample questions, without and with the knowledge base (uses the OpenAI and Tavily APIs)')
+    args = parser.parse_args()
+
+    sources = [s.strip() for s in args.sources.split(',')] if args.sources else None
+    kb = KnowledgeBase(args.index_dir, sources)
+
+    if args.build or args.benchmark or kb.matrix is None:
+        started = time.perf_counter()
+        summary = kb.reindex()
+        print(f"Indexed {len(kb.chunks)} chunks from {len(kb.files)} files in "
+              f"{time.perf_counter() - started:.2f}s ({summary['updated']} updated, "
+              f"{summary['unchanged']} unchanged, {summary['removed']} removed)")
+
+    if args.tool_calls:
+        before, after = ({}, {})
+        for label, enabled, counts in (("Without", False, before), ("With", True, after)):
+            print(f"\n{label} the knowledge base:")
+            counts.update(measure_tool_calls(BENCHMARK_QUERIES, enabled))
+        print(f"\nTool calls per conversation over {len(BENCHMARK_QUERIES)} sample questions:")
+        print(f"  {'':24} {'without KB':>10} {'with KB':>10}")
+        for name in sorted(set(before) | set(after), key=lambda n: (n == 'total', n)):
+            print(f"  {name:24} {before.get(name, 0):10.2f} {after.get(name, 0):10.2f}")
+    elif args.benchmark:
+        print(f"\nSearching {len(BENCHMARK_QUERIES)} sample questions:")
+        p50, p95, share = benchmark(kb, BENCHMARK_QUERIES)
+        print(f"\nRetrieval latency: p50 {p50:.2f} ms, p95 {p95:.2f} ms over {len(kb.chunks)} chunks")
+        print(f"Retrieval hit rate: {share:.0%} of questions had a result scoring at least {MIN_SCORE}")
+    elif args.query:
+        for result in kb.search(args.query, args.k):
+            print(f"\n[{result['score']}] {result['source']} > {result['heading']}")
+            print(result['text'][:500])
+    elif not args.build:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
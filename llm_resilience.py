@@ -0,0 +1,417 @@
+"""
+LLM Resilience - Deadlines, Hedging, Retries and a Circuit Breaker
+Wraps the agent's model call so slow or failing OpenAI requests do not pass
+straight through to chat latency:
+
+- Deadline: every call gets a time limit, cut down to what is left of the
+  /chat request budget, after which it gives up with DeadlineExceeded.
+- Hedging: if a request is still running after the recent p95 latency, an
+  identical second request is sent. The first response wins; the other is
+  cancelled if it has not started, and its result is discarded otherwise.
+  Hedges are capped at HEDGE_BUDGET of recent requests and skipped while the
+  first request is still queued, so they cannot snowball under overload.
+  A request that already started cannot be interrupted; losing hedges and
+  requests past their deadline run on until the client's own timeout. No
+  hedge is sent while HEDGE_BUDGET of the worker pool is taken up by them.
+- Retries: 429 and 5xx errors, timeouts and dropped connections are retried
+  with jittered exponential backoff (honouring Retry-After), within the
+  deadline.
+- Circuit breaker: after repeated failed calls (each counted once, after its
+  retries), calls fail fast with CircuitOpenError for a cooldown, then one
+  probe call is let through. Only responses and retryable errors say anything
+  about the service; other exceptions (bugs such as a TypeError) propagate
+  without touching the breaker.
+
+Configuration (environment):
+    LLM_CALL_TIMEOUT        seconds a single model call may take (default: 60)
+    LLM_REQUEST_BUDGET      seconds a whole /chat request may take (default: 120)
+    LLM_HEDGE               0 to disable hedged requests (default: 1)
+    LLM_MAX_RETRIES         retries after a retryable error (default: 2)
+    LLM_BREAKER_THRESHOLD   consecutive failed calls that open the breaker (default: 5)
+    LLM_BREAKER_COOLDOWN    seconds the breaker stays open (default: 30)
+
+Usage:
+    python llm_resilience.py --benchmark     # p99 against a stub model with injected latency
+"""
+
+import argparse
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Latency samples kept for the p95 hedge delay and the metrics
+LATENCY_WINDOW = 500
+
+# Samples needed before the p95 is trusted; until then DEFAULT_HEDGE_DELAY is used
+MIN_SAMPLES = 20
+DEFAULT_HEDGE_DELAY = 10.0
+MIN_HEDGE_DELAY = 0.05
+
+# Hedges may add at most this share of requests, counted over the last HEDGE_WINDOW attempts
+HEDGE_BUDGET = 0.05
+HEDGE_WINDOW = 200
+
+# Starlette runs sync endpoints on a 40-thread pool; each may wait on one model
+# call, so the executor has a worker per request thread plus room for hedges
+REQUEST_THREADS = 40
+DEFAULT_MAX_WORKERS = 2 * REQUEST_THREADS
+
+# Full-jitter backoff: sleep a random time up to min(BACKOFF_CAP, BACKOFF_BASE * 2^attempt)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call did not finish before its deadline."""
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open; the model is not being called."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Model calls are paused after repeated failures; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an API error (OpenAI errors carry it directly or on .response)."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_client_error(error: BaseException) -> bool:
+    """A 4xx response other than 429: the service answered and refused the request."""
+    status = status_code(error)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    """429s, 5xx responses, timeouts and connection failures are worth retrying."""
+    status = status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return (isinstance(error, (TimeoutError, ConnectionError))
+            or type(error).__name__ in ("APITimeoutError", "APIConnectionError"))
+
+
+def retry_after(error: BaseException) -> float:
+    """Seconds requested by a Retry-After header on the error's response, or 0."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `threshold` consecutive failures -> half-open (one
+    probe) after `cooldown`. ResilientCaller records one result per call, not
+    per attempt, so retries within a call do not count separately.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def release(self):
+        """Give back a probe whose call said nothing about the service's health."""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class ResilientCaller:
+    """Runs a blocking call with a deadline, a p95 hedge, jittered retries and a circuit breaker."""
+
+    def __init__(self, timeout: float = None, hedge: bool = None, max_retries: int = None,
+                 breaker: CircuitBreaker = None, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.timeout = float(os.getenv("LLM_CALL_TIMEOUT", 60)) if timeout is None else timeout
+        self.hedge = os.getenv("LLM_HEDGE", "1") != "0" if hedge is None else hedge
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 2)) if max_retries is None else max_retries
+        self.breaker = breaker or CircuitBreaker(int(os.getenv("LLM_BREAKER_THRESHOLD", 5)),
+                                                 float(os.getenv("LLM_BREAKER_COOLDOWN", 30)))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        # Latency of single successful requests (sets the hedge delay) and of whole calls
+        self.request_latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.call_latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        # 1 for each recent attempt that sent a hedge, 0 otherwise
+        self.hedge_window: deque = deque(maxlen=HEDGE_WINDOW)
+        # Requests still running after their call returned (losing hedges, deadline passed)
+        self.abandoned = 0
+        self.max_abandoned = max(1, int(HEDGE_BUDGET * max_workers))
+        self.counts = {'calls': 0, 'requests': 0, 'hedges': 0, 'hedge_wins': 0, 'hedges_skipped': 0,
+                       'retries': 0, 'deadline_exceeded': 0, 'circuit_open': 0, 'failures': 0}
+        self.lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def hedge_delay(self) -> float:
+        """Recent p95 latency of single requests, once there are enough samples."""
+        samples = list(self.request_latencies)
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, percentile(samples, 0.95))
+
+    def _take_hedge(self, wanted: bool) -> bool:
+        """Record an attempt; True if it wants a hedge and the hedge budget allows one."""
+        with self.lock:
+            allowed = (wanted and sum(self.hedge_window) < HEDGE_BUDGET * HEDGE_WINDOW
+                       and self.abandoned < self.max_abandoned)
+            self.hedge_window.append(1 if allowed else 0)
+            if wanted and not allowed:
+                self.counts['hedges_skipped'] += 1
+            return allowed
+
+    def _timed(self, fn: Callable[[], Any]):
+        started = time.monotonic()
+        result = fn()
+        self.request_latencies.append(time.monotonic() - started)
+        return result
+
+    def _submit(self, fn: Callable[[], Any]):
+        # A copy of the caller's context per request keeps LangChain callbacks and tracing working
+        return self.executor.submit(contextvars.copy_context().run, self._timed, fn)
+
+    def _abandon(self, futures):
+        """Cancel requests no longer needed, and track the ones already running."""
+        for future in futures:
+            if future.cancel():
+                continue
+            with self.lock:
+                self.abandoned += 1
+            future.add_done_callback(self._abandoned_done)
+
+    def _abandoned_done(self, _future):
+        with self.lock:
+            self.abandoned -= 1
+
+    def _attempt(self, fn: Callable[[], Any], deadline: float):
+        """One attempt: the request, plus a hedge if it outlives the hedge delay."""
+        primary = self._submit(fn)
+        self._count('requests')
+        pending = {primary}
+        done, _ = wait(pending, timeout=max(0.0, min(self.hedge_delay(), deadline - time.monotonic())))
+        # A primary still queued means the pool is saturated; a hedge would only queue behind it
+        wanted = not done and self.hedge and primary.running() and time.monotonic() < deadline
+        if self._take_hedge(wanted):
+            pending.add(self._submit(fn))
+            self._count('requests')
+            self._count('hedges')
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self._abandon(pending)
+                    if future is not primary:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = error or future.exception()
+        self._abandon(pending)
+        if pending or error is None:
+            raise DeadlineExceeded("Model call did not finish within its deadline")
+        raise error
+
+    def call(self, fn: Callable[[], Any], deadline: float = None):
+        """
+        Run `fn` (a blocking model call) under the resilience policy. `deadline`
+        is a time.monotonic() value, e.g. the end of the request budget; the
+        call never runs past it or past `timeout` from now.
+        """
+        started = time.monotonic()
+        deadline = min(deadline or float("inf"), started + self.timeout)
+        self._count('calls')
+
+        # The breaker sees one outcome per call, however many attempts it took
+        if not self.breaker.allow():
+            self._count('circuit_open')
+            raise CircuitOpenError(self.breaker.retry_after())
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self._attempt(fn, deadline)
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                self._count('deadline_exceeded')
+                raise
+            except Exception as e:
+                if is_client_error(e):
+                    # The service answered; a bad request says nothing against its health
+                    self.breaker.record_success()
+                    self._count('failures')
+                    raise
+                if not is_retryable(e):
+                    # Not an answer from the service at all, e.g. a bug in the caller
+                    self.breaker.release()
+                    self._count('failures')
+                    raise
+                delay = max(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)), retry_after(e))
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    self.breaker.record_failure()
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.call_latencies.append(time.monotonic() - started)
+            return result
+
+    def metrics(self) -> Dict:
+        """Counters plus latency percentiles of recent successful calls (ms)."""
+        with self.lock:
+            metrics = dict(self.counts)
+        calls = list(self.call_latencies)
+        metrics.update({
+            'p50_ms': round(percentile(calls, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(calls, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(calls, 0.99) * 1000, 1),
+            'hedge_delay_ms': round(self.hedge_delay() * 1000, 1),
+            'abandoned': self.abandoned,
+            'breaker': self.breaker.state,
+        })
+        return metrics
+
+
+class StubAPIError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"stub error {status}")
+        self.status_code = status
+
+
+def stub_model(median: float = 0.05, tail_rate: float = 0.03, tail_factor: float = 20.0,
+               error_rate: float = 0.02) -> Callable[[], str]:
+    """A model call that sleeps: mostly near `median`, sometimes `tail_factor` times longer, sometimes a 429/503."""
+    def invoke() -> str:
+        roll = random.random()
+        if roll < error_rate:
+            time.sleep(median / 5)
+            raise StubAPIError(random.choice((429, 503)))
+        latency = random.lognormvariate(0, 0.25) * median
+        if roll < error_rate + tail_rate:
+            latency *= tail_factor
+        time.sleep(latency)
+        return "ok"
+    return invoke
+
+
+def benchmark(calls: int = 600, concurrency: int = 12, **stub_options):
+    """Latency percentiles and error rate of direct calls vs. resilient calls to the same stub."""
+    invoke = stub_model(**stub_options)
+
+    def run(call: Callable[[], Any]) -> Dict:
+        latencies, errors = [], 0
+
+        def one(_):
+            started = time.monotonic()
+            try:
+                call()
+                return time.monotonic() - started
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for latency in pool.map(one, range(calls)):
+                if latency is None:
+                    errors += 1
+                else:
+                    latencies.append(latency)
+        return {'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99), 'errors': errors / calls}
+
+    caller = ResilientCaller(timeout=5.0, hedge=True, max_retries=2,
+                             breaker=CircuitBreaker(threshold=50, cooldown=1.0), max_workers=concurrency * 2)
+    # Warm the latency window so the p95 hedge delay is in use from the first measured call
+    for _ in range(MIN_SAMPLES):
+        try:
+            caller.call(invoke)
+        except Exception:
+            pass
+
+    print(f"Stub model: {calls} calls, {concurrency} concurrent, options {stub_options or 'default'}")
+    direct = run(invoke)
+    resilient = run(lambda: caller.call(invoke))
+    for name, result in (("Direct", direct), ("Resilient", resilient)):
+        print(f"  {name:<10} p50 {result['p50'] * 1000:6.0f} ms  p95 {result['p95'] * 1000:6.0f} ms  "
+              f"p99 {result['p99'] * 1000:6.0f} ms  errors {result['errors']:.1%}")
+    metrics = caller.metrics()
+    print(f"  p99 improvement: {(direct['p99'] - resilient['p99']) / direct['p99']:.0%}")
+    print(f"  Extra requests:  {metrics['requests'] / metrics['calls'] - 1:.1%} "
+          f"(hedges {metrics['hedges']}, hedge wins {metrics['hedge_wins']}, over budget {metrics['hedges_skipped']}, "
+          f"retries {metrics['retries']}, "
+          f"hedge delay {metrics['hedge_delay_ms']:.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resilience layer for model calls')
+    parser.add_argument('--benchmark', action='store_true', help='Compare direct and resilient calls to a stub model')
+    parser.add_argument('--calls', type=int, default=600, help='Calls per run (default: 600)')
+    parser.add_argument('--median', type=float, default=0.05, help='Stub median latency in seconds (default: 0.05)')
+    parser.add_argument('--tail-rate', type=float, default=0.03, help='Share of slow stub calls (default: 0.03)')
+    parser.add_argument('--tail-factor', type=float, default=20.0, help='Slow call latency multiplier (default: 20)')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='Share of 429/503 stub errors (default: 0.02)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.calls, median=args.median, tail_rate=args.tail_rate,
+                  tail_factor=args.tail_factor, error_rate=args.error_rate)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
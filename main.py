@@ -1,9 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from agent import agent
+from agent import agent, llm_caller, memory
 from langchain_core.messages import HumanMessage
-from typing import Optional
+from scan_jobs import ScanJobManager, JobQueueFull
+from idempotency import IdempotencyStore, IdempotencyConflict, fingerprint
+from llm_resilience import CircuitOpenError, DeadlineExceeded
+from fast_response import encode_history, json_response
+from typing import List, Optional
+import asyncio
+import hmac
+import json
+import orjson
+import os
+import time
 import uuid
 
 app = FastAPI(title="AI Agent API 2025 with Memory")
@@ -28,6 +40,35 @@ class ChatResponse(BaseModel):
 class HistoryRequest(BaseModel):
     thread_id: str
 
+class ScanRequest(BaseModel):
+    kind: str  # "ports" or "network"
+    target: Optional[str] = None  # Host for port scans
+    ports: Optional[str] = None  # Port specification, e.g. "22,80,443,top100,U:53"
+    order: Optional[str] = None  # frequency, random or numeric
+    timeout: Optional[float] = None  # Per-port timeout in seconds
+    ranges: Optional[List[str]] = None  # CIDR ranges for network scans
+
+# Scans run on their own bounded thread pool, never on the event loop
+scan_jobs = ScanJobManager(max_workers=2)
+
+# Responses to /chat requests sent with an Idempotency-Key, kept for 10 minutes
+chat_idempotency = IdempotencyStore(ttl=600, max_entries=1000)
+
+# Token required by admin endpoints such as /search and /scans (disabled when unset)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject the request unless the X-Admin-Token header matches ADMIN_TOKEN."""
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Seconds one /chat request may spend in model calls, across tool-use rounds
+CHAT_REQUEST_BUDGET = float(os.getenv("LLM_REQUEST_BUDGET", 120))
+
+@app.on_event("shutdown")
+def shutdown_scan_jobs():
+    scan_jobs.shutdown()
+
 @app.get("/")
 def root():
     return {
@@ -35,37 +76,70 @@ def root():
         "features": ["Persistent conversation memory", "Thread-based conversations"]
     }
 
+@app.get("/llm/metrics")
+def llm_metrics():
+    """
+    Model call counters (hedges, retries, deadline and breaker failures) and
+    latency percentiles of recent successful calls.
+    """
+    return llm_caller.metrics()
+
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(request: ChatRequest):
+def chat_endpoint(request: ChatRequest, http_request: Request,
+                  idempotency_key: Optional[str] = Header(None, max_length=255)):
     """
     Chat with the AI agent. Provide a thread_id to continue a conversation,
     or omit it to start a new conversation.
+
+    Send an Idempotency-Key header and reuse it when retrying: a retry that
+    arrives while the first attempt is running waits for that attempt, and a
+    retry after it finished gets the same response (marked with an
+    Idempotent-Replayed header) instead of running the agent again.
     """
-    # Generate or use provided thread_id
-    thread_id = request.thread_id or str(uuid.uuid4())
-    
-    # Initialize the state with the user message
-    inputs = {"messages": [HumanMessage(content=request.message)]}
-    
-    # Configuration for the agent with thread ID for memory persistence
-    config = {"configurable": {"thread_id": thread_id}}
-    
-    try:
+    def run_agent() -> bytes:
+        # Generate or use provided thread_id
+        thread_id = request.thread_id or str(uuid.uuid4())
+        
+        # Initialize the state with the user message
+        inputs = {"messages": [HumanMessage(content=request.message)]}
+        
+        # Configuration for the agent with thread ID for memory persistence
+        # and the deadline model calls must finish by (not saved with checkpoints)
+        config = {"configurable": {"thread_id": thread_id,
+                                   "__deadline": time.monotonic() + CHAT_REQUEST_BUDGET}}
+        
         # Run the agent with memory (synchronous)
         result = agent.invoke(inputs, config=config)
         
-        # Return the last message from the AI along with thread_id
-        return ChatResponse(
-            response=result["messages"][-1].content,
-            thread_id=thread_id
-        )
+        # Return the last message from the AI along with thread_id, encoded
+        # once so replays of an idempotent request reuse the same bytes
+        return orjson.dumps({
+            "response": result["messages"][-1].content,
+            "thread_id": thread_id
+        })
+    
+    try:
+        if not idempotency_key:
+            return json_response(http_request, run_agent())
+        body, replayed = chat_idempotency.run(
+            idempotency_key, fingerprint(request.message, request.thread_id), run_agent)
+        return json_response(http_request, body, headers={"Idempotent-Replayed": "true"} if replayed else None)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
 
 @app.post("/history")
-def get_conversation_history(request: HistoryRequest):
+def get_conversation_history(request: HistoryRequest, http_request: Request):
     """
-    Retrieve the conversation history for a given thread_id.
+    Retrieve the conversation history for a given thread_id. Messages are
+    encoded with orjson straight from the stored message objects, and large
+    responses are compressed with brotli or gzip when the client accepts it.
     """
     config = {"configurable": {"thread_id": request.thread_id}}
     
@@ -74,23 +148,29 @@ def get_conversation_history(request: HistoryRequest):
         state = agent.get_state(config)
         
         if not state or not state.values.get("messages"):
-            return {"thread_id": request.thread_id, "messages": [], "message": "No history found"}
-        
-        # Format messages for response
-        messages = []
-        for msg in state.values["messages"]:
-            messages.append({
-                "type": msg.__class__.__name__,
-                "content": msg.content,
-            })
+            return json_response(http_request, {"thread_id": request.thread_id, "messages": [],
+                                                "message": "No history found"})
         
-        return {
-            "thread_id": request.thread_id,
-            "messages": messages
-        }
+        # Encode messages for the response as {"type", "content"} objects
+        return json_response(http_request, encode_history(request.thread_id, state.values["messages"]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving history: {str(e)}")
 
+@app.get("/search", dependencies=[Depends(require_admin)])
+def search_conversations(q: str, limit: int = 20):
+    """
+    Admin: find threads whose messages contain every word of `q` (e.g. a CVE
+    ID or a customer name), best match first, with a snippet of each.
+    Requires the X-Admin-Token header to match ADMIN_TOKEN.
+    """
+    started = time.perf_counter()
+    results = memory.index.search(q, limit=max(1, min(limit, 100)))
+    return {
+        "query": q,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
 @app.post("/new-conversation")
 def new_conversation():
     """
@@ -99,6 +179,86 @@ def new_conversation():
     thread_id = str(uuid.uuid4())
     return {"thread_id": thread_id, "message": "New conversation started"}
 
+@app.post("/scans", status_code=202, dependencies=[Depends(require_admin)])
+def create_scan(request: ScanRequest):
+    """
+    Queue a port scan of one host or a sweep of network ranges. Follow its
+    progress at /scans/{job_id}/events and fetch results at /scans/{job_id}.
+    Targets must lie within SCAN_ALLOWED_NETWORKS, and every /scans route
+    requires the X-Admin-Token header.
+    """
+    try:
+        job = scan_jobs.submit(request.kind, request.model_dump(exclude={"kind"}, exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.to_dict(include_results=False)
+
+@app.get("/scans", dependencies=[Depends(require_admin)])
+def list_scans(limit: int = 50):
+    """
+    List recent scan jobs, newest first.
+    """
+    return {"scans": scan_jobs.list_jobs(limit)}
+
+@app.get("/scans/{job_id}", dependencies=[Depends(require_admin)])
+def get_scan(job_id: str):
+    """
+    Retrieve a scan job's status, progress and results.
+    """
+    job = scan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.to_dict()
+
+@app.delete("/scans/{job_id}", dependencies=[Depends(require_admin)])
+def cancel_scan(job_id: str):
+    """
+    Cancel a queued or running scan job. Results found so far are kept.
+    """
+    job = scan_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.to_dict(include_results=False)
+
+@app.get("/scans/{job_id}/events", dependencies=[Depends(require_admin)])
+async def scan_events(job_id: str, request: Request):
+    """
+    Stream a scan job's status, progress and result events as Server-Sent
+    Events until it finishes. Reconnecting clients resume after Last-Event-ID.
+    """
+    # A finished job may have to be read back from SQLite; keep that off the event loop
+    job = await run_in_threadpool(scan_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    try:
+        last_id = int(request.headers.get("last-event-id", -1))
+    except ValueError:
+        last_id = -1
+
+    async def stream():
+        nonlocal last_id
+        idle = 0.0
+        while True:
+            events = job.events_since(last_id)
+            for event in events:
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+            if job.done and not job.events_since(last_id):
+                break
+            if await request.is_disconnected():
+                break
+            idle = 0.0 if events else idle + 0.25
+            if idle >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
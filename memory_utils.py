@@ -1,9 +1,13 @@
 """
 Utility functions for managing conversation memory and checkpoints.
 """
+import json
 import sqlite3
 from typing import List, Dict
 
+from compact_checkpoint import COMPACT_TYPE, COMPRESSED_TYPE, SCHEMA as COMPACT_SCHEMA, bump_prune_generation, unpack_header
+from message_search import MessageIndex, backfill
+
 def list_all_threads(db_path: str = "checkpoints.db") -> List[str]:
     """List all conversation thread IDs in the database."""
     conn = sqlite3.connect(db_path)
@@ -26,7 +30,10 @@ def delete_thread(thread_id: str, db_path: str = "checkpoints.db") -> bool:
     try:
         cursor.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
         conn.commit()
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+        with MessageIndex(db_path) as index:
+            index.delete_thread(thread_id)
+        return deleted
     except sqlite3.OperationalError:
         return False
     finally:
@@ -52,3 +59,109 @@ def get_thread_stats(db_path: str = "checkpoints.db") -> Dict:
         return {"total_threads": 0, "total_checkpoints": 0}
     finally:
         conn.close()
+
+
+def get_storage_stats(db_path: str = "checkpoints.db") -> Dict:
+    """
+    Report how much space checkpoints take and how well they compress.
+    `logical_bytes` is what the default serializer would have stored;
+    `stored_bytes` counts checkpoints plus the shared message blobs and lists.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        logical = stored = compact = 0
+        for type_, payload in cursor.execute("SELECT type, checkpoint FROM checkpoints"):
+            stored += len(payload)
+            if type_ in (COMPACT_TYPE, COMPRESSED_TYPE):
+                header, _ = unpack_header(payload)
+                logical += header["raw_size"]
+                compact += 1
+            else:
+                logical += len(payload)
+        
+        blob_bytes = 0
+        try:
+            cursor.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM message_blobs")
+            blob_bytes += cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(SUM(LENGTH(refs)), 0) FROM message_lists")
+            blob_bytes += cursor.fetchone()[0]
+        except sqlite3.OperationalError:
+            pass
+        stored += blob_bytes
+        
+        return {
+            "compact_checkpoints": compact,
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "blob_bytes": blob_bytes,
+            "compression_ratio": round(logical / stored, 2) if stored else 1.0,
+        }
+    except sqlite3.OperationalError:
+        return {"compact_checkpoints": 0, "logical_bytes": 0, "stored_bytes": 0,
+                "blob_bytes": 0, "compression_ratio": 1.0}
+    finally:
+        conn.close()
+
+def prune_message_blobs(db_path: str = "checkpoints.db") -> int:
+    """
+    Remove message lists and blobs no checkpoint refers to any more, e.g.
+    after delete_thread. Returns the number of blobs removed.
+
+    Serializers in running processes notice the prune and drop their caches,
+    so they never skip writing a blob that was removed. A list is written just
+    before the checkpoint that uses it, though, so run this between turns
+    (e.g. from a maintenance job), not while a thread is being saved.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    cursor = conn.cursor()
+    
+    try:
+        conn.executescript(COMPACT_SCHEMA)
+        # Hold the write lock throughout, so no serializer writes between the scan and the deletes
+        cursor.execute("BEGIN IMMEDIATE")
+        live_lists = set()
+        for (payload,) in cursor.execute("SELECT checkpoint FROM checkpoints WHERE type = ?", (COMPACT_TYPE,)).fetchall():
+            header, _ = unpack_header(payload)
+            live_lists.update(header["lists"].values())
+        
+        # Follow each list's chain of prefixes to collect every message it uses
+        lists = {list_hash: (parent, refs) for list_hash, parent, refs
+                 in cursor.execute("SELECT list_hash, parent, refs FROM message_lists")}
+        reachable = set()
+        live_blobs = set()
+        for list_hash in live_lists:
+            while list_hash and list_hash not in reachable and list_hash in lists:
+                reachable.add(list_hash)
+                parent, refs = lists[list_hash]
+                live_blobs.update(json.loads(refs))
+                list_hash = parent
+        
+        dead_lists = [(h,) for h in lists if h not in reachable]
+        dead_blobs = [(h,) for (h,) in cursor.execute("SELECT hash FROM message_blobs").fetchall()
+                      if h not in live_blobs]
+        cursor.executemany("DELETE FROM message_lists WHERE list_hash = ?", dead_lists)
+        cursor.executemany("DELETE FROM message_blobs WHERE hash = ?", dead_blobs)
+        if dead_lists or dead_blobs:
+            bump_prune_generation(conn)
+        conn.commit()
+        return len(dead_blobs)
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+def search_messages(query: str, db_path: str = "checkpoints.db", limit: int = 20) -> List[Dict]:
+    """
+    Find threads whose human or AI messages contain every word of the query.
+    Returns thread hits, best first, with a bm25 score, the number of
+    matching messages and a snippet of the best match.
+    """
+    with MessageIndex(db_path) as index:
+        return index.search(query, limit)
+
+def backfill_search_index(db_path: str = "checkpoints.db") -> Dict:
+    """Add messages of checkpoints written before the search index existed."""
+    return backfill(db_path)
@@ -0,0 +1,313 @@
+"""
+Message Search - Full-Text Index of Stored Conversations
+Keeps an SQLite FTS5 index of human and AI message text next to the
+checkpoints, so support leads can find every thread that mentioned a CVE or a
+customer name without deserializing checkpoints. IndexedSqliteSaver updates
+the index as checkpoints are written. Each message is indexed once per thread,
+keyed by its id, so a turn only adds its new messages. Threads that already
+existed are added with the backfill command.
+
+Usage:
+    memory = IndexedSqliteSaver(conn, serde=CompactSerializer("checkpoints.db"))
+
+    python message_search.py "CVE-2024-3400"          # ranked threads with snippets
+    python message_search.py --backfill               # index existing checkpoints
+    python message_search.py --benchmark              # query time on a synthetic index
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:
+    SqliteSaver = None
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_index (
+    id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    indexed_at REAL NOT NULL,
+    UNIQUE (thread_id, message_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+    content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Message types whose text is indexed; system prompts and tool output are left out
+INDEXED_ROLES = ("human", "ai")
+
+# Threads whose indexed message ids are remembered per process
+SEEN_THREADS = 1024
+
+SNIPPET_TOKENS = 16
+
+
+def message_text(message: Any) -> str:
+    """Text of a message's content, which may be a string or a list of content blocks."""
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    return " ".join(block if isinstance(block, str) else block.get("text", "")
+                    for block in content or [] if isinstance(block, (str, dict)))
+
+
+def build_match(query: str) -> str:
+    """
+    FTS5 MATCH expression for a plain query: every word must appear. Words are
+    quoted so punctuation such as the dashes in CVE-2024-3400 matches the
+    adjacent tokens instead of being read as query syntax.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return " ".join(terms)
+
+
+class MessageIndex:
+    """FTS5 index of message text, stored in the checkpoint database."""
+
+    def __init__(self, db_path: str = "checkpoints.db"):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # thread_id -> message ids already indexed
+        self.seen: "OrderedDict[str, set]" = OrderedDict()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "MessageIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _seen(self, thread_id: str) -> set:
+        ids = self.seen.get(thread_id)
+        if ids is None:
+            ids = {message_id for (message_id,) in self.conn.execute(
+                "SELECT message_id FROM message_index WHERE thread_id = ?", (thread_id,))}
+            self.seen[thread_id] = ids
+        self.seen.move_to_end(thread_id)
+        while len(self.seen) > SEEN_THREADS:
+            self.seen.popitem(last=False)
+        return ids
+
+    def index_messages(self, thread_id: str, messages: List[Any]) -> int:
+        """Index the messages of a thread not indexed yet; returns how many were added."""
+        added = 0
+        with self.lock:
+            seen = self._seen(thread_id)
+            new = [message for message in messages
+                   if getattr(message, "type", None) in INDEXED_ROLES
+                   and getattr(message, "id", None) and message.id not in seen]
+            if not new:
+                return 0
+            with self.conn:
+                now = time.time()
+                for message in new:
+                    seen.add(message.id)
+                    text = message_text(message).strip()
+                    if not text:
+                        continue
+                    cursor = self.conn.execute(
+                        "INSERT OR IGNORE INTO message_index (thread_id, message_id, role, indexed_at) VALUES (?, ?, ?, ?)",
+                        (thread_id, message.id, message.type, now),
+                    )
+                    if cursor.rowcount:
+                        self.conn.execute("INSERT INTO message_fts (rowid, content) VALUES (?, ?)",
+                                          (cursor.lastrowid, text))
+                        added += 1
+        return added
+
+    def index_checkpoint(self, thread_id: str, checkpoint: Dict) -> int:
+        messages = checkpoint.get("channel_values", {}).get("messages")
+        return self.index_messages(thread_id, messages) if isinstance(messages, list) else 0
+
+    def delete_thread(self, thread_id: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM message_fts WHERE rowid IN (SELECT id FROM message_index WHERE thread_id = ?)",
+                (thread_id,))
+            self.conn.execute("DELETE FROM message_index WHERE thread_id = ?", (thread_id,))
+            self.seen.pop(thread_id, None)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Threads matching every word of the query, best first. Each hit has the
+        thread's best bm25 score, its number of matching messages, and a
+        snippet of the best message with matches in [brackets].
+        """
+        match = build_match(query)
+        if not match:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                "WITH hits AS ("
+                " SELECT f.rowid AS id, i.thread_id, i.role, f.rank AS rank FROM message_fts f"
+                " JOIN message_index i ON i.id = f.rowid WHERE message_fts MATCH ?),"
+                " ranked AS ("
+                " SELECT id, thread_id, role, rank,"
+                " ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY rank) AS position,"
+                " COUNT(*) OVER (PARTITION BY thread_id) AS matches FROM hits)"
+                " SELECT id, thread_id, role, rank, matches FROM ranked WHERE position = 1"
+                " ORDER BY rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+            results = []
+            for rowid, thread_id, role, rank, matches in rows:
+                (snippet,) = self.conn.execute(
+                    f"SELECT snippet(message_fts, 0, '[', ']', '...', {SNIPPET_TOKENS}) FROM message_fts"
+                    " WHERE message_fts MATCH ? AND rowid = ?",
+                    (match, rowid),
+                ).fetchone()
+                results.append({
+                    "thread_id": thread_id,
+                    "score": round(-rank, 3),
+                    "matches": matches,
+                    "role": role,
+                    "snippet": snippet,
+                })
+        return results
+
+    def stats(self) -> Dict:
+        with self.lock:
+            messages, threads = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT thread_id) FROM message_index").fetchone()
+        return {"indexed_messages": messages, "indexed_threads": threads}
+
+
+def backfill(db_path: str = "checkpoints.db", index: MessageIndex = None) -> Dict:
+    """Index the latest checkpoint of every thread already in the database."""
+    if SqliteSaver is None:
+        raise RuntimeError("Backfilling needs langgraph-checkpoint-sqlite to read checkpoints")
+    from compact_checkpoint import CompactSerializer
+
+    own_index = index is None
+    index = index or MessageIndex(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    serde = CompactSerializer(db_path)
+    saver = SqliteSaver(conn, serde=serde)
+    try:
+        try:
+            threads = [row[0] for row in conn.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+        except sqlite3.OperationalError:
+            threads = []
+        added = 0
+        for thread_id in threads:
+            checkpoint = saver.get_tuple({"configurable": {"thread_id": thread_id}})
+            if checkpoint is not None:
+                added += index.index_checkpoint(thread_id, checkpoint.checkpoint)
+    finally:
+        conn.close()
+        serde.conn.close()
+        if own_index:
+            index.close()
+    return {"threads": len(threads), "messages_added": added}
+
+
+if SqliteSaver is not None:
+    class IndexedSqliteSaver(SqliteSaver):
+        """SqliteSaver that adds new messages to the search index as checkpoints are written."""
+
+        def __init__(self, conn: sqlite3.Connection, *args, index: MessageIndex = None, **kwargs):
+            super().__init__(conn, *args, **kwargs)
+            if index is None:
+                db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+                index = MessageIndex(db_path)
+            self.index = index
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            # The checkpoint is saved; a failure here only leaves the search index behind
+            try:
+                self.index.index_checkpoint(config["configurable"]["thread_id"], checkpoint)
+            except sqlite3.Error as e:
+                print(f"Warning: could not update message search index: {e}")
+            return next_config
+
+
+class _Message:
+    def __init__(self, id: str, type: str, content: str):
+        self.id, self.type, self.content = id, type, content
+
+
+def benchmark(threads: int = 5000, messages: int = 20, queries: int = 200):
+    """Index a synthetic message set and time searches against it."""
+    words = ("password reset firewall phishing email vpn router ransomware backup endpoint "
+             "patch update malware scan alert incident account login mfa token breach").split()
+    names = ["Alice Jones", "Bob Smith", "Carol White", "Dan Brown", "Erin Green"]
+    cves = [f"CVE-2024-{n}" for n in range(1000, 1200)]
+    random.seed(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = MessageIndex(os.path.join(tmp, "bench.db"))
+        started = time.perf_counter()
+        for t in range(threads):
+            batch = []
+            for m in range(messages):
+                text = " ".join(random.choices(words, k=30))
+                if random.random() < 0.02:
+                    text += f" about {random.choice(cves)}"
+                if m == 0 and random.random() < 0.1:
+                    text = f"Hi, I'm {random.choice(names)}. " + text
+                batch.append(_Message(f"{t}-{m}", "human" if m % 2 == 0 else "ai", text))
+            index.index_messages(f"thread-{t}", batch)
+        build = time.perf_counter() - started
+
+        timings = []
+        for q in range(queries):
+            query = random.choice(cves) if q % 2 == 0 else random.choice(names)
+            started = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        stats = index.stats()
+        index.close()
+        print(f"Indexed {stats['indexed_messages']} messages in {stats['indexed_threads']} threads in {build:.1f}s")
+        print(f"Search over {queries} CVE / customer-name queries:")
+        print(f"  p50 {timings[len(timings) // 2] * 1000:.2f} ms, p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms, "
+              f"max {timings[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search across stored conversations')
+    parser.add_argument('query', nargs='?', help='Words to search for (all must appear)')
+    parser.add_argument('--db', default='checkpoints.db', help='Checkpoint database (default: checkpoints.db)')
+    parser.add_argument('--limit', type=int, default=20, help='Threads to return (default: 20)')
+    parser.add_argument('--backfill', action='store_true', help='Index messages of existing checkpoints')
+    parser.add_argument('--benchmark', action='store_true', help='Time searches on a synthetic index')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+    elif args.backfill:
+        started = time.perf_counter()
+        result = backfill(args.db)
+        print(f"Indexed {result['messages_added']} new messages from {result['threads']} threads "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif args.query:
+        started = time.perf_counter()
+        with MessageIndex(args.db) as index:
+            results = index.search(args.query, args.limit)
+        print(f"{len(results)} threads ({(time.perf_counter() - started) * 1000:.1f} ms)")
+        for hit in results:
+            print(f"\n{hit['thread_id']}  score {hit['score']}  ({hit['matches']} matching messages)")
+            print(f"  {hit['role']}: {hit['snippet']}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,45 @@ Network Scanner for Local Devices
 Scans the local network to identify connected devices, including Shark robotic vacuums.
 """
 
+import os
 import socket
+import struct
 import subprocess
+import sys
 import re
 import platform
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Tuple
+import asyncio
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Dict, Tuple, Union
 import ipaddress
+import argparse
+from scan_checkpoint import ScanCheckpoint
+from oui_db import lookup_vendor
+from device_inventory import DeviceInventory, DEFAULT_MAX_AGE, print_changes
+from passive_discovery import passive_discover, merge_device_records
+from host_discovery import discover_hosts, check_ports_async, read_neighbor_table
+from fingerprint import RuleEngine, get_default_engine
+
+
+ROUTE_TABLE = "/proc/net/route"
+
+# Ports checked on each device to help identify its type
+DEVICE_PORTS = [80, 443, 8080, 8443, 22, 23, 5000]
+
+# Per-stage limits (seconds) for device enrichment; 'port' is per connect,
+# 'ports' bounds the whole port check
+ENRICH_TIMEOUTS = {
+    'mac': 2.0,
+    'hostname': 2.0,
+    'port': 0.5,
+    'ports': 1.0,
+}
+
+# How often iter_scan_network checks its cancel event while no events arrive (seconds)
+CANCEL_POLL = 0.25
 
 
 def get_local_ip() -> str:
@@ -23,36 +55,125 @@ def get_local_ip() -> str:
         return local_ip
     except Exception as e:
         print(f"Error getting local IP: {e}")
-        return "192.168.40.1"  # Default to gateway network
+    
+    # No default route; fall back to whatever the hostname resolves to
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except Exception:
+        return "127.0.0.1"
 
 
-def get_network_range(local_ip: str = None) -> str:
-    """Return the configured network range."""
-    # Fixed network range for 192.168.40.0/24
-    return "192.168.40.0/24"
+def _read_route_table(path: str = ROUTE_TABLE) -> List[Tuple[ipaddress.IPv4Network, str]]:
+    """Parse directly connected subnets from the Linux kernel route table."""
+    networks = []
+    with open(path, 'r') as f:
+        for line in f.readlines()[1:]:
+            fields = line.split()
+            if len(fields) < 8:
+                continue
+            iface, destination, flags, mask = fields[0], fields[1], int(fields[3], 16), fields[7]
+            # Skip the default route and anything reached through a gateway
+            if destination == '00000000' or flags & 0x2:
+                continue
+            address = socket.inet_ntoa(struct.pack('<L', int(destination, 16)))
+            netmask = socket.inet_ntoa(struct.pack('<L', int(mask, 16)))
+            networks.append((ipaddress.ip_network(f"{address}/{netmask}", strict=False), iface))
+    return networks
+
+
+def _read_ipconfig() -> List[Tuple[ipaddress.IPv4Network, str]]:
+    """Parse IPv4 address/mask pairs from `ipconfig` (Windows) or `ifconfig` output."""
+    command = ['ipconfig'] if platform.system().lower() == 'windows' else ['ifconfig']
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, timeout=5).stdout
+    networks = []
+    iface = "unknown"
+    address = None
+    for line in output.splitlines():
+        if line and not line[0].isspace():
+            # "eth0: flags=...", "Ethernet adapter Wi-Fi:" or net-tools' "eth0      Link encap:..."
+            iface = re.split(r':|\s{2,}', line, maxsplit=1)[0].strip()
+        ip_match = re.search(r'(?:IPv4 Address[ .]*: |inet (?:addr:)?)(\d+\.\d+\.\d+\.\d+)', line)
+        if ip_match:
+            address = ip_match.group(1)
+        mask_match = re.search(r'(?:Subnet Mask[ .]*: |netmask |Mask:)(0x[0-9a-fA-F]{8}|\d+\.\d+\.\d+\.\d+)', line)
+        if address and mask_match:
+            mask = mask_match.group(1)
+            if mask.startswith('0x'):
+                mask = socket.inet_ntoa(struct.pack('!L', int(mask, 16)))
+            networks.append((ipaddress.ip_network(f"{address}/{mask}", strict=False), iface))
+            address = None
+    return networks
 
 
-def ping_host(ip: str) -> Tuple[str, bool]:
-    """Ping a single IP address to check if it's alive."""
+def get_local_networks(max_prefix: int = 16) -> List[Tuple[ipaddress.IPv4Network, str]]:
+    """
+    Detect the IPv4 subnets of all local interfaces as (network, interface).
+    Loopback and link-local networks are skipped, as are networks larger than
+    /max_prefix, which should be scanned explicitly with --range.
+    """
     try:
-        # Windows uses -n for count, Linux/Mac use -c
-        param = '-n' if platform.system().lower() == 'windows' else '-c'
-        command = ['ping', param, '1', '-w', '1000', ip]
-        
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=2
-        )
-        
-        return (ip, result.returncode == 0)
-    except Exception:
-        return (ip, False)
+        if os.path.exists(ROUTE_TABLE):
+            candidates = _read_route_table()
+        else:
+            candidates = _read_ipconfig()
+    except Exception as e:
+        print(f"Error detecting local networks: {e}")
+        return []
+    
+    networks = []
+    for network, iface in candidates:
+        if network.is_loopback or network.is_link_local or network in [n for n, _ in networks]:
+            continue
+        if network.prefixlen < max_prefix:
+            print(f"Skipping {network} on {iface} (larger than /{max_prefix}; use --range to scan it)")
+            continue
+        networks.append((network, iface))
+    return networks
+
 
+def normalize_ranges(network_ranges: Iterable[str], max_prefix: int = 16) -> List[str]:
+    """
+    Parse CIDR ranges for scanning. Raises ValueError for anything that is not
+    IPv4 or is larger than /max_prefix. Duplicates and ranges contained in
+    another given range are dropped, so every address belongs to one range.
+    """
+    networks = []
+    for network_range in network_ranges:
+        network = ipaddress.ip_network(network_range.strip(), strict=False)
+        if network.version != 4:
+            raise ValueError(f"Only IPv4 ranges can be scanned: {network_range}")
+        if network.prefixlen < max_prefix:
+            raise ValueError(f"Range {network_range} is larger than /{max_prefix}")
+        networks.append(network)
+    
+    unique = list(dict.fromkeys(networks))
+    kept = []
+    for network in sorted(unique, key=lambda n: n.prefixlen):
+        if not any(network.subnet_of(other) for other in kept):
+            kept.append(network)
+    # Keep the order the ranges were given in
+    return [str(network) for network in unique if network in kept]
 
-def get_mac_address(ip: str) -> str:
-    """Get MAC address for an IP using ARP."""
+
+def get_network_range(local_ip: str = None) -> str:
+    """Return the subnet of the interface holding local_ip (a /24 if unknown)."""
+    local_ip = local_ip or get_local_ip()
+    address = ipaddress.ip_address(local_ip)
+    for network, _ in get_local_networks():
+        if address in network:
+            return str(network)
+    return str(ipaddress.ip_network(f"{local_ip}/24", strict=False))
+
+
+def get_mac_address(ip: str, neighbors: Dict[str, str] = None) -> str:
+    """
+    Get MAC address for an IP. Uses the pre-read neighbor table when given,
+    falling back to the arp command where no table is available.
+    """
+    if neighbors is not None:
+        return neighbors.get(ip, "Unknown")
+    
     try:
         # Run arp command to get MAC address
         result = subprocess.run(
@@ -84,104 +205,350 @@ def get_hostname(ip: str) -> str:
         return "Unknown"
 
 
-def check_common_ports(ip: str) -> List[int]:
-    """Check common ports to identify device type."""
-    common_ports = [80, 443, 8080, 8443, 22, 23, 5000]
-    open_ports = []
-    
-    for port in common_ports:
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex((ip, port))
-            sock.close()
-            
-            if result == 0:
-                open_ports.append(port)
-        except Exception:
-            pass
-    
-    return open_ports
+def check_common_ports(ip: str, timeout: float = 0.5) -> List[int]:
+    """Check common ports concurrently to identify device type."""
+    try:
+        return asyncio.run(check_ports_async(ip, DEVICE_PORTS, timeout))
+    except Exception:
+        return []
+
 
+async def _with_timeout(coro, timeout: float, default):
+    """Await a stage, returning a default instead of failing the whole record."""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except Exception:
+        return default
 
-def identify_shark_vacuum(ip: str, mac: str, hostname: str, ports: List[int]) -> bool:
+
+async def enrich_device(ip: str, neighbors: Dict[str, str] = None,
+                        lookup_pool: ThreadPoolExecutor = None,
+                        timeouts: Dict[str, float] = None) -> Dict:
     """
-    Identify if a device is likely a Shark vacuum based on various indicators.
+    Gather MAC, hostname and open ports for one device with all three
+    lookups running at once, each bounded by its own timeout.
     """
-    indicators = []
+    loop = asyncio.get_running_loop()
+    timeouts = {**ENRICH_TIMEOUTS, **(timeouts or {})}
     
-    # Check hostname for Shark-related keywords
-    hostname_lower = hostname.lower()
-    shark_keywords = ['shark', 'rvac', 'robot', 'vacuum', 'iq', 'ion']
+    if neighbors is not None:
+        mac_lookup = asyncio.sleep(0, neighbors.get(ip, "Unknown"))
+    else:
+        mac_lookup = loop.run_in_executor(lookup_pool, get_mac_address, ip)
     
-    if any(keyword in hostname_lower for keyword in shark_keywords):
-        indicators.append(f"Hostname contains Shark-related keyword: {hostname}")
+    mac, hostname, ports = await asyncio.gather(
+        _with_timeout(mac_lookup, timeouts['mac'], "Unknown"),
+        _with_timeout(loop.run_in_executor(lookup_pool, get_hostname, ip), timeouts['hostname'], "Unknown"),
+        _with_timeout(check_ports_async(ip, DEVICE_PORTS, timeouts['port']), timeouts['ports'], []),
+    )
     
-    # Check MAC address vendor (Shark vacuums often use specific manufacturers)
-    # Common IoT device manufacturers
-    mac_prefix = mac.replace(':', '').replace('-', '')[:6]
+    return {
+        'ip': ip,
+        'mac': mac,
+        'vendor': lookup_vendor(mac) if mac != "Unknown" else "Unknown",
+        'hostname': hostname,
+        'open_ports': ports
+    }
+
+
+async def enrich_devices_stream(ips: Iterable[str], neighbors: Dict[str, str] = None,
+                                concurrency: int = 32,
+                                timeouts: Dict[str, float] = None) -> AsyncIterator[Dict]:
+    """
+    Enrich many devices concurrently, yielding each record as soon as it is
+    complete rather than in input order.
+    """
+    # Reverse DNS and arp are blocking calls; give them their own threads so a
+    # slow resolver cannot starve the event loop's default executor
+    lookup_pool = ThreadPoolExecutor(max_workers=concurrency * 2)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def bounded(ip: str) -> Dict:
+        async with semaphore:
+            return await enrich_device(ip, neighbors, lookup_pool, timeouts)
     
-    # Check for common IoT device ports
-    if 8080 in ports or 8443 in ports:
-        indicators.append(f"IoT-common ports open: {ports}")
+    tasks = [asyncio.ensure_future(bounded(ip)) for ip in ips]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        lookup_pool.shutdown(wait=False)
+
+
+def enrich_devices(ips: Iterable[str], neighbors: Dict[str, str] = None, concurrency: int = 32,
+                   on_device: Callable[[Dict], None] = None) -> List[Dict]:
+    """Synchronous wrapper around enrich_devices_stream."""
+    async def collect() -> List[Dict]:
+        devices = []
+        async for device in enrich_devices_stream(ips, neighbors, concurrency):
+            devices.append(device)
+            if on_device:
+                on_device(device)
+        return devices
     
-    return len(indicators) > 0, indicators
+    return asyncio.run(collect())
+
 
+SHARK_DEVICE_TYPE = "Shark robot vacuum"
 
-def scan_network(network_range: str, max_workers: int = 50) -> List[Dict]:
-    """Scan the network range for active devices."""
-    print(f"Scanning network: {network_range}")
-    print("This may take a minute or two...\n")
+
+def identify_shark_vacuum(ip: str, mac: str, hostname: str, ports: List[int], vendor: str = None,
+                          announced: List[str] = None, engine: RuleEngine = None,
+                          min_confidence: float = 0.0) -> Tuple[bool, List[str]]:
+    """
+    Identify if a device is likely a Shark vacuum using the fingerprint rules.
+    Returns (is_shark, reasons), where reasons names each matched rule.
+    The vendor is looked up from the MAC address if not supplied. `announced`
+    holds names the device advertised itself under (mDNS instances, SSDP server).
+    """
+    device = {
+        'ip': ip, 'mac': mac, 'hostname': hostname, 'open_ports': ports,
+        'vendor': vendor or lookup_vendor(mac), 'names': announced or [],
+    }
+    for match in (engine or get_default_engine()).classify(device):
+        if match['device_type'] == SHARK_DEVICE_TYPE and match['confidence'] >= min_confidence:
+            return True, [f"Matched rule: {name}" for name in match['rules']]
+    return False, []
+
+
+def host_count(network: ipaddress.IPv4Network) -> int:
+    """Number of usable host addresses in a network, without enumerating it."""
+    if network.prefixlen >= 31:
+        return network.num_addresses
+    return network.num_addresses - 2
+
+
+def _network_hosts(network: ipaddress.IPv4Network) -> Iterator[Tuple[int, str]]:
+    base = int(network.network_address)
+    for ip in network.hosts():
+        yield int(ip) - base, str(ip)
+
+
+def iter_hosts(networks: List[ipaddress.IPv4Network],
+               skip: Callable[[ipaddress.IPv4Network, int], bool] = None) -> Iterator[str]:
+    """
+    Lazily yield host addresses from several networks, round-robin across
+    them so a large subnet does not starve the small ones. `skip(network, offset)`
+    can filter out addresses that are already done.
+    """
+    generators = [(network, _network_hosts(network)) for network in networks]
+    while generators:
+        remaining = []
+        for network, generator in generators:
+            for offset, ip in generator:
+                if skip and skip(network, offset):
+                    continue
+                yield ip
+                remaining.append((network, generator))
+                break
+        generators = remaining
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def scan_network(network_range: Union[str, List[str]], max_workers: int = None,
+                 checkpoint: ScanCheckpoint = None,
+                 on_device: Callable[[Dict], None] = None,
+                 inventory: DeviceInventory = None,
+                 max_age: float = DEFAULT_MAX_AGE,
+                 on_progress: Callable[[str, int, int], None] = None,
+                 stop: threading.Event = None,
+                 verbose: bool = True) -> List[Dict]:
+    """
+    Scan one or more network ranges for active devices.
+    Discovery is scheduled across all ranges at once with bounded concurrency,
+    generating addresses lazily so /16s and larger never become lists.
+    If a checkpoint is given, addresses already pinged are skipped and the
+    ping sweep progress is saved periodically so the scan can be resumed.
+    `on_device` is called with each device record as soon as it is enriched.
+    With an inventory, hosts whose stored record is still current (same MAC
+    and IP, enriched within max_age seconds) reuse it instead of being
+    re-enriched; those records are marked 'cached'.
+    `on_progress(stage, done, total)` is called as addresses are probed
+    ('discovery') and devices enriched ('enrichment'). Setting `stop` ends
+    the sweep early and skips enrichment of hosts not yet started. Set
+    `verbose` to False to keep it from printing progress.
+    """
+    log = print if verbose else _quiet
+    network_ranges = [network_range] if isinstance(network_range, str) else list(network_range)
+    networks = [ipaddress.ip_network(r, strict=False) for r in network_ranges]
+    # Map each address back to its range for checkpointing
+    range_keys = dict(zip(networks, network_ranges))
     
-    # Generate list of IPs to scan
-    network = ipaddress.ip_network(network_range, strict=False)
-    ip_list = [str(ip) for ip in network.hosts()]
+    log(f"Scanning network: {', '.join(network_ranges)}")
+    log("This may take a minute or two...\n")
     
+    total = sum(host_count(network) for network in networks)
     active_devices = []
+    skipped = 0
     
-    # Ping sweep with threading
-    print(f"Step 1/3: Pinging {len(ip_list)} addresses...")
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ip = {executor.submit(ping_host, ip): ip for ip in ip_list}
-        
-        completed = 0
-        for future in as_completed(future_to_ip):
-            ip, is_alive = future.result()
-            completed += 1
-            
-            if completed % 50 == 0:
-                print(f"  Progress: {completed}/{len(ip_list)}")
-            
-            if is_alive:
-                active_devices.append(ip)
-    
-    print(f"Found {len(active_devices)} active devices\n")
+    if checkpoint:
+        for network in networks:
+            key = range_keys[network]
+            base = int(network.network_address)
+            active_devices.extend(str(ipaddress.ip_address(base + offset)) for offset in checkpoint.hits(key))
+            skipped += checkpoint.done_count(key)
+        if skipped:
+            log(f"Resuming: {skipped} addresses already pinged, {len(active_devices)} alive\n")
     
-    # Get details for each active device
-    print("Step 2/3: Gathering device information...")
-    devices_info = []
+    def already_pinged(network: ipaddress.IPv4Network, offset: int) -> bool:
+        return checkpoint.is_done(range_keys[network], offset)
+    
+    # Asynchronous sweep (TCP connect + unprivileged ICMP) instead of a ping process per address
+    log(f"Step 1/3: Probing {total} addresses...")
+    completed = skipped
+    progress_step = max(50, total // 20)
     
-    for idx, ip in enumerate(active_devices, 1):
-        print(f"  Scanning device {idx}/{len(active_devices)}: {ip}")
+    def record(ip: str, is_alive: bool):
+        nonlocal completed
+        completed += 1
         
-        mac = get_mac_address(ip)
-        hostname = get_hostname(ip)
-        ports = check_common_ports(ip)
+        if checkpoint:
+            address = ipaddress.ip_address(ip)
+            for network in networks:
+                if address in network:
+                    checkpoint.mark(range_keys[network], int(address) - int(network.network_address), is_alive)
+                    break
         
-        device_info = {
-            'ip': ip,
-            'mac': mac,
-            'hostname': hostname,
-            'open_ports': ports
-        }
+        if completed % progress_step == 0:
+            log(f"  Progress: {completed}/{total}")
+        if on_progress:
+            on_progress('discovery', completed, total)
         
-        devices_info.append(device_info)
+        if is_alive:
+            active_devices.append(ip)
+    
+    hosts = iter_hosts(networks, already_pinged if checkpoint else None)
+    if stop:
+        hosts = itertools.takewhile(lambda _: not stop.is_set(), hosts)
+    
+    try:
+        discover_hosts(hosts, concurrency=max_workers, on_result=record)
+    except KeyboardInterrupt:
+        if checkpoint:
+            checkpoint.save()
+            log(f"\nInterrupted - progress saved to {checkpoint.path}")
+        raise
+    
+    log(f"Found {len(active_devices)} active devices\n")
+    
+    # Get details for each active device
+    log("Step 2/3: Gathering device information...")
+    devices_info = []
+    
+    # The sweep has populated the ARP cache; read it once for every device
+    neighbors = read_neighbor_table()
+    
+    def report(device: Dict):
+        devices_info.append(device)
+        label = " [unchanged]" if device.get('cached') else ""
+        log(f"  Device {len(devices_info)}/{len(active_devices)}: {device['ip']} ({device['hostname']}){label}")
+        if on_device:
+            on_device(device)
+        if on_progress:
+            on_progress('enrichment', len(devices_info), len(active_devices))
+    
+    to_enrich = active_devices
+    if inventory:
+        to_enrich = []
+        for ip in active_devices:
+            mac = neighbors.get(ip) if neighbors is not None else None
+            cached = inventory.cached_device(ip, mac, max_age)
+            if cached:
+                report(dict(cached, cached=True))
+            else:
+                to_enrich.append(ip)
+        log(f"  {len(active_devices) - len(to_enrich)} unchanged device(s) reused from inventory, "
+            f"{len(to_enrich)} to enrich")
+    
+    if stop and stop.is_set():
+        return devices_info
+    enrich_devices(to_enrich, neighbors, on_device=report)
     
     return devices_info
 
 
+def iter_scan_network(network_ranges: List[str], max_workers: int = None,
+                      inventory: DeviceInventory = None,
+                      max_age: float = DEFAULT_MAX_AGE,
+                      cancel: threading.Event = None) -> Iterator[Dict]:
+    """
+    Run scan_network in a background thread and yield its events, for callers
+    other than the CLI: {'type': 'progress', 'stage', 'done', 'total'} and
+    {'type': 'device', ...} for each enriched device, including its
+    fingerprint classification. Stop iterating to abandon the scan, or set
+    `cancel`: the generator then ends within CANCEL_POLL seconds, even while
+    the sweep is producing no events, and the scan stops feeding new hosts.
+    """
+    events = queue.Queue()
+    stop = threading.Event()
+    engine = get_default_engine()
+    done = object()
+    
+    def on_device(device: Dict):
+        events.put(dict(device, type='device', classification=engine.classify(device)))
+    
+    def on_progress(stage: str, completed: int, total: int):
+        events.put({'type': 'progress', 'stage': stage, 'done': completed, 'total': total})
+    
+    def run():
+        try:
+            scan_network(network_ranges, max_workers=max_workers, on_device=on_device, inventory=inventory,
+                         max_age=max_age, on_progress=on_progress, stop=stop, verbose=False)
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(done)
+    
+    thread = threading.Thread(target=run, name="network-scan", daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                event = events.get(timeout=CANCEL_POLL)
+            except queue.Empty:
+                event = None
+            if cancel is not None and cancel.is_set():
+                break
+            if event is None:
+                continue
+            if event is done:
+                break
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    finally:
+        stop.set()
+
+
 def main():
     """Main function to run the network scanner."""
+    parser = argparse.ArgumentParser(description='Scan the local network for devices, including Shark vacuums')
+    parser.add_argument('--range', '-r', action='append', help='Network range(s) to scan in CIDR form, e.g. 10.0.0.0/16; repeat or comma-separate for several. Defaults to all local subnets.')
+    parser.add_argument('--max-prefix', type=int, default=16, help='Largest network --range may name, as a prefix length (default: 16)')
+    parser.add_argument('--concurrency', '-c', type=int, help='Maximum addresses probed at once (default: based on the open-file limit)')
+    parser.add_argument('--incremental', '-i', action='store_true', help='Only fully re-enrich hosts that are new, changed or stale in the device inventory')
+    parser.add_argument('--max-age', type=float, default=DEFAULT_MAX_AGE / 3600, help='Hours before an unchanged device is re-enriched in incremental mode (default: 24)')
+    parser.add_argument('--inventory', default='devices.db', help='SQLite device inventory updated on each run (default: devices.db)')
+    parser.add_argument('--passive', '-p', action='store_true', help='Also listen for mDNS/SSDP announcements and the ARP cache, and merge them with the scan')
+    parser.add_argument('--passive-only', action='store_true', help='Only use passive discovery; no addresses are probed')
+    parser.add_argument('--listen', type=float, default=3.0, help='Seconds to listen for passive announcements (default: 3)')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted scan from its saved state file')
+    parser.add_argument('--state-file', default='.network_scan_state', help='Scan state file used for checkpointing (default: .network_scan_state)')
+    parser.add_argument('--rules', help='Device fingerprint rules file (JSON, or YAML with PyYAML installed; default: data/fingerprint_rules.json)')
+    parser.add_argument('--min-confidence', type=float, default=0.3, help='Minimum confidence to report a device as a possible Shark vacuum (default: 0.3)')
+    args = parser.parse_args()
+    
+    try:
+        engine = RuleEngine.load(args.rules) if args.rules else get_default_engine()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: Could not load fingerprint rules: {e}")
+        sys.exit(1)
+    
     print("=" * 60)
     print("Network Scanner - Shark Vacuum Locator")
     print("=" * 60)
@@ -189,14 +556,46 @@ def main():
     
     # Get local network information
     local_ip = get_local_ip()
-    network_range = get_network_range(local_ip)
+    
+    if args.range:
+        try:
+            network_ranges = normalize_ranges([r for value in args.range for r in value.split(',') if r.strip()],
+                                              args.max_prefix)
+        except ValueError as e:
+            print(f"Error: Invalid network range: {e}")
+            sys.exit(1)
+    else:
+        network_ranges = [str(network) for network, _ in get_local_networks()] or [get_network_range(local_ip)]
     
     print(f"Your local IP: {local_ip}")
-    print(f"Scanning network: {network_range}")
+    print(f"Scanning network(s): {', '.join(network_ranges)}")
     print()
     
     # Scan the network
-    devices = scan_network(network_range)
+    checkpoint = ScanCheckpoint.load(args.state_file, 'network')
+    for network_range in network_ranges:
+        checkpoint.start(network_range, ipaddress.ip_network(network_range, strict=False).num_addresses, resume=args.resume)
+    inventory = DeviceInventory(args.inventory)
+    passive = {}
+    if args.passive or args.passive_only:
+        print(f"Listening for device announcements (mDNS/SSDP/ARP) for {args.listen:.0f}s...")
+        passive = passive_discover(args.listen)
+        print(f"Found {len(passive)} device(s) passively\n")
+    
+    if args.passive_only:
+        devices = merge_device_records([], passive)
+        # Silent devices are not a sign of absence, and nothing was enriched
+        changes = inventory.record_scan(devices, [], enriched=[])
+    else:
+        devices = scan_network(network_ranges, max_workers=args.concurrency, checkpoint=checkpoint,
+                               inventory=inventory if args.incremental else None,
+                               max_age=args.max_age * 3600)
+        for network_range in network_ranges:
+            checkpoint.finish(network_range)
+        devices = merge_device_records(devices, passive)
+        changes = inventory.record_scan(devices, network_ranges,
+                                        enriched=[d['ip'] for d in devices if not d.get('cached')])
+    inventory.close()
     
     # Analyze devices
     print("\nStep 3/3: Analyzing devices...")
@@ -205,25 +604,25 @@ def main():
     print("=" * 60)
     
     shark_candidates = []
+    classifications = engine.classify_devices(devices)
     
-    for device in devices:
+    for device, matches in zip(devices, classifications):
         print(f"\nIP Address: {device['ip']}")
         print(f"  MAC Address: {device['mac']}")
+        print(f"  Vendor: {device['vendor']}")
         print(f"  Hostname: {device['hostname']}")
         print(f"  Open Ports: {device['open_ports'] if device['open_ports'] else 'None detected'}")
+        if device.get('services'):
+            print(f"  Announced Services: {', '.join(device['services'])}")
+        if matches:
+            print("  Device Type: " + ", ".join(f"{m['device_type']} ({m['confidence']:.0%})" for m in matches))
         
         # Check if it might be a Shark vacuum
-        is_shark, indicators = identify_shark_vacuum(
-            device['ip'],
-            device['mac'],
-            device['hostname'],
-            device['open_ports']
-        )
-        
-        if is_shark:
-            print(f"  ⭐ POSSIBLE SHARK VACUUM:")
-            for indicator in indicators:
-                print(f"     - {indicator}")
+        shark = next((m for m in matches if m['device_type'] == SHARK_DEVICE_TYPE), None)
+        if shark and shark['confidence'] >= args.min_confidence:
+            print(f"  ⭐ POSSIBLE SHARK VACUUM ({shark['confidence']:.0%} confidence):")
+            for rule in shark['rules']:
+                print(f"     - Matched rule: {rule}")
             shark_candidates.append(device)
     
     # Summary
@@ -244,6 +643,8 @@ def main():
         print("  - Currently offline or in sleep mode")
         print("  - On a different network/VLAN")
         print("\nCheck the full device list above for devices with generic names.")
+    
+    print_changes(changes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+"""
+OUI Vendor Database - MAC Prefix to Manufacturer Lookup
+Resolves the vendor of a MAC address from a bundled, compact copy of the IEEE
+MA-L (OUI) registry. The database file is memory-mapped on first use and laid
+out as an open-addressing hash table, so loading costs nothing at startup and
+each lookup is O(1) without building a Python dict of ~35k entries.
+
+File layout (little-endian):
+    header   magic b"OUI2", slot_count (uint32), vendor_count (uint32),
+             entry_count (uint32)
+    keys     slot_count x uint32   24-bit OUI, or EMPTY_SLOT
+    values   slot_count x uint16   index into the vendor table
+    offsets  (vendor_count + 1) x uint32   byte offsets into the names blob
+    names    UTF-8 vendor names, concatenated
+
+Rebuild it from a fresh IEEE download with:
+    python oui_db.py --build oui.txt      (or oui.csv)
+"""
+
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+from typing import Dict, Optional
+
+
+MAGIC = b"OUI2"
+HEADER = struct.Struct("<4sIII")
+EMPTY_SLOT = 0xFFFFFFFF
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "oui_vendors.bin")
+
+# Legal suffixes dropped from vendor names to keep the database small
+_NAME_SUFFIXES = re.compile(
+    r"[\s,.]+(co\.?,?\s*ltd|company\s+limited|co\.?\s*limited|corporation|corp|incorporated|inc|"
+    r"llc|ltd|limited|gmbh|s\.?a|ag|b\.?v|oy|ab|plc|pty|kg|s\.?r\.?l)\.?\s*$",
+    re.IGNORECASE,
+)
+
+
+def _slot(prefix: int, mask: int) -> int:
+    # Fibonacci hashing spreads the sequential OUIs assigned to one vendor
+    return ((prefix * 2654435761) & 0xFFFFFFFF) & mask
+
+
+def normalize_mac(mac: str) -> Optional[int]:
+    """Return the 24-bit OUI of a MAC address, or None if it is not a MAC."""
+    digits = re.sub(r"[^0-9A-Fa-f]", "", mac or "")
+    if len(digits) < 6 or len(digits) > 12:
+        return None
+    return int(digits[:6], 16)
+
+
+def is_locally_administered(mac: str) -> bool:
+    """Randomized/private MACs have the locally administered bit set and no vendor."""
+    prefix = normalize_mac(mac)
+    return prefix is not None and bool((prefix >> 16) & 0x02)
+
+
+def short_vendor_name(name: str) -> str:
+    """Collapse whitespace and strip legal suffixes such as 'Co., Ltd.'."""
+    name = " ".join(name.split())
+    for _ in range(2):
+        name = _NAME_SUFFIXES.sub("", name)
+    return name.strip(" ,.") or name
+
+
+class OUIDatabase:
+    """Read-only view over a memory-mapped OUI database file."""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.slot_count, self.vendor_count, self.entry_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an OUI database (rebuild it with --build)")
+
+        self._mask = self.slot_count - 1
+        self._keys = HEADER.size
+        self._values = self._keys + 4 * self.slot_count
+        self._offsets = self._values + 2 * self.slot_count
+        self._names = self._offsets + 4 * (self.vendor_count + 1)
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def vendor_name(self, index: int) -> str:
+        start, end = struct.unpack_from("<II", self._map, self._offsets + 4 * index)
+        return self._map[self._names + start:self._names + end].decode("utf-8")
+
+    def lookup_prefix(self, prefix: int) -> Optional[str]:
+        slot = _slot(prefix, self._mask)
+        while True:
+            key = struct.unpack_from("<I", self._map, self._keys + 4 * slot)[0]
+            if key == prefix:
+                index = struct.unpack_from("<H", self._map, self._values + 2 * slot)[0]
+                return self.vendor_name(index)
+            if key == EMPTY_SLOT:
+                return None
+            slot = (slot + 1) & self._mask
+
+    def lookup(self, mac: str) -> Optional[str]:
+        """Return the vendor for a MAC address, or None if unknown."""
+        prefix = normalize_mac(mac)
+        if prefix is None:
+            return None
+        return self.lookup_prefix(prefix)
+
+    def close(self):
+        self._map.close()
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_database(path: str = DEFAULT_DB_PATH) -> Optional[OUIDatabase]:
+    """Open the bundled database on first use; None if it is missing."""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                try:
+                    _db = OUIDatabase(path)
+                except (OSError, ValueError) as e:
+                    print(f"OUI database unavailable ({e}); vendor lookup disabled")
+                    _db = False
+    return _db or None
+
+
+def lookup_vendor(mac: str) -> str:
+    """Return the vendor name for a MAC address, or "Unknown"."""
+    if is_locally_administered(mac):
+        return "Private (randomized MAC)"
+    db = get_database()
+    vendor = db.lookup(mac) if db else None
+    return vendor or "Unknown"
+
+
+def parse_registry(path: str) -> Dict[int, str]:
+    """Parse an IEEE MA-L registry download (oui.txt or oui.csv) into {OUI: name}."""
+    entries = {}
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            for row in csv.DictReader(f):
+                assignment = row.get("Assignment", "")
+                if len(assignment) == 6:
+                    entries[int(assignment, 16)] = row.get("Organization Name", "")
+    else:
+        line_pattern = re.compile(r"^([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})\s+\(hex\)\s+(.*)$")
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                match = line_pattern.match(line.strip())
+                if match:
+                    entries[int("".join(match.groups()[:3]), 16)] = match.group(4)
+    return {prefix: short_vendor_name(name) for prefix, name in entries.items() if name.strip()}
+
+
+def build_database(entries: Dict[int, str], path: str = DEFAULT_DB_PATH):
+    """Write {OUI: vendor} entries in the hashed on-disk format."""
+    vendors = sorted(set(entries.values()))
+    if len(vendors) > 0xFFFF:
+        raise ValueError("Too many distinct vendors for a 16-bit index")
+    vendor_index = {name: i for i, name in enumerate(vendors)}
+
+    # Keep the load factor at or below 0.75
+    slot_count = 1
+    while slot_count * 3 < len(entries) * 4:
+        slot_count <<= 1
+    mask = slot_count - 1
+
+    keys = [EMPTY_SLOT] * slot_count
+    values = [0] * slot_count
+    for prefix, name in entries.items():
+        slot = _slot(prefix, mask)
+        while keys[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        keys[slot] = prefix
+        values[slot] = vendor_index[name]
+
+    names = bytearray()
+    offsets = []
+    for name in vendors:
+        offsets.append(len(names))
+        names += name.encode("utf-8")
+    offsets.append(len(names))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, slot_count, len(vendors), len(entries)))
+        f.write(struct.pack(f"<{slot_count}I", *keys))
+        f.write(struct.pack(f"<{slot_count}H", *values))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(names)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Look up MAC vendors or rebuild the OUI database')
+    parser.add_argument('mac', nargs='*', help='MAC address(es) to look up')
+    parser.add_argument('--build', metavar='REGISTRY', help='Rebuild the database from an IEEE oui.txt or oui.csv download')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Database file (default: data/oui_vendors.bin)')
+    args = parser.parse_args()
+
+    if args.build:
+        entries = parse_registry(args.build)
+        build_database(entries, args.db)
+        print(f"Wrote {len(entries)} OUIs ({len(set(entries.values()))} vendors) "
+              f"to {args.db} ({os.path.getsize(args.db)} bytes)")
+    for mac in args.mac:
+        if args.db != DEFAULT_DB_PATH:
+            vendor = OUIDatabase(args.db).lookup(mac) or "Unknown"
+        else:
+            vendor = lookup_vendor(mac)
+        print(f"{mac}  {vendor}")
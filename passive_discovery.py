@@ -0,0 +1,287 @@
+"""
+Passive Discovery - mDNS, SSDP and ARP-Cache Listeners
+Finds devices from what they announce about themselves instead of probing
+them. One multicast mDNS query and one SSDP M-SEARCH are sent, responses are
+collected asynchronously for a short window while the kernel ARP cache is
+watched, and everything is parsed into device records that can be merged with
+the active scanner's results.
+"""
+
+import asyncio
+import socket
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from host_discovery import read_neighbor_table
+from oui_db import lookup_vendor
+from probe_payloads import (DNS_A, DNS_PTR, DNS_SRV, DNS_TXT, MDNS_ADDR, SSDP_ADDR,
+                            build_mdns_query, build_ssdp_search)
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Read a possibly compressed DNS name; returns (name, offset after it)."""
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode("utf-8", errors="replace"))
+        offset += length
+    return ".".join(labels), end if end is not None else offset
+
+
+def parse_dns_records(data: bytes) -> List[Dict]:
+    """Parse the answer, authority and additional records of a DNS message."""
+    _, _, qdcount, ancount, nscount, arcount = struct.unpack_from("!HHHHHH", data, 0)
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        name, offset = _read_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack_from("!HHIH", data, offset)
+        offset += 10
+        rdata_offset = offset
+        offset += rdlength
+
+        record = {"name": name, "type": rtype}
+        if rtype == DNS_A and rdlength == 4:
+            record["address"] = socket.inet_ntoa(data[rdata_offset:rdata_offset + 4])
+        elif rtype == DNS_PTR:
+            record["target"] = _read_name(data, rdata_offset)[0]
+        elif rtype == DNS_SRV:
+            _, _, port = struct.unpack_from("!HHH", data, rdata_offset)
+            record["port"] = port
+            record["target"] = _read_name(data, rdata_offset + 6)[0]
+        elif rtype == DNS_TXT:
+            strings, pos = [], rdata_offset
+            while pos < offset:
+                length = data[pos]
+                strings.append(data[pos + 1:pos + 1 + length].decode("utf-8", errors="replace"))
+                pos += 1 + length
+            record["txt"] = [s for s in strings if s]
+        records.append(record)
+    return records
+
+
+def parse_ssdp_response(data: bytes) -> Dict[str, str]:
+    """Parse SSDP response headers into a dict with lowercased keys."""
+    headers = {}
+    for line in data.decode("utf-8", errors="replace").split("\r\n")[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    return headers
+
+
+def _strip_local(name: str) -> str:
+    return name[:-len(".local")] if name.endswith(".local") else name
+
+
+def _service_type(name: str) -> Optional[str]:
+    """'Living Room._googlecast._tcp.local' -> '_googlecast._tcp'."""
+    labels = _strip_local(name).split(".")
+    for i, label in enumerate(labels[:-1]):
+        if label.startswith("_") and labels[i + 1] in ("_tcp", "_udp"):
+            return f"{label}.{labels[i + 1]}"
+    return None
+
+
+def new_record(ip: str) -> Dict:
+    return {
+        'ip': ip,
+        'mac': "Unknown",
+        'vendor': "Unknown",
+        'hostname': "Unknown",
+        'open_ports': [],
+        'names': [],
+        'services': [],
+        'ssdp_server': None,
+        'sources': [],
+    }
+
+
+def _add_unique(items: List, value):
+    if value and value not in items:
+        items.append(value)
+
+
+def apply_mdns(record: Dict, records: List[Dict]):
+    """Fold parsed mDNS records from one responder into its device record."""
+    _add_unique(record['sources'], 'mdns')
+    for rr in records:
+        if rr["type"] == DNS_PTR:
+            if rr["name"] == "_services._dns-sd._udp.local":
+                _add_unique(record['services'], _service_type(rr["target"]))
+            else:
+                _add_unique(record['services'], _service_type(rr["name"]))
+                instance = rr["target"].split("._")[0]
+                _add_unique(record['names'], instance)
+        elif rr["type"] == DNS_SRV:
+            _add_unique(record['services'], _service_type(rr["name"]))
+            _add_unique(record['open_ports'], rr["port"])
+            if record['hostname'] == "Unknown":
+                record['hostname'] = _strip_local(rr["target"])
+        elif rr["type"] == DNS_A and rr.get("address") == record['ip']:
+            record['hostname'] = _strip_local(rr["name"])
+    record['open_ports'].sort()
+
+
+def apply_ssdp(record: Dict, headers: Dict[str, str]):
+    """Fold one SSDP response into its device record."""
+    _add_unique(record['sources'], 'ssdp')
+    _add_unique(record['services'], headers.get("st") or headers.get("nt"))
+    if headers.get("server"):
+        record['ssdp_server'] = headers["server"]
+    if headers.get("location"):
+        record['location'] = headers["location"]
+
+
+class _Collector(asyncio.DatagramProtocol):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        try:
+            self.handler(data, addr[0])
+        except (struct.error, IndexError, UnicodeDecodeError):
+            pass  # Ignore malformed announcements
+
+
+def _multicast_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+    sock.bind(("0.0.0.0", 0))
+    sock.setblocking(False)
+    return sock
+
+
+async def passive_discover_async(duration: float = 3.0,
+                                 mdns_addr: Tuple[str, int] = MDNS_ADDR,
+                                 ssdp_addr: Tuple[str, int] = SSDP_ADDR,
+                                 watch_arp: bool = True) -> Dict[str, Dict]:
+    """
+    Send one mDNS query and one SSDP search, then listen for `duration`
+    seconds while polling the ARP cache. Returns {ip: device record}.
+    Queries go out from ephemeral ports, so responders answer by unicast and
+    no privileged port or multicast group membership is needed. The target
+    addresses can be pointed at a local stub responder for testing.
+    """
+    loop = asyncio.get_running_loop()
+    devices: Dict[str, Dict] = {}
+
+    def record_for(ip: str) -> Dict:
+        if ip not in devices:
+            devices[ip] = new_record(ip)
+        return devices[ip]
+
+    def on_mdns(data: bytes, ip: str):
+        apply_mdns(record_for(ip), parse_dns_records(data))
+
+    def on_ssdp(data: bytes, ip: str):
+        apply_ssdp(record_for(ip), parse_ssdp_response(data))
+
+    transports = []
+    for target, payload, handler in (
+        (mdns_addr, build_mdns_query(), on_mdns),
+        (ssdp_addr, build_ssdp_search(), on_ssdp),
+    ):
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda handler=handler: _Collector(handler), sock=_multicast_socket())
+            transport.sendto(payload, target)
+            transports.append(transport)
+        except OSError as e:
+            print(f"Passive discovery: could not query {target[0]}:{target[1]} ({e})")
+
+    arp_seen: Dict[str, str] = {}
+    deadline = loop.time() + duration
+    try:
+        while True:
+            if watch_arp:
+                arp_seen.update(read_neighbor_table() or {})
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(0.5, remaining))
+    finally:
+        for transport in transports:
+            transport.close()
+
+    for ip, mac in arp_seen.items():
+        record = record_for(ip)
+        record['mac'] = mac
+        _add_unique(record['sources'], 'arp')
+
+    for record in devices.values():
+        if record['mac'] != "Unknown":
+            record['vendor'] = lookup_vendor(record['mac'])
+    return devices
+
+
+def passive_discover(duration: float = 3.0, **kwargs) -> Dict[str, Dict]:
+    """Synchronous wrapper around passive_discover_async."""
+    return asyncio.run(passive_discover_async(duration, **kwargs))
+
+
+def merge_device_records(active: List[Dict], passive: Dict[str, Dict]) -> List[Dict]:
+    """
+    Merge passive records into the active scan results by IP. Passive names
+    and service types are added to active records, a passive hostname fills
+    in an unresolved one, and passively seen devices the sweep missed are
+    appended.
+    """
+    merged = []
+    seen = set()
+    for device in active:
+        device = dict(device)
+        extra = passive.get(device['ip'])
+        if extra:
+            if device.get('hostname', "Unknown") in ("Unknown", None):
+                device['hostname'] = extra['hostname']
+            if device.get('mac', "Unknown") == "Unknown" and extra['mac'] != "Unknown":
+                device['mac'] = extra['mac']
+                device['vendor'] = extra['vendor']
+            device['open_ports'] = sorted(set(device.get('open_ports', [])) | set(extra['open_ports']))
+            for key in ('names', 'services', 'sources'):
+                device[key] = list(dict.fromkeys(device.get(key, []) + extra[key]))
+            if extra['ssdp_server']:
+                device['ssdp_server'] = extra['ssdp_server']
+        merged.append(device)
+        seen.add(device['ip'])
+
+    for ip, record in passive.items():
+        if ip not in seen:
+            merged.append(dict(record))
+    return merged
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Passive device discovery via mDNS, SSDP and the ARP cache')
+    parser.add_argument('--duration', '-d', type=float, default=3.0, help='Seconds to listen for responses (default: 3)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    found = passive_discover(args.duration)
+    print(f"Passive discovery found {len(found)} device(s) in {time.perf_counter() - start:.1f}s\n")
+    for record in found.values():
+        print(f"{record['ip']}  {record['hostname']}  ({record['mac']}, {record['vendor']})")
+        if record['names']:
+            print(f"  Names: {', '.join(record['names'])}")
+        if record['services']:
+            print(f"  Services: {', '.join(record['services'])}")
+        if record['ssdp_server']:
+            print(f"  SSDP server: {record['ssdp_server']}")
+        print(f"  Seen via: {', '.join(record['sources'])}")
@@ -6,11 +6,16 @@ Scans a single IP address for common protocols and ports.
 import socket
 import sys
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, List, Dict, Tuple
 import subprocess
 import platform
+import threading
 import time
+import selectors
+from scan_checkpoint import ScanCheckpoint
+from probe_payloads import UDP_PAYLOADS
+from port_spec import PortSpec
 
 
 # Common ports and their services
@@ -117,6 +122,25 @@ COMMON_PORTS = {
 }
 
 
+UDP_SERVICES = {
+    53: "DNS",
+    67: "DHCP-Server",
+    68: "DHCP-Client",
+    69: "TFTP",
+    123: "NTP",
+    137: "NetBIOS-NS",
+    161: "SNMP",
+    162: "SNMP-Trap",
+    500: "IKE",
+    1194: "OpenVPN",
+    1900: "UPnP/SSDP",
+    5353: "mDNS",
+}
+
+# How often a scan with a stop event checks it while waiting on probes (seconds)
+STOP_POLL = 0.25
+
+
 def check_ping(ip: str) -> bool:
     """Check if the host is reachable via ping."""
     try:
@@ -183,6 +207,10 @@ def grab_banner(ip: str, port: int, timeout: float = 2.0) -> str:
         return "Unable to connect"
 
 
+def _quiet(*args, **kwargs):
+    pass
+
+
 def get_hostname(ip: str) -> str:
     """Try to resolve hostname for the IP."""
     try:
@@ -192,6 +220,86 @@ def get_hostname(ip: str) -> str:
         return "Unable to resolve"
 
 
+def scan_udp_ports(ip: str, ports: Iterable[int], timeout: float = 2.0, retries: int = 2,
+                   rate: float = 200.0, verbose: bool = True, stop: threading.Event = None) -> List[Dict]:
+    """
+    Scan UDP ports with protocol-specific payloads over a single non-blocking
+    socket. Probes are sent at most `rate` per second; ports that have not
+    answered are re-probed up to `retries` more times. Replies are matched to
+    probes by source address and port, so any number of ports needs only one
+    file descriptor. Only ports that answered are reported: silence cannot
+    distinguish a filtered port from an open one that ignored the probe.
+    Set `verbose` to False to keep it from printing progress. Setting `stop`
+    ends the scan early with the replies received so far.
+    """
+    log = print if verbose else _quiet
+    
+    def stopped() -> bool:
+        return stop is not None and stop.is_set()
+    pending = set(ports)
+    log(f"\nScanning {len(pending)} UDP ports on {ip}...")
+    
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    
+    responses = {}
+    interval = 1.0 / rate if rate > 0 else 0.0
+    
+    def drain(wait: float):
+        for _ in selector.select(wait):
+            while True:
+                try:
+                    data, (src_ip, src_port) = sock.recvfrom(4096)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    # ICMP errors surface here on some platforms; keep listening
+                    break
+                if src_ip == ip and src_port in pending:
+                    pending.discard(src_port)
+                    responses[src_port] = data
+    
+    try:
+        for attempt in range(retries + 1):
+            if not pending or stopped():
+                break
+            if attempt:
+                log(f"Retransmitting to {len(pending)} silent port(s) (attempt {attempt + 1})...")
+            next_send = time.monotonic()
+            for port in sorted(pending):
+                if stopped():
+                    break
+                if port not in pending:
+                    continue
+                try:
+                    sock.sendto(UDP_PAYLOADS.get(port, b""), (ip, port))
+                except OSError:
+                    pass
+                next_send += interval
+                # Rate limit, but keep reading replies while we wait
+                drain(max(0.0, next_send - time.monotonic()))
+            
+            deadline = time.monotonic() + timeout
+            while pending and time.monotonic() < deadline and not stopped():
+                drain(min(deadline - time.monotonic(), STOP_POLL))
+    finally:
+        selector.close()
+        sock.close()
+    
+    return [
+        {
+            'port': port,
+            'service': UDP_SERVICES.get(port, COMMON_PORTS.get(port, f"Port {port}")),
+            'state': 'OPEN',
+            'protocol': 'udp',
+            'response': data,
+        }
+        for port, data in sorted(responses.items())
+    ]
+
+
 def scan_all_ports(ip: str, max_workers: int = 100) -> List[Dict]:
     """
     Scan all common ports on the target IP.
@@ -226,39 +334,146 @@ def scan_all_ports(ip: str, max_workers: int = 100) -> List[Dict]:
     return sorted(open_ports, key=lambda x: x['port'])
 
 
-def scan_port_range(ip: str, start_port: int, end_port: int, max_workers: int = 100) -> List[Dict]:
+def iter_port_results(ip: str, ports: Iterable[int], max_workers: int = 100,
+                      timeout: float = 1.0, stop: threading.Event = None) -> Iterator[Tuple[int, bool, str]]:
+    """
+    TCP-probe ports from an iterable and yield (port, is_open, service_name)
+    as each probe completes. At most about 2 * max_workers probes are queued
+    at once, so memory does not grow with the number of ports. Closing the
+    generator early, or setting `stop`, cancels the probes that have not started.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        try:
+            for port in ports:
+                if stop is not None and stop.is_set():
+                    return
+                in_flight.add(executor.submit(scan_port, ip, port, timeout))
+                if len(in_flight) >= max_workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while in_flight:
+                if stop is not None and stop.is_set():
+                    return
+                done, in_flight = wait(in_flight, timeout=STOP_POLL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_ports(ip: str, ports: Iterable[int], total: int, max_workers: int = 100,
+               checkpoint: ScanCheckpoint = None, timeout: float = 1.0) -> List[Dict]:
+    """
+    TCP-scan ports from an iterable, in the order given, keeping only a
+    bounded number of probes in flight so memory does not grow with the
+    number of ports. If a checkpoint is given, ports it already records as
+    scanned are skipped and progress is saved periodically.
+    """
+    open_ports = []
+    completed = 0
+    
+    def record(port: int, is_open: bool, service_name: str):
+        nonlocal completed
+        completed += 1
+        
+        if checkpoint:
+            checkpoint.mark(ip, port, is_open)
+        
+        if completed % 100 == 0:
+            print(f"Progress: {completed}/{total} ports scanned...")
+        
+        if is_open:
+            open_ports.append({
+                'port': port,
+                'service': service_name if service_name != "Unknown" else f"Port {port}",
+                'state': 'OPEN'
+            })
+    
+    if checkpoint:
+        completed = checkpoint.done_count(ip)
+        for port in checkpoint.hits(ip):
+            service_name = COMMON_PORTS.get(port, "Unknown")
+            open_ports.append({
+                'port': port,
+                'service': service_name if service_name != "Unknown" else f"Port {port}",
+                'state': 'OPEN'
+            })
+        ports = (port for port in ports if not checkpoint.is_done(ip, port))
+    
+    try:
+        for result in iter_port_results(ip, ports, max_workers, timeout):
+            record(*result)
+    except KeyboardInterrupt:
+        if checkpoint:
+            checkpoint.save()
+            print(f"\nInterrupted - progress saved to {checkpoint.path}")
+        raise
+    
+    return sorted(open_ports, key=lambda x: x['port'])
+
+
+def scan_port_range(ip: str, start_port: int, end_port: int, max_workers: int = 100,
+                    checkpoint: ScanCheckpoint = None) -> List[Dict]:
     """
     Scan a range of ports on the target IP.
+    If a checkpoint is given, ports it already records as scanned are skipped
+    and progress is saved periodically so the scan can be resumed.
     """
     print(f"\nScanning ports {start_port}-{end_port} on {ip}...")
     print("This may take several minutes...\n")
     
-    open_ports = []
-    ports_to_scan = range(start_port, end_port + 1)
     total_ports = end_port - start_port + 1
+    if checkpoint and checkpoint.done_count(ip):
+        print(f"Resuming: {checkpoint.done_count(ip)} ports already scanned, {len(checkpoint.hits(ip))} open\n")
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_port = {
-            executor.submit(scan_port, ip, port): port 
-            for port in ports_to_scan
-        }
-        
-        completed = 0
-        for future in as_completed(future_to_port):
-            port, is_open, service_name = future.result()
-            completed += 1
-            
-            if completed % 100 == 0:
-                print(f"Progress: {completed}/{total_ports} ports scanned...")
-            
+    return scan_ports(ip, range(start_port, end_port + 1), total_ports, max_workers, checkpoint)
+
+
+
+def describe_udp_response(response: bytes) -> str:
+    """Printable summary of a UDP probe reply, the UDP equivalent of a banner."""
+    text = response.decode('utf-8', errors='ignore').strip()
+    printable = ''.join(c for c in text if c.isprintable())
+    return f"{len(response)} byte reply: {printable[:150] or response[:32].hex()}"
+
+
+def iter_scan(ip: str, spec: PortSpec, order: str = 'frequency', timeout: float = 1.0,
+              max_workers: int = 100, retries: int = 2, rate: float = 200.0,
+              cancel: threading.Event = None) -> Iterator[Dict]:
+    """
+    Scan the TCP and UDP ports of a PortSpec and yield events as the scan
+    runs, for callers other than the CLI: {'type': 'progress', 'done', 'total'}
+    after each probe and {'type': 'port', 'port', 'protocol', 'service',
+    'state'} for each open port. UDP ports are reported together once their
+    scan finishes. Stop iterating, or set `cancel`, to abandon the scan; with
+    `cancel` the generator ends within STOP_POLL seconds even if no probe answers.
+    """
+    total = len(spec)
+    done = 0
+    yield {'type': 'progress', 'done': done, 'total': total}
+    
+    if spec.count('tcp'):
+        for port, is_open, service_name in iter_port_results(ip, spec.iter_ports('tcp', order), max_workers, timeout,
+                                                             cancel):
+            done += 1
             if is_open:
-                open_ports.append({
+                yield {
+                    'type': 'port',
                     'port': port,
+                    'protocol': 'tcp',
                     'service': service_name if service_name != "Unknown" else f"Port {port}",
-                    'state': 'OPEN'
-                })
-    
-    return sorted(open_ports, key=lambda x: x['port'])
+                    'state': 'OPEN',
+                }
+            yield {'type': 'progress', 'done': done, 'total': total}
+    
+    if spec.count('udp') and not (cancel is not None and cancel.is_set()):
+        for port_info in scan_udp_ports(ip, spec.iter_ports('udp', order), timeout=max(timeout, 1.0),
+                                        retries=retries, rate=rate, verbose=False, stop=cancel):
+            yield dict(port_info, type='port', response=describe_udp_response(port_info['response']))
+        done = total
+        yield {'type': 'progress', 'done': done, 'total': total}
 
 
 def main():
@@ -270,14 +485,28 @@ def main():
 Examples:
   python port_scanner.py 192.168.1.100
   python port_scanner.py 192.168.1.100 --range 1-1000
+  python port_scanner.py 192.168.1.100 --range 1-65535 --resume
   python port_scanner.py 192.168.1.100 --banner
+  python port_scanner.py 192.168.1.100 --udp
+  python port_scanner.py 192.168.1.100 --udp --range 1-1024 --rate 500
+  python port_scanner.py 192.168.1.100 --top-ports 1000
+  python port_scanner.py 192.168.1.100 --udp --ports 53,161
+  python port_scanner.py 192.168.1.100 --ports 22,80,443,8000-9000,U:53,161
         """
     )
     
     parser.add_argument('ip', help='Target IP address to scan')
     parser.add_argument('--range', '-r', help='Port range to scan (e.g., 1-1000). If not specified, scans common ports only.')
+    parser.add_argument('--ports', '-p', help='Port specification, e.g. 22,80,443,1000-2000,top100,U:53 (U: selects UDP, T: TCP; unprefixed ports are UDP with --udp)')
+    parser.add_argument('--top-ports', type=int, help='Scan the N most frequently open TCP ports (UDP ports with --udp)')
+    parser.add_argument('--order', choices=['frequency', 'random', 'numeric'], default='frequency', help='Order to probe --ports/--top-ports in (default: frequency)')
     parser.add_argument('--banner', '-b', action='store_true', help='Attempt to grab banners from open ports')
     parser.add_argument('--timeout', '-t', type=float, default=1.0, help='Timeout for each port scan in seconds (default: 1.0)')
+    parser.add_argument('--udp', '-u', action='store_true', help='Scan UDP instead of TCP, sending protocol-specific probes (DNS, NTP, SNMP, SSDP, ...)')
+    parser.add_argument('--rate', type=float, default=200.0, help='Maximum UDP probes per second (default: 200)')
+    parser.add_argument('--retries', type=int, default=2, help='UDP retransmits for ports that have not answered (default: 2)')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted TCP --range or --ports scan from its saved state file (not supported with --udp)')
+    parser.add_argument('--state-file', default='.port_scan_state', help='Scan state file used for checkpointing (default: .port_scan_state)')
     
     args = parser.parse_args()
     
@@ -290,6 +519,11 @@ Examples:
         print(f"Error: '{target_ip}' is not a valid IP address")
         sys.exit(1)
     
+    # UDP scans keep no state file, so there is nothing to resume
+    if args.resume and args.udp:
+        print("Error: --resume is not supported with --udp")
+        sys.exit(1)
+    
     print("=" * 70)
     print(f"Port Scanner - Target: {target_ip}")
     print("=" * 70)
@@ -310,14 +544,54 @@ Examples:
     # Scan ports
     start_time = time.time()
     
-    if args.range:
+    if args.ports or args.top_ports:
+        try:
+            protocol = 'udp' if args.udp else 'tcp'
+            spec = PortSpec.parse(args.ports or '', protocol)
+            if args.top_ports:
+                spec.add_top(args.top_ports, protocol)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        
+        open_ports = []
+        tcp_count = spec.count('tcp')
+        if tcp_count:
+            print(f"\nScanning {tcp_count} TCP ports on {target_ip} ({args.order} order)...")
+            checkpoint = ScanCheckpoint.load(args.state_file, 'ports')
+            checkpoint.start(target_ip, 65536, resume=args.resume, spec=spec.digest())
+            open_ports += scan_ports(target_ip, spec.iter_ports('tcp', args.order), tcp_count,
+                                     checkpoint=checkpoint, timeout=args.timeout)
+            checkpoint.finish(target_ip)
+        if spec.count('udp'):
+            open_ports += scan_udp_ports(target_ip, spec.iter_ports('udp', args.order),
+                                         timeout=max(args.timeout, 1.0), retries=args.retries, rate=args.rate)
+    elif args.udp:
+        if args.range:
+            try:
+                start_port, end_port = map(int, args.range.split('-'))
+            except ValueError:
+                print("Error: Invalid range format. Use: START-END (e.g., 1-1000)")
+                sys.exit(1)
+            if start_port < 1 or end_port > 65535 or start_port > end_port:
+                print("Error: Invalid port range. Must be 1-65535 and start <= end")
+                sys.exit(1)
+            udp_ports = list(range(start_port, end_port + 1))
+        else:
+            udp_ports = sorted(UDP_SERVICES)
+        open_ports = scan_udp_ports(target_ip, udp_ports, timeout=max(args.timeout, 1.0),
+                                    retries=args.retries, rate=args.rate)
+    elif args.range:
         # Parse range
         try:
             start_port, end_port = map(int, args.range.split('-'))
             if start_port < 1 or end_port > 65535 or start_port > end_port:
                 print("Error: Invalid port range. Must be 1-65535 and start <= end")
                 sys.exit(1)
-            open_ports = scan_port_range(target_ip, start_port, end_port)
+            checkpoint = ScanCheckpoint.load(args.state_file, 'ports')
+            checkpoint.start(target_ip, 65536, resume=args.resume, spec=f"tcp:{start_port}-{end_port}")
+            open_ports = scan_port_range(target_ip, start_port, end_port, checkpoint=checkpoint)
+            checkpoint.finish(target_ip)
         except ValueError:
             print("Error: Invalid range format. Use: START-END (e.g., 1-1000)")
             sys.exit(1)
@@ -338,7 +612,8 @@ Examples:
         print("-" * 70)
         
         for port_info in open_ports:
-            print(f"{port_info['port']:<10} {port_info['state']:<10} {port_info['service']:<30}")
+            port_label = f"{port_info['port']}/{port_info.get('protocol', 'tcp')}"
+            print(f"{port_label:<10} {port_info['state']:<10} {port_info['service']:<30}")
         
         # Banner grabbing
         if args.banner and open_ports:
@@ -350,6 +625,10 @@ Examples:
             for port_info in open_ports:
                 port = port_info['port']
                 print(f"Port {port} ({port_info['service']}):")
+                if port_info.get('protocol') == 'udp':
+                    print(f"  {describe_udp_response(port_info['response'])}")
+                    print()
+                    continue
                 banner = grab_banner(target_ip, port)
                 if banner and banner != "No banner":
                     print(f"  {banner[:150]}")
@@ -0,0 +1,162 @@
+"""
+Port Specifications - Compact Port Sets and Top-N Port Lists
+Parses nmap-style port specifications such as "22,80,443,1000-2000,top100,U:53"
+into one 8 KB bitmap per protocol, so memory use does not depend on how many
+ports are selected, and iterates them lazily in numeric, randomized or
+frequency order using the bundled frequency-ranked service table.
+"""
+
+import hashlib
+import os
+import random
+from typing import Dict, Iterator, List, Tuple
+
+from scan_checkpoint import Bitmap
+
+
+PORT_COUNT = 65536
+PROTOCOLS = ("tcp", "udp")
+FREQUENCY_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "port_frequency.txt")
+
+_ranked = None
+
+
+def ranked_ports() -> Dict[str, List[Tuple[int, str]]]:
+    """Load the frequency-ranked service table as {protocol: [(port, service), ...]}."""
+    global _ranked
+    if _ranked is None:
+        ranked = {protocol: [] for protocol in PROTOCOLS}
+        with open(FREQUENCY_TABLE, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                port_proto, _, service = line.partition(" ")
+                port, _, protocol = port_proto.partition("/")
+                ranked[protocol].append((int(port), service.strip() or "unknown"))
+        _ranked = ranked
+    return _ranked
+
+
+def top_ports(count: int, protocol: str = "tcp") -> List[int]:
+    """
+    The `count` most frequently open ports for a protocol. Raises ValueError
+    if `count` is larger than the ranked table, rather than padding it with
+    unranked ports that are no more likely to be open than any others.
+    """
+    ranked = ranked_ports()[protocol]
+    if count > len(ranked):
+        raise ValueError(f"only the top {len(ranked)} {protocol.upper()} ports are ranked; "
+                         f"use a port range to scan more")
+    return [port for port, _ in ranked[:count]]
+
+
+class PortSpec:
+    """A set of TCP and UDP ports stored as one bitmap per protocol."""
+
+    def __init__(self):
+        self.bitmaps = {protocol: Bitmap(PORT_COUNT) for protocol in PROTOCOLS}
+        self.counts = {protocol: 0 for protocol in PROTOCOLS}
+
+    def add(self, port: int, protocol: str = "tcp"):
+        if not 1 <= port < PORT_COUNT:
+            raise ValueError(f"Port out of range: {port}")
+        bitmap = self.bitmaps[protocol]
+        if not bitmap.test(port):
+            bitmap.set(port)
+            self.counts[protocol] += 1
+
+    def add_range(self, start: int, end: int, protocol: str = "tcp"):
+        if start > end:
+            raise ValueError(f"Invalid port range: {start}-{end}")
+        for port in range(start, end + 1):
+            self.add(port, protocol)
+
+    def add_top(self, count: int, protocol: str = "tcp"):
+        for port in top_ports(count, protocol):
+            self.add(port, protocol)
+
+    def __contains__(self, item: Tuple[str, int]) -> bool:
+        protocol, port = item
+        return self.bitmaps[protocol].test(port)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def count(self, protocol: str) -> int:
+        return self.counts[protocol]
+
+    def digest(self) -> str:
+        """Short identifier of the selected ports, e.g. to tell saved scan state apart."""
+        hasher = hashlib.blake2b(digest_size=8)
+        for protocol in PROTOCOLS:
+            hasher.update(bytes(self.bitmaps[protocol].bits))
+        return f"{len(self)} ports:{hasher.hexdigest()}"
+
+    @classmethod
+    def parse(cls, spec: str, protocol: str = "tcp") -> "PortSpec":
+        """
+        Parse a comma-separated port specification. Items may be single ports
+        (80), ranges (1000-2000, -1024, 60000-), top-N lists (top100) or
+        service names from the ranked table (http). Items are `protocol`
+        ports until a "T:" or "U:" prefix selects TCP or UDP for that item
+        and the ones after it.
+        """
+        ports = cls()
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if item[:2].upper() in ("T:", "U:"):
+                protocol = "tcp" if item[0].upper() == "T" else "udp"
+                item = item[2:].strip()
+
+            try:
+                if item.lower().startswith("top"):
+                    ports.add_top(int(item[3:]), protocol)
+                elif "-" in item:
+                    start, _, end = item.partition("-")
+                    ports.add_range(int(start) if start else 1, int(end) if end else PORT_COUNT - 1, protocol)
+                elif item.isdigit():
+                    ports.add(int(item), protocol)
+                else:
+                    matches = [port for port, service in ranked_ports()[protocol] if service == item.lower()]
+                    if not matches or item.lower() == "unknown":
+                        raise ValueError(f"Unknown service name: {item}")
+                    for port in matches:
+                        ports.add(port, protocol)
+            except ValueError as e:
+                raise ValueError(f"Invalid port specification '{item}': {e}") from None
+        return ports
+
+    def iter_ports(self, protocol: str = "tcp", order: str = "numeric", seed: int = None) -> Iterator[int]:
+        """
+        Lazily yield the selected ports of one protocol. `order` is "numeric",
+        "random" (a full-period permutation of the port space, so no list is
+        built) or "frequency" (ranked ports first, then the rest at random).
+        """
+        bitmap = self.bitmaps[protocol]
+        if order == "numeric":
+            for port in range(1, PORT_COUNT):
+                if bitmap.test(port):
+                    yield port
+        elif order == "random":
+            rng = random.Random(seed)
+            # x -> (a*x + c) mod 2^16 visits every value once when a % 4 == 1 and c is odd
+            a, c = 4 * rng.randrange(1, 16384) + 1, 2 * rng.randrange(32768) + 1
+            x = rng.randrange(PORT_COUNT)
+            for _ in range(PORT_COUNT):
+                x = (a * x + c) % PORT_COUNT
+                if x and bitmap.test(x):
+                    yield x
+        elif order == "frequency":
+            yielded = Bitmap(PORT_COUNT)
+            for port, _ in ranked_ports()[protocol]:
+                if bitmap.test(port) and not yielded.test(port):
+                    yielded.set(port)
+                    yield port
+            for port in self.iter_ports(protocol, "random", seed):
+                if not yielded.test(port):
+                    yield port
+        else:
+            raise ValueError(f"Unknown port order: {order}")
@@ -0,0 +1,260 @@
+"""
+Search Prefetch - Start Web Searches Before the Model Asks for Them
+Questions naming a CVE, a security advisory or a malware family almost always
+end in a web search: the model is called, decides to search, the search runs,
+and the model is called again. The agent's prefetch node spots these entities
+with compiled patterns as soon as the message arrives and starts the search in
+the background. The first model call waits for it, up to PREFETCH_WAIT seconds,
+and receives the results as context, so a single model call can answer. If the
+search takes longer, the model is called without it, and a web search the
+model then asks for is answered with the prefetched results instead of
+searching again.
+
+Usage:
+    python prefetch.py "Is CVE-2024-3400 exploited? Also saw LockBit"   # detect
+    python prefetch.py --benchmark                                     # stub timing
+"""
+
+import argparse
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Advisory identifiers, matched case-insensitively and reported upper-case
+ADVISORY_PATTERNS = [
+    r"CVE-\d{4}-\d{4,7}",
+    r"GHSA(?:-[23456789cfghjmpqrvwx]{4}){3}",
+    r"MS\d{2}-\d{3}",
+    r"ADV\d{6}",
+    r"ICSA-\d{2}-\d{3}-\d{2}",
+    r"VU#\d{5,7}",
+    r"RHSA-\d{4}:\d{4,5}",
+    r"DSA-\d{4,5}-\d",
+    r"USN-\d{4,5}-\d{1,2}",
+]
+
+MALWARE_FAMILIES = [
+    "emotet", "trickbot", "qakbot", "qbot", "icedid", "bumblebee", "dridex", "zloader",
+    "lockbit", "blackcat", "alphv", "conti", "ryuk", "revil", "sodinokibi", "blackbasta",
+    "black basta", "clop", "cl0p", "akira", "play ransomware", "royal ransomware", "hive ransomware",
+    "wannacry", "notpetya", "darkside", "babuk", "rhysida",
+    "redline", "raccoon stealer", "vidar", "lumma", "agent tesla", "formbook", "asyncrat",
+    "njrat", "remcos", "cobalt strike", "mirai", "gafgyt", "xmrig", "pikabot",
+    "darkgate", "socgholish", "gootloader", "raspberry robin", "plugx", "shadowpad",
+]
+
+ENTITY_PATTERN = re.compile(
+    r"\b(?:(?P<advisory>" + "|".join(ADVISORY_PATTERNS) + r")|(?P<malware>"
+    + "|".join(re.escape(name).replace(r"\ ", r"[\s-]?") for name in sorted(MALWARE_FAMILIES, key=len, reverse=True))
+    + r"))\b",
+    re.IGNORECASE,
+)
+
+# Most entities searched per message
+MAX_ENTITIES = 3
+
+# How long the first model call, or a web search the model asks for, waits for the prefetch (seconds)
+PREFETCH_WAIT = 5.0
+
+
+def detect_entities(text: str) -> List[str]:
+    """CVE/advisory IDs and malware family names in a message, in order, without duplicates."""
+    entities = []
+    seen = set()
+    for match in ENTITY_PATTERN.finditer(text or ""):
+        if match.group("advisory"):
+            entity = match.group("advisory").upper()
+        else:
+            entity = match.group("malware").title()
+        # "Black Basta", "black-basta" and "BlackBasta" are one family
+        key = re.sub(r"[\s-]", "", entity.lower())
+        if key not in seen:
+            seen.add(key)
+            entities.append(entity)
+        if len(entities) >= MAX_ENTITIES:
+            break
+    return entities
+
+
+def build_query(entities: List[str]) -> str:
+    """Web search query for the detected entities."""
+    return " ".join(entities) + " security advisory exploitation mitigation"
+
+
+def format_context(entities: List[str], results: Any, max_chars: int = 4000) -> str:
+    """Search results as a context message for the model."""
+    if isinstance(results, dict) and isinstance(results.get("results"), list):
+        items = [f"- {r.get('title', '')} ({r.get('url', '')})\n  {r.get('content', '')[:600]}"
+                 for r in results["results"]]
+        body = "\n".join(items)
+    else:
+        body = str(results)
+    return (f"Web search results fetched for {', '.join(entities)} (use these instead of searching "
+            f"again unless they do not answer the question):\n{body[:max_chars]}")
+
+
+class Prefetcher:
+    """Runs searches in the background, keyed by conversation thread."""
+
+    def __init__(self, search: Callable[[str], Any], max_workers: int = 4):
+        self.search = search
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.pending: Dict[str, tuple] = {}
+        self.lock = threading.Lock()
+
+    def start(self, key: str, text: str) -> List[str]:
+        """Start a search if the text names any entities; returns the entities found."""
+        entities = detect_entities(text)
+        if entities:
+            future = self.executor.submit(self.search, build_query(entities))
+            with self.lock:
+                self.pending[key] = (entities, future)
+        return entities
+
+    def has(self, key: str) -> bool:
+        """Whether a search was started for a key and not yet collected."""
+        with self.lock:
+            return key in self.pending
+
+    def poll(self, key: str, timeout: float = 0.0) -> Optional[str]:
+        """
+        Collect the prefetched results for a key if the search finishes
+        within `timeout` seconds; a search still running stays pending.
+        """
+        with self.lock:
+            entry = self.pending.get(key)
+        if entry is None:
+            return None
+        wait([entry[1]], timeout)
+        with self.lock:
+            if not entry[1].done() or self.pending.get(key) is not entry:
+                return None
+            del self.pending[key]
+        return self._collect(entry, 0)
+
+    def take(self, key: str, timeout: float = PREFETCH_WAIT) -> Optional[str]:
+        """
+        Collect the prefetched results for a key as a context string, waiting
+        up to `timeout` seconds. Returns None if nothing was prefetched, the
+        search failed or it is still running (the model can then search itself).
+        """
+        with self.lock:
+            entry = self.pending.pop(key, None)
+        if entry is None:
+            return None
+        return self._collect(entry, timeout)
+
+    def discard(self, key: str):
+        """Drop a prefetch the model turned out not to need."""
+        with self.lock:
+            entry = self.pending.pop(key, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    def _collect(self, entry: tuple, timeout: float) -> Optional[str]:
+        entities, future = entry
+        try:
+            return format_context(entities, future.result(timeout=timeout))
+        except Exception:
+            future.cancel()
+            return None
+
+
+def benchmark(llm_latency: float = 0.8, search_latency: float = 0.6, runs: int = 5):
+    """
+    Compare time to the first model response, and to the final answer, with a
+    stub model and a stub search that only sleep. Tool-calling: model decides
+    to search, search runs, model answers. Prefetch without waiting: the first
+    model call runs alongside the search, and the prefetch answers the search
+    the model asks for. Prefetch with a bounded wait (what the agent does):
+    the first model call waits for the search and gets its results. Each path
+    is timed for a question the model answers directly and one it needs to
+    search for.
+    """
+    def stub_search(query: str) -> Dict:
+        time.sleep(search_latency)
+        return {"results": [{"title": "Advisory", "url": "https://example.com", "content": query}]}
+
+    def stub_llm(context: Optional[str], needs_search: bool) -> str:
+        time.sleep(llm_latency)
+        return "tool_call" if needs_search and not context else "answer"
+
+    message = "Is CVE-2024-3400 being exploited, and is it related to LockBit?"
+    prefetcher = Prefetcher(stub_search)
+
+    def tool_calling(needs_search: bool):
+        started = time.perf_counter()
+        reply = stub_llm(None, needs_search)
+        first = time.perf_counter() - started
+        if reply == "tool_call":
+            stub_llm(format_context(["CVE-2024-3400"], stub_search(message)), needs_search)
+        return first, time.perf_counter() - started
+
+    def no_wait(needs_search: bool):
+        started = time.perf_counter()
+        prefetcher.start("bench", message)
+        reply = stub_llm(prefetcher.poll("bench"), needs_search)
+        first = time.perf_counter() - started
+        if reply == "tool_call":
+            stub_llm(prefetcher.take("bench"), needs_search)
+        else:
+            prefetcher.discard("bench")
+        return first, time.perf_counter() - started
+
+    def bounded_wait(needs_search: bool):
+        started = time.perf_counter()
+        prefetcher.start("bench", message)
+        reply = stub_llm(prefetcher.poll("bench", PREFETCH_WAIT), needs_search)
+        first = time.perf_counter() - started
+        if reply == "tool_call":
+            stub_llm(prefetcher.take("bench"), needs_search)
+        else:
+            prefetcher.discard("bench")
+        return first, time.perf_counter() - started
+
+    def median(path, needs_search: bool):
+        timings = sorted(path(needs_search) for _ in range(runs))
+        return timings[runs // 2]
+
+    print(f"Stub model {llm_latency * 1000:.0f} ms, stub search {search_latency * 1000:.0f} ms, {runs} runs")
+    print(f"Entities detected: {detect_entities(message)}")
+    print(f"  {'':22} {'answers directly':>24} {'needs a search':>24}")
+    print(f"  {'(median ms)':22} {'first':>11} {'final':>12} {'first':>11} {'final':>12}")
+    for label, path in (("Tool-calling", tool_calling), ("Prefetch, no wait", no_wait),
+                        ("Prefetch, bounded wait", bounded_wait)):
+        direct, searched = median(path, False), median(path, True)
+        print(f"  {label:22} {direct[0] * 1000:11.0f} {direct[1] * 1000:12.0f} "
+              f"{searched[0] * 1000:11.0f} {searched[1] * 1000:12.0f}")
+
+    # Detection cost on a message without entities, paid on every turn
+    plain = "How do I set up two-factor authentication for my team's email accounts? " * 4
+    started = time.perf_counter()
+    for _ in range(10000):
+        detect_entities(plain)
+    print(f"  Detection cost:    {(time.perf_counter() - started) / 10000 * 1e6:.1f} us per message")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect CVE/advisory/malware entities that trigger a search prefetch')
+    parser.add_argument('text', nargs='?', help='Message to check')
+    parser.add_argument('--benchmark', action='store_true', help='Time the prefetch path against the tool-calling path with stubs')
+    parser.add_argument('--llm-latency', type=float, default=0.8, help='Stub model latency in seconds (default: 0.8)')
+    parser.add_argument('--search-latency', type=float, default=0.6, help='Stub search latency in seconds (default: 0.6)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.llm_latency, args.search_latency)
+    elif args.text:
+        entities = detect_entities(args.text)
+        print(f"Entities: {entities or 'none'}")
+        if entities:
+            print(f"Query: {build_query(entities)}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Probe Payloads - Discovery and UDP Probe Packets
+Builds the packets sent to discover and fingerprint devices: the multicast
+mDNS query and SSDP M-SEARCH used by passive discovery, and the
+protocol-specific UDP probes used by the port scanner.
+"""
+
+import struct
+from typing import List
+
+
+MDNS_ADDR = ("224.0.0.251", 5353)
+SSDP_ADDR = ("239.255.255.250", 1900)
+
+# Asked in the single mDNS query alongside the DNS-SD service enumeration
+MDNS_SERVICE_TYPES = [
+    "_services._dns-sd._udp.local",
+    "_http._tcp.local",
+    "_device-info._tcp.local",
+    "_workstation._tcp.local",
+    "_googlecast._tcp.local",
+    "_airplay._tcp.local",
+    "_raop._tcp.local",
+    "_hap._tcp.local",
+    "_ipp._tcp.local",
+    "_printer._tcp.local",
+    "_smb._tcp.local",
+    "_ssh._tcp.local",
+    "_spotify-connect._tcp.local",
+    "_amzn-wplay._tcp.local",
+]
+
+DNS_A, DNS_PTR, DNS_TXT, DNS_SRV = 1, 12, 16, 33
+
+
+def build_mdns_query(service_types: List[str] = None) -> bytes:
+    """Build one mDNS query packet asking PTR questions for each service type."""
+    service_types = service_types or MDNS_SERVICE_TYPES
+    packet = struct.pack("!HHHHHH", 0, 0, len(service_types), 0, 0, 0)
+    for name in service_types:
+        for label in name.strip(".").split("."):
+            packet += bytes([len(label)]) + label.encode("ascii")
+        packet += b"\x00" + struct.pack("!HH", DNS_PTR, 1)
+    return packet
+
+
+def build_ssdp_search(search_target: str = "ssdp:all", mx: int = 2) -> bytes:
+    return (
+        "M-SEARCH * HTTP/1.1\r\n"
+        f"HOST: {SSDP_ADDR[0]}:{SSDP_ADDR[1]}\r\n"
+        'MAN: "ssdp:discover"\r\n'
+        f"MX: {mx}\r\n"
+        f"ST: {search_target}\r\n"
+        "\r\n"
+    ).encode("ascii")
+
+
+def _ber(tag: int, content: bytes) -> bytes:
+    return bytes([tag, len(content)]) + content
+
+
+def snmp_get_request(community: str = "public", oid: bytes = b"\x2b\x06\x01\x02\x01\x01\x01\x00") -> bytes:
+    """SNMPv1 GetRequest for sysDescr.0 (1.3.6.1.2.1.1.1.0)."""
+    varbind = _ber(0x30, _ber(0x06, oid) + b"\x05\x00")
+    pdu = _ber(0xA0, _ber(0x02, b"\x4e\x50\x53\x31") + _ber(0x02, b"\x00") + _ber(0x02, b"\x00") + _ber(0x30, varbind))
+    return _ber(0x30, _ber(0x02, b"\x00") + _ber(0x04, community.encode()) + pdu)
+
+
+# Protocol-specific UDP probes; services that only answer a well-formed
+# request look closed to an empty datagram. Ports without an entry get one.
+UDP_PAYLOADS = {
+    # DNS: standard query for the root NS records
+    53: b"\x4e\x50\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x01",
+    # NTP: version 3 client request
+    123: b"\x1b" + b"\x00" * 47,
+    # NetBIOS: node status request for "*"
+    137: b"\x4e\x50\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x20CKAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\x00\x00\x21\x00\x01",
+    # SNMP: v1 get of sysDescr.0 with the default community
+    161: snmp_get_request(),
+    # SSDP: unicast M-SEARCH
+    1900: build_ssdp_search(mx=1),
+    # mDNS: unicast DNS-SD service enumeration
+    5353: build_mdns_query(["_services._dns-sd._udp.local"]),
+}
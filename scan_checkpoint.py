@@ -0,0 +1,171 @@
+"""
+Scan Checkpointing - Resumable Scan State
+Stores completed (target, index) work as compact per-target bitmaps on disk so
+that interrupted port and network scans can be resumed without rescanning.
+"""
+
+import base64
+import json
+import os
+import time
+import zlib
+from typing import Dict, List
+
+
+STATE_VERSION = 1
+
+
+class Bitmap:
+    """Fixed-size bit array backed by a bytearray."""
+
+    def __init__(self, size: int, data: bytes = None):
+        self.size = size
+        nbytes = (size + 7) // 8
+        if data is not None and len(data) == nbytes:
+            self.bits = bytearray(data)
+        else:
+            self.bits = bytearray(nbytes)
+
+    def set(self, index: int):
+        self.bits[index >> 3] |= 1 << (index & 7)
+
+    def test(self, index: int) -> bool:
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.bits)
+
+    def indexes(self) -> List[int]:
+        """Return all set indexes in ascending order."""
+        found = []
+        for byte_index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    found.append((byte_index << 3) | bit)
+        return found
+
+    def encode(self) -> str:
+        return base64.b64encode(zlib.compress(bytes(self.bits), 9)).decode("ascii")
+
+    @classmethod
+    def decode(cls, size: int, text: str) -> "Bitmap":
+        return cls(size, zlib.decompress(base64.b64decode(text)))
+
+
+class ScanCheckpoint:
+    """
+    Tracks which indexes of each scan target are finished and which were hits.
+
+    For port scans the target is an IP and the index is the port number; for
+    network sweeps the target is the network range and the index is the host
+    offset within it. Each target also records the spec of the scan that
+    started it (e.g. the port range), so a resumed scan only reuses progress
+    from the same scan. The state is flushed to disk every `save_every` marks
+    or `save_interval` seconds, whichever comes first, using an atomic replace.
+    """
+
+    def __init__(self, path: str, kind: str, save_every: int = 500, save_interval: float = 5.0):
+        self.path = path
+        self.kind = kind
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.targets: Dict[str, Dict] = {}
+        self._dirty = 0
+        self._last_save = time.time()
+
+    @classmethod
+    def load(cls, path: str, kind: str, **kwargs) -> "ScanCheckpoint":
+        """Load a checkpoint from disk, or start an empty one if unusable."""
+        checkpoint = cls(path, kind, **kwargs)
+        if not os.path.exists(path):
+            return checkpoint
+
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+            if state.get("version") != STATE_VERSION or state.get("kind") != kind:
+                print(f"Ignoring incompatible scan state in {path}")
+                return checkpoint
+            for target, entry in state.get("targets", {}).items():
+                size = entry["size"]
+                checkpoint.targets[target] = {
+                    "done": Bitmap.decode(size, entry["done"]),
+                    "hits": Bitmap.decode(size, entry["hits"]),
+                    "spec": entry.get("spec"),
+                }
+        except (OSError, ValueError, KeyError, zlib.error) as e:
+            print(f"Error reading scan state {path}: {e}")
+            checkpoint.targets = {}
+
+        return checkpoint
+
+    def start(self, target: str, size: int, resume: bool = True, spec: str = None):
+        """
+        Prepare bitmaps for a target, discarding old progress unless resuming.
+        Saved progress is only resumed if it was recorded for the same `spec`.
+        """
+        entry = self.targets.get(target)
+        if resume and entry and entry["done"].size == size:
+            if entry.get("spec") == spec:
+                return
+            print(f"Saved state for {target} is for a different scan ({entry.get('spec')}); starting fresh")
+        self.targets[target] = {"done": Bitmap(size), "hits": Bitmap(size), "spec": spec}
+        self._dirty += 1
+
+    def is_done(self, target: str, index: int) -> bool:
+        return self.targets[target]["done"].test(index)
+
+    def mark(self, target: str, index: int, hit: bool = False):
+        """Record a finished index and flush to disk periodically."""
+        entry = self.targets[target]
+        entry["done"].set(index)
+        if hit:
+            entry["hits"].set(index)
+        self._dirty += 1
+
+        if self._dirty >= self.save_every or time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    def done_count(self, target: str) -> int:
+        return self.targets[target]["done"].count()
+
+    def hits(self, target: str) -> List[int]:
+        return self.targets[target]["hits"].indexes()
+
+    def finish(self, target: str):
+        """Drop a completed target so a later run starts it fresh."""
+        if self.targets.pop(target, None) is not None:
+            self._dirty += 1
+        self.save()
+
+    def save(self):
+        """Write the state file atomically."""
+        if not self._dirty and os.path.exists(self.path):
+            return
+
+        if not self.targets:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        else:
+            state = {
+                "version": STATE_VERSION,
+                "kind": self.kind,
+                "targets": {
+                    target: {
+                        "size": entry["done"].size,
+                        "done": entry["done"].encode(),
+                        "hits": entry["hits"].encode(),
+                        "spec": entry.get("spec"),
+                    }
+                    for target, entry in self.targets.items()
+                },
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+
+        self._dirty = 0
+        self._last_save = time.time()
@@ -0,0 +1,336 @@
+"""
+Scan Jobs - Background Port and Network Scans for the API
+Runs port_scanner / network_scanner engines as jobs on a bounded worker pool,
+separate from the chat endpoints. Each job keeps an append-only event log that
+the API streams as Server-Sent Events, can be cancelled while queued or
+running, and is stored in SQLite when it finishes so results can be fetched
+after a restart.
+"""
+
+import ipaddress
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from host_discovery import default_concurrency
+from network_scanner import normalize_ranges
+from port_spec import PortSpec
+from scan_tool import allowed_networks
+
+
+DEFAULT_DB_PATH = "scan_jobs.db"
+
+# Largest network a single job may sweep (a /16 is 65534 addresses)
+MIN_PREFIX = 16
+
+# Share of the open-file limit that running network jobs may use between them
+# for discovery sockets; the rest is left for the server's own connections
+SCAN_FD_SHARE = 0.5
+
+# Progress events are recorded at most this often per job (seconds)
+PROGRESS_INTERVAL = 0.5
+
+# Finished jobs kept in memory; older ones are read back from the database
+MAX_CACHED_JOBS = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan_jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    results TEXT NOT NULL DEFAULT '[]',
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_created ON scan_jobs (created);
+"""
+
+FINISHED_STATES = ("completed", "cancelled", "failed")
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued."""
+
+
+class ScanJob:
+    """State of one scan job, shared between its worker thread and readers."""
+
+    def __init__(self, kind: str, params: Dict, job_id: str = None):
+        self.job_id = job_id or str(uuid.uuid4())
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = {}
+        self.results = []
+        self.error = None
+        self.events = []
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def add_event(self, event: str, data: Dict):
+        with self.lock:
+            self.events.append({'id': len(self.events), 'event': event, 'data': data})
+
+    def events_since(self, last_id: int) -> List[Dict]:
+        with self.lock:
+            return self.events[last_id + 1:]
+
+    def set_status(self, status: str, error: str = None):
+        self.status = status
+        self.error = error
+        if status == "running":
+            self.started = time.time()
+        elif status in FINISHED_STATES:
+            self.finished = time.time()
+        self.add_event('status', {'status': status, 'error': error})
+
+    def to_dict(self, include_results: bool = True) -> Dict:
+        job = {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'progress': self.progress,
+            'result_count': len(self.results),
+            'error': self.error,
+        }
+        if include_results:
+            job['results'] = self.results
+        return job
+
+
+def _validate_target(target: str, networks: List[ipaddress.IPv4Network]) -> str:
+    try:
+        ip = str(ipaddress.IPv4Address(target))
+    except ValueError:
+        try:
+            ip = socket.gethostbyname(target)
+        except OSError:
+            raise ValueError(f"Cannot resolve target: {target}") from None
+    if not any(ipaddress.ip_address(ip) in network for network in networks):
+        raise ValueError(f"{target} ({ip}) is outside the networks this service may scan")
+    return ip
+
+
+def validate_params(kind: str, params: Dict, networks: List[ipaddress.IPv4Network] = None) -> Dict:
+    """
+    Check and normalize job parameters; raises ValueError if invalid. Targets
+    and ranges must lie within `networks` (SCAN_ALLOWED_NETWORKS by default).
+    """
+    networks = allowed_networks() if networks is None else networks
+    if not networks:
+        raise ValueError("Scanning is not enabled on this service")
+    if kind == "ports":
+        if not params.get('target'):
+            raise ValueError("A 'target' host is required for port scans")
+        ports = params.get('ports') or "top100"
+        PortSpec.parse(ports)
+        order = params.get('order') or "frequency"
+        if order not in ("frequency", "random", "numeric"):
+            raise ValueError(f"Unknown port order: {order}")
+        return {
+            'target': _validate_target(params['target'], networks),
+            'ports': ports,
+            'order': order,
+            'timeout': min(max(float(params.get('timeout') or 1.0), 0.1), 10.0),
+        }
+    if kind == "network":
+        ranges = params.get('ranges') or []
+        if not ranges:
+            raise ValueError("At least one network range is required for network scans")
+        ranges = normalize_ranges(ranges, MIN_PREFIX)
+        for network_range in ranges:
+            network = ipaddress.ip_network(network_range, strict=False)
+            if not any(network.subnet_of(allowed) for allowed in networks):
+                raise ValueError(f"{network_range} is outside the networks this service may scan")
+        return {'ranges': ranges}
+    raise ValueError(f"Unknown scan kind: {kind}")
+
+
+def run_engine(kind: str, params: Dict, concurrency: int = None,
+               cancel: threading.Event = None) -> Iterator[Dict]:
+    """
+    Start the scanner engine for a job and return its event generator.
+    `concurrency` bounds the addresses a network sweep probes at once.
+    Setting `cancel` stops the engine's probe loop and ends the generator
+    shortly after, even if the scan has produced nothing since.
+    """
+    if kind == "ports":
+        from port_scanner import iter_scan
+        return iter_scan(params['target'], PortSpec.parse(params['ports']), order=params['order'],
+                         timeout=params['timeout'], cancel=cancel)
+    from network_scanner import iter_scan_network
+    return iter_scan_network(params['ranges'], max_workers=concurrency, cancel=cancel)
+
+
+class ScanJobManager:
+    """Queue of scan jobs run on a bounded thread pool."""
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 20, db_path: str = DEFAULT_DB_PATH,
+                 networks: List[ipaddress.IPv4Network] = None):
+        self.max_queued = max_queued
+        self.db_path = db_path
+        self.networks = allowed_networks() if networks is None else networks
+        # Each running job gets an equal, fixed part of the scanners' share of the fd limit
+        self.discovery_concurrency = default_concurrency(fd_share=SCAN_FD_SHARE / max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-job")
+        self.jobs: "OrderedDict[str, ScanJob]" = OrderedDict()
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Jobs that were running when the process stopped will never finish
+            conn.execute("UPDATE scan_jobs SET status = 'failed', error = 'Server restarted' "
+                         "WHERE status IN ('queued', 'running')")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, kind: str, params: Dict) -> ScanJob:
+        """Validate and enqueue a job. Raises ValueError or JobQueueFull."""
+        job = ScanJob(kind, validate_params(kind, params, self.networks))
+        with self.lock:
+            queued = sum(1 for j in self.jobs.values() if j.status == "queued")
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"{queued} scan jobs are already queued")
+            self.jobs[job.job_id] = job
+        job.add_event('status', {'status': job.status, 'error': None})
+        self._save(job)
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        return job or self._load(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """Summaries of recent jobs, newest first; results are counted, not loaded."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, kind, params, status, created, started, finished, progress, error, "
+                "json_array_length(results) AS result_count FROM scan_jobs ORDER BY created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        with self.lock:
+            live = {row['job_id']: self.jobs.get(row['job_id']) for row in rows}
+        summaries = []
+        for row in rows:
+            job = live[row['job_id']]
+            if job is not None:
+                summaries.append(job.to_dict(include_results=False))
+            else:
+                summaries.append({
+                    'job_id': row['job_id'],
+                    'kind': row['kind'],
+                    'params': json.loads(row['params']),
+                    'status': row['status'],
+                    'created': row['created'],
+                    'started': row['started'],
+                    'finished': row['finished'],
+                    'progress': json.loads(row['progress']),
+                    'result_count': row['result_count'],
+                    'error': row['error'],
+                })
+        return summaries
+
+    def cancel(self, job_id: str) -> Optional[ScanJob]:
+        """Request cancellation; queued jobs never start, running ones stop their engine's probe loop."""
+        job = self.get(job_id)
+        if job and not job.done:
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.set_status("cancelled")
+                self._save(job)
+        return job
+
+    def shutdown(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: ScanJob):
+        if job.cancel_event.is_set():
+            # Cancelled while queued; cancel() already saved it
+            self._evict()
+            return
+        job.set_status("running")
+        last_progress = 0.0
+        events = None
+        try:
+            events = run_engine(job.kind, job.params, self.discovery_concurrency, job.cancel_event)
+            for event in events:
+                if job.cancel_event.is_set():
+                    break
+                event_type = event.pop('type')
+                if event_type == 'progress':
+                    job.progress = event
+                    now = time.monotonic()
+                    if now - last_progress >= PROGRESS_INTERVAL or event['done'] == event['total']:
+                        last_progress = now
+                        job.add_event('progress', event)
+                else:
+                    job.results.append(event)
+                    job.add_event('result', event)
+            job.set_status("cancelled" if job.cancel_event.is_set() else "completed")
+        except Exception as e:
+            job.set_status("failed", str(e))
+        finally:
+            if events is not None:
+                events.close()
+            self._save(job)
+            self._evict()
+
+    def _evict(self):
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.done]
+            for job_id in finished[:max(0, len(finished) - MAX_CACHED_JOBS)]:
+                del self.jobs[job_id]
+
+    def _save(self, job: ScanJob):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scan_jobs (job_id, kind, params, status, created, started, "
+                "finished, progress, results, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.kind, json.dumps(job.params), job.status, job.created, job.started,
+                 job.finished, json.dumps(job.progress), json.dumps(job.results), job.error),
+            )
+
+    def _load(self, job_id: str) -> Optional[ScanJob]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM scan_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = ScanJob(row['kind'], json.loads(row['params']), job_id=row['job_id'])
+        job.status = row['status']
+        job.created, job.started, job.finished = row['created'], row['started'], row['finished']
+        job.progress = json.loads(row['progress'])
+        job.results = json.loads(row['results'])
+        job.error = row['error']
+        for result in job.results:
+            job.add_event('result', result)
+        job.add_event('status', {'status': job.status, 'error': job.error})
+        return job
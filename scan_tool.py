@@ -0,0 +1,181 @@
+"""
+Scan Tool - Guarded, Cached Port Checks for the Agent
+Backs the agent's port_scan tool with the port_scanner engine. Targets must
+fall inside an allowlist of networks, port results are cached per target with
+a TTL so repeated questions in a conversation do not rescan, concurrent scans
+are limited, and the agent receives a compact JSON summary.
+
+Configuration (environment):
+    SCAN_ALLOWED_NETWORKS  comma-separated CIDRs that may be scanned
+                           (scanning is disabled when unset or invalid)
+    SCAN_CACHE_TTL         seconds a port result stays fresh (default: 300)
+    SCAN_MAX_CONCURRENT    scans running at once (default: 2)
+"""
+
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from port_scanner import iter_scan
+from port_spec import PortSpec
+
+
+# Largest number of ports one tool call may check
+MAX_PORTS = 1024
+
+# Targets whose port results are kept
+MAX_CACHED_TARGETS = 256
+
+SCAN_TIMEOUT = 1.0
+
+
+def parse_networks(value: str) -> List[ipaddress.IPv4Network]:
+    """Parse comma-separated CIDRs; raises ValueError naming the entry that is invalid."""
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError as e:
+            raise ValueError(f"Invalid network '{item}' in SCAN_ALLOWED_NETWORKS: {e}") from None
+    return networks
+
+
+def allowed_networks() -> List[ipaddress.IPv4Network]:
+    """
+    The networks in SCAN_ALLOWED_NETWORKS. An invalid value is reported and
+    disables scanning, rather than raising and taking the service down.
+    """
+    try:
+        return parse_networks(os.getenv("SCAN_ALLOWED_NETWORKS", ""))
+    except ValueError as e:
+        print(f"ERROR: {e} - port scanning is disabled")
+        return []
+
+
+class PortScanTool:
+    """Allowlisted port checks with a per-target result cache."""
+
+    def __init__(self, networks: List[ipaddress.IPv4Network] = None, ttl: float = None,
+                 max_concurrent: int = None):
+        self.networks = allowed_networks() if networks is None else networks
+        self.ttl = float(os.getenv("SCAN_CACHE_TTL", 300)) if ttl is None else ttl
+        max_concurrent = max_concurrent or int(os.getenv("SCAN_MAX_CONCURRENT", 2))
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        # ip -> {(protocol, port): (is_open, service, checked_at)}
+        self.cache: "OrderedDict[str, Dict[Tuple[str, int], Tuple[bool, str, float]]]" = OrderedDict()
+        # ip -> [lock, callers holding or waiting for it]; kept while in use, even if the cache entry is evicted
+        self.target_locks: Dict[str, list] = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, target: str) -> str:
+        """Resolve a target and check it against the allowlist; raises ValueError."""
+        if not self.networks:
+            raise ValueError("Port scanning is not enabled on this service")
+        try:
+            ip = socket.gethostbyname(target.strip())
+        except OSError:
+            raise ValueError(f"Cannot resolve host: {target}") from None
+        if not any(ipaddress.ip_address(ip) in network for network in self.networks):
+            raise ValueError(f"{target} ({ip}) is outside the networks this service may scan")
+        return ip
+
+    @contextmanager
+    def _target_lock(self, ip: str) -> Iterator[None]:
+        """Hold the target's lock. It is dropped once no caller uses it and its results are evicted."""
+        with self.lock:
+            entry = self.target_locks.setdefault(ip, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1] and ip not in self.cache:
+                    del self.target_locks[ip]
+
+    def _cached(self, ip: str) -> Dict[Tuple[str, int], Tuple[bool, str, float]]:
+        with self.lock:
+            ports = self.cache.setdefault(ip, {})
+            self.cache.move_to_end(ip)
+            while len(self.cache) > MAX_CACHED_TARGETS:
+                evicted, _ = self.cache.popitem(last=False)
+                entry = self.target_locks.get(evicted)
+                if entry and not entry[1]:
+                    del self.target_locks[evicted]
+            return ports
+
+    def check(self, target: str, ports: str = "top100") -> Dict:
+        """
+        Check ports on a target and return a summary. Ports with a fresh
+        cached result are not probed again.
+        """
+        ip = self.resolve(target)
+        spec = PortSpec.parse(ports)
+        if len(spec) > MAX_PORTS:
+            raise ValueError(f"At most {MAX_PORTS} ports can be checked at once ({len(spec)} requested)")
+
+        started = time.monotonic()
+        # One scan per target at a time; a second question waits and then hits the cache
+        with self._target_lock(ip):
+            known = self._cached(ip)
+            now = time.time()
+            wanted = [(protocol, port) for protocol in ("tcp", "udp") for port in spec.iter_ports(protocol)]
+            stale = PortSpec()
+            for protocol, port in wanted:
+                entry = known.get((protocol, port))
+                if entry is None or now - entry[2] > self.ttl:
+                    stale.add(port, protocol)
+
+            if len(stale):
+                with self.slots:
+                    found = {}
+                    for event in iter_scan(ip, stale, timeout=SCAN_TIMEOUT):
+                        if event['type'] == 'port':
+                            found[(event['protocol'], event['port'])] = event['service']
+                checked_at = time.time()
+                for protocol in ("tcp", "udp"):
+                    for port in stale.iter_ports(protocol):
+                        key = (protocol, port)
+                        known[key] = (key in found, found.get(key, ""), checked_at)
+
+            results = [(key, known[key]) for key in wanted]
+
+        open_ports = [{'port': port, 'protocol': protocol, 'service': service}
+                      for (protocol, port), (is_open, service, _) in results if is_open]
+        return {
+            'target': target,
+            'ip': ip,
+            'ports_checked': len(results),
+            'open': open_ports,
+            'not_open': len(results) - len(open_ports),
+            'from_cache': len(results) - len(stale),
+            'oldest_result_age_s': round(time.time() - min(checked for _, (_, _, checked) in results), 1) if results else 0,
+            'scan_seconds': round(time.monotonic() - started, 2),
+        }
+
+    def run(self, target: str, ports: str = "top100") -> str:
+        """Tool entry point: a compact JSON summary, or an error the agent can relay."""
+        try:
+            return json.dumps(self.check(target, ports), separators=(",", ":"))
+        except ValueError as e:
+            return json.dumps({'target': target, 'error': str(e)})
+
+
+_default_tool: Optional[PortScanTool] = None
+
+
+def get_scan_tool() -> PortScanTool:
+    global _default_tool
+    if _default_tool is None:
+        _default_tool = PortScanTool()
+    return _default_tool
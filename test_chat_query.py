@@ -0,0 +1,142 @@
+"""
+Tests for chat_query: retries that reuse one Idempotency-Key, the load
+test's bookkeeping and its latency percentiles, against a stubbed session.
+Run with: python -m pytest test_chat_query.py
+"""
+
+import json
+import re
+import types
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+import chat_query
+from chat_query import percentile, post_chat, run_load
+
+
+def response(status, body=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(body or {}).encode()
+    return r
+
+
+class StubSession:
+    """Session whose posts return (or raise) the queued outcomes in turn, recording each request."""
+
+    def __init__(self, outcomes, on_post=None):
+        self.outcomes = list(outcomes)
+        self.requests = []
+        self.on_post = on_post
+        self.closed = False
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.requests.append({'url': url, 'headers': dict(headers), 'json': dict(json)})
+        if self.on_post:
+            self.on_post()
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace chat_query's time module: sleeps are recorded, perf_counter only moves when told."""
+    fake = types.SimpleNamespace(now=0.0, sleeps=[])
+    fake.perf_counter = lambda: fake.now
+    fake.sleep = fake.sleeps.append
+    monkeypatch.setattr(chat_query, "time", fake)
+    return fake
+
+
+def test_retries_reuse_one_idempotency_key(clock):
+    session = StubSession([response(503), requests.exceptions.ConnectionError("reset"),
+                           requests.exceptions.Timeout("slow"), response(200, {"response": "hi"})])
+    result = post_chat("hello", "http://chat/chat", "thread-1", session)
+    assert result.status_code == 200
+    assert len(session.requests) == 4
+    keys = {r['headers']["Idempotency-Key"] for r in session.requests}
+    assert len(keys) == 1
+    assert all(r['json'] == {"message": "hello", "thread_id": "thread-1"} for r in session.requests)
+    assert clock.sleeps == [1, 2, 4]
+
+    # A new message gets a new key
+    session = StubSession([response(200)])
+    post_chat("again", session=session)
+    assert session.requests[0]['headers']["Idempotency-Key"] not in keys
+    assert session.requests[0]['json'] == {"message": "again"}
+
+
+def test_gives_up_after_the_last_retry(clock):
+    session = StubSession([response(502)] * 3)
+    assert post_chat("hello", session=session, retries=2).status_code == 502
+    assert len(session.requests) == 3
+
+    session = StubSession([requests.exceptions.ConnectionError("down")] * 2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        post_chat("hello", session=session, retries=1)
+    assert len({r['headers']["Idempotency-Key"] for r in session.requests}) == 1
+
+
+def test_other_errors_are_not_retried(clock):
+    session = StubSession([response(500)])
+    assert post_chat("hello", session=session).status_code == 500
+    assert len(session.requests) == 1 and clock.sleeps == []
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(100, 0, -1))
+    assert [percentile(values, f) for f in (0.0, 0.5, 0.9, 0.95, 0.99, 1.0)] == [1, 50, 90, 95, 99, 100]
+    assert percentile([7], 0.99) == 7
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile([], 0.5) == 0.0
+
+
+def test_run_load_keeps_each_users_thread_and_counts_errors(monkeypatch, capsys):
+    sessions = []
+
+    def create_session(pool_size=10):
+        number = len(sessions)
+        ok = response(200, {"thread_id": f"thread-{number}"})
+        outcomes = [ok, ok, response(503), requests.exceptions.Timeout("slow")]
+        sessions.append(StubSession(outcomes))
+        return sessions[-1]
+
+    monkeypatch.setattr(chat_query, "create_session", create_session)
+    run_load(3, "http://chat/chat", turns=4, think_time=0)
+
+    assert len(sessions) == 3 and all(s.closed for s in sessions)
+    for session in sessions:
+        threads = [r['json'].get("thread_id") for r in session.requests]
+        assert threads[0] is None and len(set(threads[1:])) == 1 and threads[1].startswith("thread-")
+        # Failed requests are not retried, so every request carries its own key
+        assert len({r['headers']["Idempotency-Key"] for r in session.requests}) == 4
+
+    out = capsys.readouterr().out
+    assert re.search(r"Requests:\s+12 ", out)
+    assert re.search(r"Succeeded:\s+6\n", out)
+    assert re.search(r"Errors:\s+6 \(50.0%\)", out)
+    assert "HTTP 503: 3" in out and "timeout: 3" in out
+
+
+def test_run_load_reports_latency_percentiles(monkeypatch, capsys, clock):
+    # Request i takes i * 10 ms
+    durations = iter(range(1, 21))
+
+    def advance():
+        clock.now += next(durations) * 0.01
+
+    session = StubSession([response(200, {"thread_id": "t"})] * 20, on_post=advance)
+    monkeypatch.setattr(chat_query, "create_session", lambda pool_size=10: session)
+    run_load(1, "http://chat/chat", turns=20, think_time=0)
+
+    out = capsys.readouterr().out
+    reported = dict(re.findall(r"(p\d+|max):\s+(\d+) ms", out))
+    assert reported == {"p50": "100", "p90": "180", "p95": "190", "p99": "200", "max": "200"}
+    assert re.search(r"Requests:\s+20 in 2.1s \(9.52/s\)", out)
@@ -0,0 +1,235 @@
+"""
+Tests for compact_checkpoint: the content-addressed blob store and chained
+message lists, pruning of unused message blobs, storage stats, and round
+trips through SqliteSaver.
+Run with: python -m pytest test_compact_checkpoint.py
+
+Only the SqliteSaver round trips need langgraph; the storage tests run the
+serializer on a plain sqlite3 connection with a JSON inner serializer.
+"""
+
+import json
+import sqlite3
+
+import pytest
+
+from compact_checkpoint import COMPACT_TYPE, COMPRESSED_TYPE, MIN_COMPRESS_SIZE, CompactSerializer
+from memory_utils import delete_thread, get_storage_stats, prune_message_blobs
+
+try:
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.checkpoint.base import empty_checkpoint
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:
+    SqliteSaver = None
+
+needs_langgraph = pytest.mark.skipif(SqliteSaver is None, reason="langgraph is not installed")
+
+
+class JsonSerializer:
+    """Inner serializer for plain-dict messages."""
+
+    def dumps_typed(self, obj):
+        return "json", json.dumps(obj).encode("utf-8")
+
+    def loads_typed(self, data):
+        return json.loads(data[1])
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "checkpoints.db")
+
+
+@pytest.fixture
+def store(db_path):
+    """A serializer and a checkpoints table shaped like SqliteSaver's, on plain sqlite3."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE checkpoints (thread_id TEXT, checkpoint_id TEXT, type TEXT, checkpoint BLOB)")
+    serde = CompactSerializer(db_path, inner=JsonSerializer())
+    yield conn, serde
+    conn.close()
+    serde.conn.close()
+
+
+def put(store, thread_id, messages, serde=None):
+    conn, default = store
+    count = conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+    checkpoint = {"v": 1, "id": f"c{count}", "channel_values": {"messages": messages, "step": count}}
+    type_, payload = (serde or default).dumps_typed(checkpoint)
+    with conn:
+        conn.execute("INSERT INTO checkpoints VALUES (?, ?, ?, ?)", (thread_id, checkpoint["id"], type_, payload))
+
+
+def get(store, thread_id, serde=None):
+    conn, default = store
+    row = conn.execute("SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? ORDER BY rowid DESC LIMIT 1",
+                       (thread_id,)).fetchone()
+    return (serde or default).loads_typed(row)["channel_values"]["messages"]
+
+
+def conversation(turns):
+    messages = []
+    for turn in range(turns):
+        messages.append({"type": "human", "id": f"h{turn}", "content": f"Question {turn} about incident response " * 10})
+        messages.append({"type": "ai", "id": f"a{turn}", "content": f"Answer {turn}: enable MFA and review the logs " * 20})
+    return messages
+
+
+def test_each_message_is_stored_once_and_lists_chain(store, db_path):
+    conn, _ = store
+    messages = conversation(5)
+    for turn in range(1, 6):
+        put(store, "t1", messages[:turn * 2])
+        assert get(store, "t1") == messages[:turn * 2]
+
+    (blobs,) = conn.execute("SELECT COUNT(*) FROM message_blobs").fetchone()
+    assert blobs == 10
+    # Each turn's list row only holds the two messages it added and points at the previous turn's list
+    rows = {list_hash: (parent, json.loads(refs))
+            for list_hash, parent, refs in conn.execute("SELECT list_hash, parent, refs FROM message_lists")}
+    assert sorted(len(refs) for _, refs in rows.values()) == [2] * 5
+    roots = [list_hash for list_hash, (parent, _) in rows.items() if parent is None]
+    assert len(roots) == 1
+    assert all(parent in rows for parent, _ in rows.values() if parent is not None)
+    (type_,) = conn.execute("SELECT type FROM checkpoints").fetchone()
+    assert type_ == COMPACT_TYPE
+
+
+def test_fresh_serializer_reads_the_chain_from_the_database(store, db_path):
+    put(store, "t1", conversation(3))
+    fresh = CompactSerializer(db_path, inner=JsonSerializer())
+    try:
+        assert get(store, "t1", fresh) == conversation(3)
+        # Extending the thread from the fresh serializer only adds the new messages
+        put(store, "t1", conversation(4), fresh)
+        conn, _ = store
+        assert conn.execute("SELECT COUNT(*) FROM message_blobs").fetchone()[0] == 8
+        assert get(store, "t1") == conversation(4)
+    finally:
+        fresh.conn.close()
+
+
+def test_identical_messages_share_a_blob_across_threads(store):
+    conn, _ = store
+    opening = {"type": "human", "id": "s1", "content": "The same opening message " * 20}
+    put(store, "t1", [opening])
+    put(store, "t2", [dict(opening), {"type": "ai", "id": "a1", "content": "Only in thread two"}])
+    assert conn.execute("SELECT COUNT(*) FROM message_blobs").fetchone()[0] == 2
+    assert get(store, "t2")[0] == opening
+
+
+def test_small_and_other_values(store):
+    _, serde = store
+    assert serde.dumps_typed({"a": 1}) == ("json", b'{"a": 1}')
+    type_, payload = serde.dumps_typed({"text": "x" * MIN_COMPRESS_SIZE * 4})
+    assert type_ == COMPRESSED_TYPE and len(payload) < MIN_COMPRESS_SIZE * 4
+    assert serde.loads_typed((type_, payload)) == {"text": "x" * MIN_COMPRESS_SIZE * 4}
+    # Checkpoints written by the inner serializer are still read
+    assert serde.loads_typed(("json", b'{"v": 1}')) == {"v": 1}
+
+
+def test_missing_list_is_an_error(store, db_path):
+    conn, _ = store
+    put(store, "t1", conversation(1))
+    with conn:
+        conn.execute("DELETE FROM message_lists")
+    fresh = CompactSerializer(db_path, inner=JsonSerializer())
+    try:
+        with pytest.raises(KeyError, match="missing message list"):
+            get(store, "t1", fresh)
+    finally:
+        fresh.conn.close()
+
+
+def test_prune_removes_unused_blobs_and_invalidates_caches(store, db_path):
+    conn, _ = store
+    shared = {"type": "human", "id": "s1", "content": "The same opening message in two threads " * 10}
+    put(store, "t1", [shared])
+    put(store, "t2", [shared, {"type": "ai", "id": "a1", "content": "Only in thread two"}])
+    assert prune_message_blobs(db_path) == 0
+
+    delete_thread("t2", db_path)
+    assert prune_message_blobs(db_path) == 1
+    assert get(store, "t1") == [shared]
+    assert conn.execute("SELECT COUNT(*) FROM message_lists").fetchone()[0] == 1
+
+    delete_thread("t1", db_path)
+    assert prune_message_blobs(db_path) == 1
+    assert conn.execute("SELECT COUNT(*) FROM message_lists").fetchone()[0] == 0
+    # The serializer still knows `shared` from before the prune; it must write its blob again
+    put(store, "t3", [shared])
+    assert get(store, "t3") == [shared]
+
+
+def test_storage_stats(store, db_path, tmp_path):
+    conn, _ = store
+    messages = conversation(10)
+    for turn in range(1, 11):
+        put(store, "t1", messages[:turn * 2])
+    with conn:
+        conn.execute("INSERT INTO checkpoints VALUES ('t0', 'old', 'json', ?)", (b'{"legacy": true}',))
+
+    stats = get_storage_stats(db_path)
+    payloads = [len(p) for (p,) in conn.execute("SELECT checkpoint FROM checkpoints")]
+    blob_bytes = conn.execute("SELECT SUM(LENGTH(data)) FROM message_blobs").fetchone()[0] + \
+        conn.execute("SELECT SUM(LENGTH(refs)) FROM message_lists").fetchone()[0]
+    plain = sum(len(JsonSerializer().dumps_typed(m)[1]) for turn in range(1, 11) for m in messages[:turn * 2])
+    assert stats["compact_checkpoints"] == 10
+    assert stats["blob_bytes"] == blob_bytes
+    assert stats["stored_bytes"] == sum(payloads) + blob_bytes
+    # Logical size counts every message of every checkpoint, as the default serializer would store them
+    assert stats["logical_bytes"] > plain
+    assert stats["compression_ratio"] == round(stats["logical_bytes"] / stats["stored_bytes"], 2) > 5
+
+    assert get_storage_stats(str(tmp_path / "empty.db"))["compression_ratio"] == 1.0
+
+
+@pytest.fixture
+def saver(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    saver = SqliteSaver(conn, serde=CompactSerializer(db_path))
+    yield saver
+    conn.close()
+    saver.serde.conn.close()
+
+
+def save(saver, thread_id, messages):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": messages}
+    saver.put({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}, checkpoint, {}, {})
+
+
+def load(saver, thread_id):
+    return saver.get_tuple({"configurable": {"thread_id": thread_id}}).checkpoint["channel_values"]["messages"]
+
+
+def thread(turns):
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(f"Question {turn} about incident response " * 10, id=f"h{turn}"))
+        messages.append(AIMessage(f"Answer {turn}: enable MFA and review the logs " * 20, id=f"a{turn}"))
+    return messages
+
+
+@needs_langgraph
+def test_round_trip_through_sqlite_saver(saver, db_path):
+    messages = thread(3)
+    save(saver, "t1", messages)
+    loaded = load(saver, "t1")
+    assert [(type(m), m.id, m.content) for m in loaded] == [(type(m), m.id, m.content) for m in messages]
+
+    conn = sqlite3.connect(db_path)
+    (type_,) = conn.execute("SELECT type FROM checkpoints").fetchone()
+    conn.close()
+    assert type_ == COMPACT_TYPE
+
+
+@needs_langgraph
+def test_round_trip_with_a_fresh_serializer(saver, db_path):
+    save(saver, "t1", thread(2))
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    fresh = SqliteSaver(conn, serde=CompactSerializer(db_path))
+    assert [m.content for m in load(fresh, "t1")] == [m.content for m in thread(2)]
+    conn.close()
+    fresh.serde.conn.close()
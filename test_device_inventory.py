@@ -0,0 +1,112 @@
+"""
+Tests for device_inventory: the scan diff (appeared, disappeared, ports
+changed), staleness-based re-enrichment and merging IP-only records.
+Run with: python -m pytest test_device_inventory.py
+"""
+
+import pytest
+
+import device_inventory
+from device_inventory import DEFAULT_MAX_AGE, DeviceInventory
+
+RANGE = ["192.168.1.0/24"]
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    inv = DeviceInventory(str(tmp_path / "devices.db"))
+    yield inv
+    inv.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(device_inventory.time, "time", lambda: now[0])
+    return now
+
+
+def device(ip, mac="Unknown", hostname="Unknown", ports=()):
+    return {'ip': ip, 'mac': mac, 'hostname': hostname, 'vendor': "Unknown", 'open_ports': list(ports)}
+
+
+def test_new_devices_appear(inventory):
+    printer = device("192.168.1.20", "AA:BB:CC:00:00:20", "printer", [80, 631])
+    changes = inventory.record_scan([printer], RANGE)
+    assert changes == {'appeared': [printer], 'disappeared': [], 'changed': []}
+
+    changes = inventory.record_scan([printer], RANGE)
+    assert changes == {'appeared': [], 'disappeared': [], 'changed': []}
+
+
+def test_missing_devices_disappear_only_within_the_scanned_ranges(inventory):
+    printer = device("192.168.1.20", "AA:BB:CC:00:00:20", "printer", [80])
+    nas = device("10.0.0.5", "AA:BB:CC:00:00:05", "nas", [445])
+    inventory.record_scan([printer, nas], RANGE + ["10.0.0.0/24"])
+
+    changes = inventory.record_scan([], RANGE)
+    assert [d['ip'] for d in changes['disappeared']] == ["192.168.1.20"]
+    assert changes['disappeared'][0]['hostname'] == "printer"
+    present = {d['ip']: d['present'] for d in inventory.all_devices()}
+    assert present == {"192.168.1.20": False, "10.0.0.5": True}
+
+    # Coming back counts as appearing again
+    changes = inventory.record_scan([printer], RANGE)
+    assert changes['appeared'] == [printer]
+
+
+def test_port_and_ip_changes(inventory):
+    mac = "AA:BB:CC:00:00:20"
+    inventory.record_scan([device("192.168.1.20", mac, "printer", [80, 631])], RANGE)
+
+    changes = inventory.record_scan([device("192.168.1.21", mac, "printer", [80, 443])], RANGE)
+    assert changes['appeared'] == [] and changes['disappeared'] == []
+    assert changes['changed'] == [{'old_ip': "192.168.1.20", 'ports_opened': [443], 'ports_closed': [631],
+                                   'ip': "192.168.1.21", 'mac': mac}]
+
+    # A device that was not re-enriched keeps its stored ports, so no port change is reported
+    changes = inventory.record_scan([device("192.168.1.21", mac, "printer", [])], RANGE, enriched=[])
+    assert changes['changed'] == []
+    assert inventory.all_devices()[0]['open_ports'] == [80, 443]
+
+
+def test_stale_devices_are_re_enriched(inventory, clock):
+    mac = "AA:BB:CC:00:00:20"
+    inventory.record_scan([device("192.168.1.20", mac, "printer", [80])], RANGE)
+    assert inventory.cached_device("192.168.1.20", mac)['hostname'] == "printer"
+    assert inventory.cached_device("192.168.1.21", mac) is None, "moved to a new IP"
+    assert inventory.cached_device("192.168.1.30", "AA:BB:CC:00:00:30") is None, "never seen"
+
+    # Being seen without enrichment does not refresh the record's age
+    clock[0] += DEFAULT_MAX_AGE / 2
+    inventory.record_scan([device("192.168.1.20", mac)], RANGE, enriched=[])
+    assert inventory.cached_device("192.168.1.20", mac) is not None
+    clock[0] += DEFAULT_MAX_AGE / 2 + 1
+    assert inventory.cached_device("192.168.1.20", mac) is None
+    assert inventory.cached_device("192.168.1.20", mac, max_age=2 * DEFAULT_MAX_AGE) is not None
+
+    inventory.record_scan([device("192.168.1.20", mac, "printer", [80])], RANGE, enriched=["192.168.1.20"])
+    assert inventory.cached_device("192.168.1.20", mac) is not None
+
+
+def test_unknown_mac_falls_back_to_the_record_at_that_ip(inventory):
+    mac = "AA:BB:CC:00:00:20"
+    inventory.record_scan([device("192.168.1.20", mac, "printer", [80])], RANGE)
+
+    # No neighbour table this run: the MAC record at the same IP is reused rather than duplicated
+    assert inventory.cached_device("192.168.1.20")['mac'] == mac
+    changes = inventory.record_scan([device("192.168.1.20", hostname="printer", ports=[80])], RANGE)
+    assert changes == {'appeared': [], 'disappeared': [], 'changed': []}
+    assert len(inventory.all_devices()) == 1
+
+
+def test_ip_only_record_is_merged_once_the_mac_is_known(inventory, clock):
+    inventory.record_scan([device("192.168.1.20", hostname="printer", ports=[80])], RANGE)
+    first_seen = clock[0]
+    clock[0] += 60
+
+    mac = "AA:BB:CC:00:00:20"
+    changes = inventory.record_scan([device("192.168.1.20", mac, "printer", [80])], RANGE)
+    assert changes == {'appeared': [], 'disappeared': [], 'changed': []}
+    [stored] = inventory.all_devices()
+    assert stored['mac'] == mac and stored['first_seen'] == first_seen
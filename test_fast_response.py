@@ -0,0 +1,103 @@
+"""
+Tests for fast_response: message encoding, Accept-Encoding negotiation and
+the compression threshold.
+Run with: python -m pytest test_fast_response.py
+"""
+
+import gzip
+import json
+
+import pytest
+
+import fast_response
+from fast_response import (COMPRESS_MIN_SIZE, accepted_encodings, choose_encoding, compress_body, encode_history,
+                           json_response)
+
+
+class Message:
+    """Stand-in for a LangChain message; only the class name and content are encoded."""
+
+    def __init__(self, content):
+        self.content = content
+
+
+class HumanMessage(Message):
+    pass
+
+
+class AIMessage(Message):
+    pass
+
+
+class Request:
+    def __init__(self, accept_encoding=""):
+        self.headers = {"accept-encoding": accept_encoding}
+
+
+@pytest.fixture
+def no_brotli(monkeypatch):
+    monkeypatch.setattr(fast_response, "brotli", None)
+
+
+def test_encode_history_matches_the_json_encoder():
+    messages = [HumanMessage('Is "CVE-2024-3400" bad? ü'), AIMessage("Yes.\nPatch now.")]
+    assert json.loads(encode_history("t1", messages)) == {
+        "thread_id": "t1",
+        "messages": [{"type": "HumanMessage", "content": 'Is "CVE-2024-3400" bad? ü'},
+                     {"type": "AIMessage", "content": "Yes.\nPatch now."}],
+    }
+    assert json.loads(encode_history("t1", [])) == {"thread_id": "t1", "messages": []}
+
+
+def test_accepted_encodings_parses_q_values():
+    assert accepted_encodings("gzip;q=0.5, br, identity;q=0, x;q=bad") == {
+        "gzip": 0.5, "br": 1.0, "identity": 0.0, "x": 0.0}
+    assert accepted_encodings("") == {}
+
+
+def test_brotli_is_preferred_when_available():
+    if fast_response.brotli is None:
+        pytest.skip("brotli is not installed")
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0.5") == "gzip"
+
+
+def test_gzip_without_brotli(no_brotli):
+    assert choose_encoding("gzip, br") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def test_q_zero_refuses_a_coding():
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*;q=0.5, gzip;q=0, br;q=0") is None
+    assert choose_encoding("*") in ("br", "gzip")
+    assert choose_encoding("identity") is None
+
+
+def test_small_bodies_are_not_compressed():
+    body = b"x" * (COMPRESS_MIN_SIZE - 1)
+    assert compress_body(body, "gzip") == (body, None)
+
+
+def test_large_bodies_are_compressed(no_brotli):
+    body = json.dumps({"messages": ["patch the vpn gateway"] * 200}).encode()
+    compressed, coding = compress_body(body, "gzip")
+    assert coding == "gzip"
+    assert gzip.decompress(compressed) == body
+    assert compress_body(body, "") == (body, None)
+
+
+def test_json_response_sets_headers(no_brotli):
+    if fast_response.Response is None:
+        pytest.skip("starlette is not installed")
+    content = {"thread_id": "t1", "response": "word " * 500}
+    response = json_response(Request("gzip"), content, headers={"Idempotent-Replayed": "true"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["idempotent-replayed"] == "true"
+    assert json.loads(gzip.decompress(response.body)) == content
+
+    small = json_response(Request("gzip"), {"ok": True})
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    assert json.loads(small.body) == {"ok": True}
@@ -0,0 +1,78 @@
+"""
+Tests for fingerprint: rule matching and confidence scoring.
+Run with: python -m pytest test_fingerprint.py
+"""
+
+import pytest
+
+from fingerprint import RuleEngine, get_default_engine
+from network_scanner import identify_shark_vacuum
+
+
+RULES = [
+    {"name": "cam-vendor", "device_type": "Camera", "score": 0.6, "match": {"vendor": "hikvision"}},
+    {"name": "cam-rtsp", "device_type": "Camera", "score": 0.5, "match": {"ports_any": [554, 8554]}},
+    {"name": "cam-web-and-rtsp", "device_type": "Camera", "score": 0.2, "match": {"ports_all": [80, 554]}},
+    {"name": "printer-ipp", "device_type": "Printer", "score": 0.9, "match": {"services": ["_ipp._tcp"]}},
+    {"name": "nas-name", "device_type": "NAS", "score": 0.7,
+     "match": {"hostname": "synology|diskstation", "ports_any": [5000, 5001]}},
+]
+
+
+def device(**fields):
+    return dict({"ip": "10.0.0.2", "mac": "Unknown", "hostname": "Unknown", "vendor": "Unknown",
+                 "open_ports": []}, **fields)
+
+
+def test_scores_of_matching_rules_combine_as_independent_evidence():
+    engine = RuleEngine(RULES)
+    [match] = engine.classify(device(vendor="Hikvision Digital", open_ports=[80, 554]))
+    assert match["device_type"] == "Camera"
+    assert sorted(match["rules"]) == ["cam-rtsp", "cam-vendor", "cam-web-and-rtsp"]
+    assert match["confidence"] == round(1 - 0.4 * 0.5 * 0.8, 3)
+
+
+def test_all_conditions_of_a_rule_must_hold():
+    engine = RuleEngine(RULES)
+    assert engine.classify(device(hostname="diskstation")) == []
+    [match] = engine.classify(device(hostname="DiskStation", open_ports=[5001]))
+    assert match["rules"] == ["nas-name"]
+
+
+def test_ports_all_needs_every_port():
+    engine = RuleEngine(RULES)
+    [match] = engine.classify(device(open_ports=[554]))
+    assert match["rules"] == ["cam-rtsp"]
+
+
+def test_services_are_matched_case_insensitively():
+    engine = RuleEngine(RULES)
+    [match] = engine.classify(device(services=["_IPP._tcp"]))
+    assert match == {"device_type": "Printer", "confidence": 0.9, "rules": ["printer-ipp"]}
+
+
+def test_results_are_sorted_by_confidence():
+    engine = RuleEngine(RULES)
+    matches = engine.classify(device(open_ports=[8554], services=["_ipp._tcp"]))
+    assert [m["device_type"] for m in matches] == ["Printer", "Camera"]
+
+
+@pytest.mark.parametrize("rule", [
+    {"name": "no-match", "device_type": "X", "score": 0.5, "match": {}},
+    {"name": "bad-field", "device_type": "X", "score": 0.5, "match": {"colour": "red"}},
+    {"name": "bad-score", "device_type": "X", "score": 1.5, "match": {"vendor": "x"}},
+    {"name": "bad-regex", "device_type": "X", "score": 0.5, "match": {"vendor": "("}},
+])
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        RuleEngine([rule])
+
+
+def test_bundled_rules_identify_a_shark_vacuum():
+    matches = get_default_engine().classify(device(hostname="Shark-RV1001", vendor="SharkNinja"))
+    assert matches[0]["device_type"] == "Shark robot vacuum"
+    assert matches[0]["confidence"] >= 0.8
+
+    is_shark, reasons = identify_shark_vacuum("10.0.0.2", "Unknown", "Shark-RV1001", [], vendor="SharkNinja")
+    assert is_shark and "Matched rule: shark-vendor" in reasons
+    assert identify_shark_vacuum("10.0.0.3", "Unknown", "laptop", [22], vendor="Dell") == (False, [])
@@ -0,0 +1,89 @@
+"""
+Tests for host_discovery: the loopback liveness sweep and reading the kernel
+neighbor table.
+Run with: python -m pytest test_host_discovery.py
+"""
+
+import socket
+import time
+
+import pytest
+
+import host_discovery
+from host_discovery import discover_hosts, read_neighbor_table
+
+PORTS = [9, 80]
+TIMEOUT = 0.5
+
+
+def silent_listener(ip, port):
+    """Bind a listener whose accept queue is full, so further SYNs are dropped and connects hang."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sockets = [listener]
+    try:
+        listener.bind((ip, port))
+        listener.listen(0)
+        for _ in range(2):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sockets.append(filler)
+            filler.setblocking(False)
+            filler.connect_ex((ip, port))
+    except OSError:
+        for sock in sockets:
+            sock.close()
+        raise
+    return sockets
+
+
+@pytest.fixture
+def loopback_network(monkeypatch):
+    """The benchmark's simulated network: refusing hosts on 127.0.0.x, silent ones on 127.0.2.x."""
+    # Loopback answers ICMP on all of 127/8, which would make the silent hosts look alive
+    monkeypatch.setattr(host_discovery, "_icmp_available", False)
+    live = [f"127.0.0.{i + 2}" for i in range(5)]
+    silent = [f"127.0.2.{i + 1}" for i in range(5)]
+    held = []
+    try:
+        for ip in silent:
+            for port in PORTS:
+                held.extend(silent_listener(ip, port))
+    except OSError as e:
+        for sock in held:
+            sock.close()
+        pytest.skip(f"cannot bind loopback listeners: {e}")
+    yield live, silent
+    for sock in held:
+        sock.close()
+
+
+def test_discover_hosts_reports_live_hosts_only(loopback_network):
+    live, silent = loopback_network
+    reported = []
+    start = time.perf_counter()
+    alive = discover_hosts(live + silent, ports=PORTS, timeout=TIMEOUT,
+                           on_result=lambda ip, ok: reported.append((ip, ok)))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(alive) == sorted(live)
+    assert sorted(reported) == sorted([(ip, True) for ip in live] + [(ip, False) for ip in silent])
+    # All addresses are probed at once, so the sweep takes about one timeout, not one per silent host
+    assert elapsed < TIMEOUT * 2
+
+
+def test_read_neighbor_table_skips_incomplete_entries(tmp_path):
+    table = tmp_path / "arp"
+    table.write_text(
+        "IP address       HW type     Flags       HW address            Mask     Device\n"
+        "192.168.1.1      0x1         0x2         aa:bb:cc:00:11:22     *        eth0\n"
+        "192.168.1.7      0x1         0x0         00:00:00:00:00:00     *        eth0\n"
+        "192.168.1.8      0x1         0x0         aa:bb:cc:00:11:88     *        eth0\n"
+        "192.168.1.9      0x1         0x2         00:00:00:00:00:00     *        eth0\n"
+        "192.168.1.20     0x1         0x6         50:14:79:12:34:56     *        wlan0\n"
+        "garbage\n"
+    )
+    assert read_neighbor_table(str(table)) == {"192.168.1.1": "AA:BB:CC:00:11:22",
+                                               "192.168.1.20": "50:14:79:12:34:56"}
+
+
+def test_read_neighbor_table_missing_file(tmp_path):
+    assert read_neighbor_table(str(tmp_path / "missing")) is None
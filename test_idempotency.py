@@ -0,0 +1,89 @@
+"""
+Tests for idempotency: running a request once per Idempotency-Key.
+Run with: python -m pytest test_idempotency.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+
+
+def test_first_request_runs_and_duplicates_replay():
+    store = IdempotencyStore()
+    calls = []
+    execute = lambda: calls.append(1) or "answer"
+    assert store.run("k1", "fp", execute) == ("answer", False)
+    assert store.run("k1", "fp", execute) == ("answer", True)
+    assert len(calls) == 1
+    assert store.stats == {'executed': 1, 'attached': 0, 'replayed': 1}
+
+
+def test_concurrent_duplicate_attaches_to_the_running_execution():
+    store = IdempotencyStore()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def execute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(store.run("k1", "fp", execute)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(store.run("k1", "fp", execute)))
+    second.start()
+    time.sleep(0.05)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("answer", False), ("answer", True)]
+    assert store.stats['attached'] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    store = IdempotencyStore(ttl=0.05)
+    calls = []
+    execute = lambda: calls.append(1) or len(calls)
+    assert store.run("k1", "fp", execute) == (1, False)
+    time.sleep(0.1)
+    assert store.run("k1", "fp", execute) == (2, False)
+
+
+def test_reusing_a_key_for_another_request_conflicts():
+    store = IdempotencyStore()
+    store.run("k1", fingerprint("thread-1", "hello"), lambda: "answer")
+    with pytest.raises(IdempotencyConflict):
+        store.run("k1", fingerprint("thread-1", "goodbye"), lambda: "other")
+
+
+def test_exceptions_are_not_stored():
+    store = IdempotencyStore()
+
+    def fail():
+        raise RuntimeError("model unavailable")
+
+    with pytest.raises(RuntimeError):
+        store.run("k1", "fp", fail)
+    assert store.run("k1", "fp", lambda: "answer") == ("answer", False)
+
+
+def test_oldest_completed_entries_are_dropped_first():
+    store = IdempotencyStore(max_entries=2)
+    for key in ("a", "b", "c"):
+        store.run(key, "fp", lambda: key)
+    assert list(store.entries) == ["b", "c"]
+
+
+def test_fingerprint_is_stable_and_field_sensitive():
+    assert fingerprint("t", "m") == fingerprint("t", "m")
+    assert fingerprint("t", "m") != fingerprint("t", "m2")
+    assert fingerprint(None, "m") != fingerprint("", "m")
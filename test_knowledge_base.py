@@ -0,0 +1,156 @@
+"""
+Tests for knowledge_base: markdown chunking, hashed embeddings, incremental
+re-indexing and search ranking on a small index built in a temp directory.
+Run with: python -m pytest test_knowledge_base.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import knowledge_base
+from knowledge_base import KnowledgeBase, chunk_markdown, embed, stem
+
+DOCS = {
+    "mfa.md": """# Multi-Factor Authentication
+
+## Turning it on
+
+Enable multi-factor authentication (MFA, 2FA) for every account. Use an authenticator
+app or a hardware security key rather than SMS codes.
+
+## Recovery codes
+
+Store recovery codes somewhere safe in case the authenticator phone is lost.
+""",
+    "phishing.md": """# Phishing
+
+## If you clicked a link
+
+Disconnect from the network, change the password of the account you entered, and report
+the email to your security team. Watch for unexpected login alerts.
+""",
+    "backups.md": """# Backups
+
+Keep three copies of your data on two kinds of media with one copy offline, so ransomware
+cannot encrypt every backup. Test restoring from backup regularly.
+""",
+}
+
+
+@pytest.fixture
+def docs(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for name, text in DOCS.items():
+        (folder / name).write_text(text)
+    return folder
+
+
+@pytest.fixture
+def kb(tmp_path, docs):
+    kb = KnowledgeBase(str(tmp_path / "index"), sources=[str(docs)])
+    assert kb.reindex() == {'unchanged': 0, 'updated': 3, 'removed': 0}
+    return kb
+
+
+@pytest.fixture
+def embed_calls(monkeypatch):
+    """Texts embedded for the index (queries excluded)."""
+    calls = []
+
+    def counting(text, *args, **kwargs):
+        if kwargs.get("idf") is None:
+            calls.append(text)
+        return embed(text, *args, **kwargs)
+
+    monkeypatch.setattr(knowledge_base, "embed", counting)
+    return calls
+
+
+def test_chunks_carry_their_heading_path():
+    text = "Intro text.\n\n# Guide\n\nTop.\n\n## Setup\n\nStep one.\n\n```\n# not a heading\n```\n\n### Details\n\nMore.\n\n# Other\n\nEnd."
+    assert [(c['heading'], c['text']) for c in chunk_markdown(text)] == [
+        ("", "Intro text."),
+        ("Guide", "Top."),
+        ("Guide > Setup", "Step one.\n\n```\n# not a heading\n```"),
+        ("Guide > Setup > Details", "More."),
+        ("Other", "End."),
+    ]
+
+
+def test_long_sections_are_packed_into_overlapping_chunks():
+    paragraphs = [f"Paragraph {i} " + "word " * 30 for i in range(6)]
+    chunks = chunk_markdown("# Long\n\n" + "\n\n".join(paragraphs), size=400, overlap=50)
+    assert len(chunks) > 1
+    assert all(len(c['text']) <= 400 * 1.5 for c in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk['text'].startswith(previous['text'][-50:].strip())
+    joined = " ".join(c['text'] for c in chunks)
+    assert all(f"Paragraph {i} " in joined for i in range(6))
+
+    oversized = chunk_markdown("x" * 2000, size=400, overlap=50)
+    assert len(oversized) > 1 and all(len(c['text']) <= 600 for c in oversized)
+
+
+def test_embeddings_are_normalized_and_deterministic():
+    vector = embed("Enable multi-factor authentication for every account")
+    assert vector.dtype == np.float32 and vector.shape == (knowledge_base.DIMENSIONS,)
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert np.array_equal(vector, embed("Enable multi-factor authentication for every account"))
+    assert not embed("the and of").any(), "stopwords only give a zero vector"
+    # Stemming and stopwords make these the same features
+    assert np.isclose(embed("scanning the ports") @ embed("scanned ports"), 1.0)
+    assert embed("phishing email") @ embed("backup restore") < 0.3
+    assert stem("scanning") == stem("scans") == stem("scanned") == "scan"
+
+
+def test_search_ranks_the_answering_chunk_first(kb):
+    results = kb.search("How do I enable two-factor authentication?")
+    assert results[0]['source'].endswith("mfa.md") and results[0]['heading'].endswith("Turning it on")
+    assert results == sorted(results, key=lambda r: -r['score'])
+
+    assert kb.search("I clicked a link in a phishing email")[0]['source'].endswith("phishing.md")
+    assert kb.search("keep an offline backup copy so ransomware cannot encrypt it")[0]['source'].endswith("backups.md")
+    assert kb.search("quarterly sales forecast spreadsheet") == []
+    assert "No matching guidance" in kb.format_results("quarterly sales forecast spreadsheet")
+    assert kb.stats['queries'] == 5 and kb.stats['answered'] == 3
+
+
+def test_editing_one_file_only_re_embeds_that_file(kb, docs, embed_calls):
+    before = {path: dict(entry) for path, entry in kb.files.items()}
+    phishing_rows = np.array(kb.matrix[before[str(docs / "phishing.md")]['start']:
+                                       before[str(docs / "phishing.md")]['end']])
+    with open(docs / "mfa.md", "a") as f:
+        f.write("\n## Shared accounts\n\nGive every person their own login instead of sharing one.\n")
+
+    assert kb.reindex() == {'unchanged': 2, 'updated': 1, 'removed': 0}
+    mfa_chunks = [c for c in kb.chunks if c['source'].endswith("mfa.md")]
+    assert len(embed_calls) == len(mfa_chunks)
+    assert all("Multi-Factor Authentication" in text for text in embed_calls)
+    # Unchanged files keep their stored vectors
+    entry = kb.files[str(docs / "phishing.md")]
+    assert np.array_equal(kb.matrix[entry['start']:entry['end']], phishing_rows)
+    assert kb.search("shared login accounts")[0]['heading'].endswith("Shared accounts")
+
+
+def test_unchanged_index_is_not_rewritten(kb, tmp_path, docs, embed_calls):
+    mtime = os.stat(kb.matrix_path).st_mtime_ns
+    assert kb.reindex() == {'unchanged': 3, 'updated': 0, 'removed': 0}
+
+    # A fresh instance loads the saved index and finds it up to date
+    reopened = KnowledgeBase(str(tmp_path / "index"), sources=[str(docs)])
+    assert len(reopened.chunks) == len(kb.chunks)
+    assert reopened.reindex() == {'unchanged': 3, 'updated': 0, 'removed': 0}
+    assert embed_calls == []
+    assert os.stat(kb.matrix_path).st_mtime_ns == mtime
+
+
+def test_removed_files_are_dropped(kb, docs, embed_calls):
+    os.remove(docs / "backups.md")
+    assert kb.reindex() == {'unchanged': 2, 'updated': 0, 'removed': 1}
+    assert embed_calls == []
+    assert not any(c['source'].endswith("backups.md") for c in kb.chunks)
+    assert kb.matrix.shape[0] == len(kb.chunks)
+    assert all(not r['source'].endswith("backups.md") for r in kb.search("offline backup copy ransomware"))
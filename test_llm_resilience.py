@@ -0,0 +1,198 @@
+"""
+Tests for llm_resilience: the circuit breaker, retries with backoff, deadlines
+and the hedge budget.
+Run with: python -m pytest test_llm_resilience.py
+"""
+
+import contextvars
+import threading
+import time
+
+import pytest
+
+import llm_resilience
+from llm_resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, HEDGE_BUDGET, HEDGE_WINDOW,
+                            ResilientCaller, StubAPIError, is_retryable)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(llm_resilience, "BACKOFF_CAP", 0.01)
+
+
+def caller(**kwargs):
+    options = dict(timeout=5.0, hedge=False, max_retries=2, breaker=CircuitBreaker(threshold=100, cooldown=60))
+    options.update(kwargs)
+    return ResilientCaller(**options)
+
+
+def flaky(*errors, result="ok"):
+    """A call that raises each of `errors` in turn, then returns `result`."""
+    remaining = list(errors)
+    calls = []
+
+    def invoke():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    invoke.calls = calls
+    return invoke
+
+
+def test_breaker_opens_after_threshold_failures_and_probes_after_cooldown():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow(), "only one probe while half-open"
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_retryable_errors_are_retried():
+    invoke = flaky(StubAPIError(503), StubAPIError(429))
+    resilient = caller()
+    assert resilient.call(invoke) == "ok"
+    assert len(invoke.calls) == 3
+    assert resilient.metrics()['retries'] == 2
+
+
+def test_retries_stop_after_max_retries():
+    invoke = flaky(*[StubAPIError(503)] * 5)
+    with pytest.raises(StubAPIError):
+        caller(max_retries=1).call(invoke)
+    assert len(invoke.calls) == 2
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    invoke = flaky(StubAPIError(400))
+    with pytest.raises(StubAPIError):
+        caller(breaker=breaker).call(invoke)
+    assert len(invoke.calls) == 1
+    assert breaker.state == "closed"
+
+
+def test_other_exceptions_propagate_without_touching_the_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    invoke = flaky(TypeError("bug"))
+    with pytest.raises(TypeError):
+        caller(breaker=breaker).call(invoke)
+    assert len(invoke.calls) == 1
+    assert breaker.state == "half_open" and breaker.allow(), "the probe is given back"
+
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    with pytest.raises(KeyError):
+        caller(breaker=breaker).call(flaky(KeyError("x")))
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_breaker_counts_failed_calls_not_attempts():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    resilient = caller(breaker=breaker, max_retries=2)
+    with pytest.raises(StubAPIError):
+        resilient.call(flaky(*[StubAPIError(503)] * 3))
+    assert breaker.failures == 1 and breaker.state == "closed"
+    with pytest.raises(StubAPIError):
+        resilient.call(flaky(*[StubAPIError(503)] * 3))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        resilient.call(flaky())
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(llm_resilience.time, "sleep", sleeps.append)
+    error = StubAPIError(429)
+    error.response = type("Response", (), {"headers": {"retry-after": "0.2"}})()
+    caller().call(flaky(error))
+    assert sleeps == [0.2]
+
+
+def test_deadline_cuts_a_slow_call_short():
+    resilient = caller(timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        resilient.call(lambda: time.sleep(1))
+    assert time.monotonic() - started < 0.5
+
+
+def test_request_deadline_overrides_a_longer_timeout():
+    with pytest.raises(DeadlineExceeded):
+        caller(timeout=10).call(lambda: time.sleep(1), deadline=time.monotonic() + 0.1)
+
+
+def test_no_retry_when_the_backoff_would_pass_the_deadline(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "BACKOFF_BASE", 10.0)
+    monkeypatch.setattr(llm_resilience, "BACKOFF_CAP", 10.0)
+    error = StubAPIError(503)
+    error.response = type("Response", (), {"headers": {"retry-after": "5"}})()
+    invoke = flaky(error)
+    with pytest.raises(StubAPIError):
+        caller(timeout=1).call(invoke)
+    assert len(invoke.calls) == 1
+
+
+def test_hedges_stay_within_the_budget(monkeypatch):
+    resilient = caller(hedge=True, max_retries=0)
+    # A hedge delay well below the call latency, so every attempt wants a hedge
+    monkeypatch.setattr(resilient, "hedge_delay", lambda: 0.01)
+    for _ in range(30):
+        resilient.call(lambda: time.sleep(0.05))
+    metrics = resilient.metrics()
+    assert metrics['hedges'] == int(HEDGE_BUDGET * HEDGE_WINDOW)
+    assert metrics['hedges_skipped'] == 30 - metrics['hedges']
+
+
+def test_no_hedge_while_the_primary_is_queued(monkeypatch):
+    resilient = caller(hedge=True, max_retries=0, max_workers=1)
+    monkeypatch.setattr(resilient, "hedge_delay", lambda: 0.01)
+    resilient.executor.submit(time.sleep, 0.2)
+    assert resilient.call(lambda: "ok") == "ok"
+    assert resilient.metrics()['hedges'] == 0
+
+
+def test_no_hedge_while_abandoned_requests_fill_the_budget(monkeypatch):
+    resilient = caller(hedge=True, max_retries=0, max_workers=20)
+    assert resilient.max_abandoned == 1
+    monkeypatch.setattr(resilient, "hedge_delay", lambda: 0.01)
+    release = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        resilient.call(release.wait, deadline=time.monotonic() + 0.05)
+    assert resilient.metrics()['abandoned'] >= 1
+    hedges = resilient.metrics()['hedges']
+    resilient.call(lambda: time.sleep(0.05))
+    assert resilient.metrics()['hedges'] == hedges
+    release.set()
+    time.sleep(0.05)
+    assert resilient.metrics()['abandoned'] == 0
+
+
+def test_calls_run_in_the_callers_context():
+    request_id = contextvars.ContextVar("request_id", default=None)
+    request_id.set("r-1")
+    assert caller(hedge=True).call(request_id.get) == "r-1"
+
+
+def test_is_retryable():
+    assert is_retryable(StubAPIError(429)) and is_retryable(StubAPIError(502))
+    assert not is_retryable(StubAPIError(400)) and not is_retryable(ValueError("bad"))
+    assert is_retryable(TimeoutError()) and is_retryable(ConnectionResetError())
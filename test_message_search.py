@@ -0,0 +1,74 @@
+"""
+Tests for message_search: query building, incremental indexing and deleting
+threads from the full-text index.
+Run with: python -m pytest test_message_search.py
+"""
+
+import pytest
+
+from message_search import MessageIndex, build_match, message_text
+
+
+class Message:
+    def __init__(self, id, type, content):
+        self.id, self.type, self.content = id, type, content
+
+
+@pytest.fixture
+def index(tmp_path):
+    with MessageIndex(str(tmp_path / "checkpoints.db")) as index:
+        yield index
+
+
+def test_build_match_quotes_every_word():
+    assert build_match("CVE-2024-3400 exploited") == '"CVE-2024-3400" "exploited"'
+    assert build_match('say "hi"') == '"say" """hi"""'
+    assert build_match("   ") == ""
+
+
+def test_message_text_joins_content_blocks():
+    message = Message("m1", "ai", [{"type": "text", "text": "Patch"}, "now", {"type": "image_url"}])
+    assert message_text(message) == "Patch now "
+
+
+def test_search_finds_threads_by_every_word(index):
+    index.index_messages("t1", [Message("m1", "human", "Is CVE-2024-3400 exploited on our firewall?")])
+    index.index_messages("t2", [Message("m2", "human", "Bob Smith asked about CVE-2024-1111")])
+    hits = index.search("CVE-2024-3400")
+    assert [hit["thread_id"] for hit in hits] == ["t1"]
+    assert hits[0]["snippet"] == "Is [CVE-2024-3400] exploited on our firewall?"
+    assert [hit["thread_id"] for hit in index.search("bob smith")] == ["t2"]
+    assert index.search("bob firewall") == []
+
+
+def test_indexing_is_incremental(index):
+    first = [Message("m1", "human", "reset my vpn password"), Message("m2", "ai", "Use the portal")]
+    assert index.index_messages("t1", first) == 2
+    # The next checkpoint repeats the earlier messages; only the new one is added
+    assert index.index_messages("t1", first + [Message("m3", "human", "thanks")]) == 1
+    assert index.index_messages("t1", first) == 0
+    assert index.stats() == {"indexed_messages": 3, "indexed_threads": 1}
+
+
+def test_only_human_and_ai_messages_are_indexed(index):
+    messages = [Message("s1", "system", "You are Greenfield"), Message("x1", "tool", "scan output"),
+                Message("h1", "human", "hello"), Message(None, "human", "no id")]
+    assert index.index_messages("t1", messages) == 1
+
+
+def test_seen_ids_survive_a_new_index_on_the_same_database(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    with MessageIndex(path) as index:
+        index.index_messages("t1", [Message("m1", "human", "ransomware alert")])
+    with MessageIndex(path) as index:
+        assert index.index_messages("t1", [Message("m1", "human", "ransomware alert")]) == 0
+        assert len(index.search("ransomware")) == 1
+
+
+def test_delete_thread_removes_its_messages(index):
+    index.index_messages("t1", [Message("m1", "human", "phishing email from the bank")])
+    index.index_messages("t2", [Message("m2", "human", "another phishing email")])
+    index.delete_thread("t1")
+    assert [hit["thread_id"] for hit in index.search("phishing")] == ["t2"]
+    # A deleted thread can be indexed again from scratch
+    assert index.index_messages("t1", [Message("m1", "human", "phishing email from the bank")]) == 1
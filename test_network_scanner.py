@@ -0,0 +1,270 @@
+"""
+Tests for network_scanner: concurrent device enrichment with per-stage
+timeouts and streamed results, range validation, host scheduling across
+subnets and local network detection.
+Run with: python -m pytest test_network_scanner.py
+"""
+
+import asyncio
+import ipaddress
+import itertools
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import network_scanner
+from network_scanner import (_read_ipconfig, _read_route_table, enrich_device, enrich_devices, enrich_devices_stream,
+                             get_local_networks, iter_hosts, normalize_ranges)
+
+MAC = "00:1A:11:00:00:01"
+FAST = {'mac': 0.2, 'hostname': 0.2, 'port': 0.1, 'ports': 0.2}
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """
+    Stub the hostname, MAC and port stages. Each answers at once unless its
+    delay for that IP is set in `delays[stage][ip]` (seconds).
+    """
+    delays = {'hostname': {}, 'mac': {}, 'ports': {}}
+    release = threading.Event()
+
+    def get_hostname(ip):
+        release.wait(delays['hostname'].get(ip, 0))
+        return f"host-{ip.split('.')[-1]}"
+
+    def get_mac_address(ip, neighbors=None):
+        release.wait(delays['mac'].get(ip, 0))
+        return MAC
+
+    async def check_ports_async(ip, ports, timeout):
+        await asyncio.sleep(delays['ports'].get(ip, 0))
+        return [80, 443]
+
+    monkeypatch.setattr(network_scanner, "get_hostname", get_hostname)
+    monkeypatch.setattr(network_scanner, "get_mac_address", get_mac_address)
+    monkeypatch.setattr(network_scanner, "check_ports_async", check_ports_async)
+    yield delays
+    # Let blocked lookup threads finish
+    release.set()
+
+
+def enrich(ip, neighbors=None):
+    """Enrich one device with its own lookup pool, as enrich_devices_stream does."""
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    async def timed():
+        started = time.perf_counter()
+        device = await enrich_device(ip, neighbors, pool, timeouts=FAST)
+        return device, time.perf_counter() - started
+
+    try:
+        return asyncio.run(timed())
+    finally:
+        pool.shutdown(wait=False)
+
+
+def test_all_stages_fill_the_record(stages):
+    device, _ = enrich("10.0.0.5")
+    assert device == {'ip': "10.0.0.5", 'mac': MAC, 'vendor': "Google", 'hostname': "host-5",
+                      'open_ports': [80, 443]}
+    device, _ = enrich("10.0.0.5", neighbors={"10.0.0.5": "FC:F1:52:00:00:01"})
+    assert device['mac'] == "FC:F1:52:00:00:01" and device['vendor'] == "Sony"
+    device, _ = enrich("10.0.0.5", neighbors={})
+    assert device['mac'] == "Unknown" and device['vendor'] == "Unknown"
+
+
+@pytest.mark.parametrize("stage, field, default", [
+    ('hostname', 'hostname', "Unknown"),
+    ('mac', 'mac', "Unknown"),
+    ('ports', 'open_ports', []),
+])
+def test_a_slow_stage_is_cut_off_at_its_timeout(stages, stage, field, default):
+    stages[stage]["10.0.0.5"] = 5
+    device, elapsed = enrich("10.0.0.5")
+    assert device[field] == default
+    assert elapsed < 1.0
+    others = {'hostname': "host-5", 'mac': MAC, 'open_ports': [80, 443]}
+    del others[field]
+    assert {key: device[key] for key in others} == others
+
+
+def test_devices_are_streamed_as_each_finishes(stages):
+    stages['hostname'].update({"10.0.0.1": 0.6, "10.0.0.2": 0.3})
+    stages['ports']["10.0.0.3"] = 0.1
+    seen = []
+    started = time.perf_counter()
+    devices = enrich_devices(["10.0.0.1", "10.0.0.2", "10.0.0.3"], neighbors={},
+                             on_device=lambda d: seen.append((d['ip'], time.perf_counter() - started)))
+    assert [ip for ip, _ in seen] == ["10.0.0.3", "10.0.0.2", "10.0.0.1"]
+    assert [d['ip'] for d in devices] == ["10.0.0.3", "10.0.0.2", "10.0.0.1"]
+    # Each record is reported when it is done, not when the slowest one is
+    assert seen[0][1] < 0.25 and seen[1][1] < 0.5
+    assert devices[0]['hostname'] == "host-3"
+
+
+def test_concurrency_bounds_devices_in_flight(stages):
+    ips = [f"10.0.0.{i}" for i in range(1, 7)]
+    for ip in ips:
+        stages['ports'][ip] = 0.1
+    started = time.perf_counter()
+    assert len(enrich_devices(ips, neighbors={}, concurrency=2)) == 6
+    assert time.perf_counter() - started >= 0.3
+
+
+def test_lookup_pool_is_shut_down_even_when_the_consumer_stops_early(stages, monkeypatch):
+    pools = []
+
+    class RecordingPool(network_scanner.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(network_scanner, "ThreadPoolExecutor", RecordingPool)
+    stages['hostname']["10.0.0.2"] = 5
+
+    async def first_only():
+        stream = enrich_devices_stream(["10.0.0.1", "10.0.0.2"], neighbors={}, timeouts=FAST)
+        async for device in stream:
+            await stream.aclose()
+            return device
+
+    assert asyncio.run(first_only())['ip'] == "10.0.0.1"
+    enrich_devices(["10.0.0.3"], neighbors={})
+    assert len(pools) == 2 and all(pool._shutdown for pool in pools)
+
+
+ROUTE_TABLE = """\
+Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+eth0\t00000000\t0101A8C0\t0003\t0\t0\t100\t00000000\t0\t0\t0
+eth0\t0001A8C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\t0\t0\t0
+eth0\t0000000A\t0101A8C0\t0003\t0\t0\t100\t000000FF\t0\t0\t0
+docker0\t000011AC\t00000000\t0001\t0\t0\t0\t0000FFFF\t0\t0\t0
+short line
+"""
+
+IFCONFIG = """\
+eth0: flags=4163<UP,BROADCAST,RUNNING,MULTICAST>  mtu 1500
+        inet 192.168.1.23  netmask 255.255.255.0  broadcast 192.168.1.255
+        inet6 fe80::1  prefixlen 64  scopeid 0x20<link>
+lo: flags=73<UP,LOOPBACK,RUNNING>  mtu 65536
+        inet 127.0.0.1  netmask 255.0.0.0
+en0: flags=8863<UP,BROADCAST,SMART,RUNNING,SIMPLEX,MULTICAST> mtu 1500
+\tinet 10.20.30.40 netmask 0xffff0000 broadcast 10.20.255.255
+eth1      Link encap:Ethernet  HWaddr 00:1a:11:00:00:01
+          inet addr:172.16.5.9  Bcast:172.16.5.255  Mask:255.255.255.0
+"""
+
+IPCONFIG = """\
+Windows IP Configuration
+
+Ethernet adapter Ethernet:
+
+   Connection-specific DNS Suffix  . : home
+   IPv4 Address. . . . . . . . . . . : 192.168.0.42
+   Subnet Mask . . . . . . . . . . . : 255.255.255.0
+   Default Gateway . . . . . . . . . : 192.168.0.1
+
+Wireless LAN adapter Wi-Fi:
+
+   Media State . . . . . . . . . . . : Media disconnected
+"""
+
+
+def nets(*ranges):
+    return [ipaddress.ip_network(r) for r in ranges]
+
+
+def test_normalize_ranges_drops_duplicates_and_contained_ranges():
+    assert normalize_ranges(["192.168.1.0/24", " 10.0.0.0/16", "10.0.4.0/24", "192.168.1.7/24",
+                             "10.0.0.5/32", "192.168.2.0/24"]) == \
+        ["192.168.1.0/24", "10.0.0.0/16", "192.168.2.0/24"]
+    # A larger range given later still absorbs the smaller one given first
+    assert normalize_ranges(["10.0.4.0/24", "10.0.0.0/16"]) == ["10.0.0.0/16"]
+
+
+@pytest.mark.parametrize("ranges, message", [
+    (["10.0.0.0/8"], "larger than /16"),
+    (["192.168.0.0/15"], "larger than /16"),
+    (["fd00::/64"], "Only IPv4"),
+    (["not-a-range"], "does not appear to be"),
+])
+def test_normalize_ranges_rejects_ipv6_and_oversized_ranges(ranges, message):
+    with pytest.raises(ValueError, match=message):
+        normalize_ranges(ranges)
+
+
+def test_normalize_ranges_max_prefix():
+    assert normalize_ranges(["10.0.0.0/8"], max_prefix=8) == ["10.0.0.0/8"]
+    with pytest.raises(ValueError):
+        normalize_ranges(["10.0.0.0/23"], max_prefix=24)
+
+
+def test_iter_hosts_round_robins_across_networks():
+    hosts = list(iter_hosts(nets("10.0.0.0/30", "10.0.1.0/29", "10.0.2.5/32")))
+    assert hosts == ["10.0.0.1", "10.0.1.1", "10.0.2.5", "10.0.0.2", "10.0.1.2",
+                     "10.0.1.3", "10.0.1.4", "10.0.1.5", "10.0.1.6"]
+
+
+def test_iter_hosts_skips_done_addresses_and_is_lazy():
+    small, large = nets("10.0.0.0/29", "10.1.0.0/16")
+    done = {(small, 1), (small, 2), (large, 1)}
+    hosts = iter_hosts([small, large], lambda network, offset: (network, offset) in done)
+    assert list(itertools.islice(hosts, 4)) == ["10.0.0.3", "10.1.0.2", "10.0.0.4", "10.1.0.3"]
+    # A /8 is never expanded into a list
+    assert next(iter_hosts(nets("10.0.0.0/8"))) == "10.0.0.1"
+
+
+def test_read_route_table_keeps_directly_connected_subnets(tmp_path):
+    path = tmp_path / "route"
+    path.write_text(ROUTE_TABLE)
+    assert _read_route_table(str(path)) == [(ipaddress.ip_network("192.168.1.0/24"), "eth0"),
+                                            (ipaddress.ip_network("172.17.0.0/16"), "docker0")]
+
+
+@pytest.mark.parametrize("system, output, expected", [
+    ("Linux", IFCONFIG, [("192.168.1.0/24", "eth0"), ("127.0.0.0/8", "lo"),
+                         ("10.20.0.0/16", "en0"), ("172.16.5.0/24", "eth1")]),
+    ("Windows", IPCONFIG, [("192.168.0.0/24", "Ethernet adapter Ethernet")]),
+])
+def test_read_ipconfig(monkeypatch, system, output, expected):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout=output, stderr="")
+
+    monkeypatch.setattr(network_scanner.platform, "system", lambda: system)
+    monkeypatch.setattr(network_scanner.subprocess, "run", run)
+    assert _read_ipconfig() == [(ipaddress.ip_network(network), iface) for network, iface in expected]
+    assert commands == [["ipconfig" if system == "Windows" else "ifconfig"]]
+
+
+def test_get_local_networks_filters_candidates(monkeypatch, capsys):
+    candidates = [(ipaddress.ip_network(network), iface) for network, iface in [
+        ("127.0.0.0/8", "lo"), ("169.254.0.0/16", "eth0"), ("192.168.1.0/24", "eth0"),
+        ("10.0.0.0/8", "tun0"), ("192.168.1.0/24", "br0"), ("172.17.0.0/16", "docker0")]]
+    monkeypatch.setattr(network_scanner.os.path, "exists", lambda path: True)
+    monkeypatch.setattr(network_scanner, "_read_route_table", lambda: candidates)
+    assert get_local_networks() == [(ipaddress.ip_network("192.168.1.0/24"), "eth0"),
+                                    (ipaddress.ip_network("172.17.0.0/16"), "docker0")]
+    assert "Skipping 10.0.0.0/8 on tun0" in capsys.readouterr().out
+    assert [str(network) for network, _ in get_local_networks(max_prefix=8)] == \
+        ["192.168.1.0/24", "10.0.0.0/8", "172.17.0.0/16"]
+
+
+def test_get_local_networks_falls_back_to_ipconfig(monkeypatch, capsys):
+    monkeypatch.setattr(network_scanner.os.path, "exists", lambda path: False)
+    monkeypatch.setattr(network_scanner, "_read_ipconfig",
+                        lambda: [(ipaddress.ip_network("192.168.0.0/24"), "Ethernet")])
+    assert get_local_networks() == [(ipaddress.ip_network("192.168.0.0/24"), "Ethernet")]
+
+    def broken():
+        raise FileNotFoundError("ifconfig")
+
+    monkeypatch.setattr(network_scanner, "_read_ipconfig", broken)
+    assert get_local_networks() == []
+    assert "Error detecting local networks" in capsys.readouterr().out
@@ -0,0 +1,86 @@
+"""
+Tests for oui_db: lookups in the memory-mapped OUI hash table, MAC address
+formats and the entry count stored in the header.
+Run with: python -m pytest test_oui_db.py
+"""
+
+import struct
+
+import pytest
+
+from oui_db import EMPTY_SLOT, HEADER, OUIDatabase, _slot, build_database, lookup_vendor, normalize_mac
+
+
+def colliding(mask, slot, count):
+    """The first `count` prefixes that hash to `slot`."""
+    found = []
+    prefix = 0
+    while len(found) < count:
+        if _slot(prefix, mask) == slot:
+            found.append(prefix)
+        prefix += 1
+    return found
+
+
+@pytest.fixture
+def small_db(tmp_path):
+    # 6 entries -> 8 slots. Two prefixes hash to the last slot, so the second wraps round to slot 0.
+    mask = 7
+    last, wrapped = colliding(mask, mask, 2)
+    entries = {last: "Last Slot Vendor", wrapped: "Wrapped Vendor", 0x001A11: "Google",
+               0xB0C554: "D-Link", 0x3C5AB4: "Google", 0xFCF152: "Sony"}
+    path = tmp_path / "oui.bin"
+    build_database(entries, str(path))
+    db = OUIDatabase(str(path))
+    yield db, entries, last, wrapped
+    db.close()
+
+
+def keys(db):
+    return [struct.unpack_from("<I", db._map, db._keys + 4 * i)[0] for i in range(db.slot_count)]
+
+
+def test_every_entry_is_found_including_the_first_and_last_slots(small_db):
+    db, entries, last, wrapped = small_db
+    slots = keys(db)
+    assert slots[-1] == last and slots[0] == wrapped, "probing wraps from the last slot to the first"
+    occupied = [key for key in slots if key != EMPTY_SLOT]
+    assert db.lookup_prefix(occupied[0]) == entries[occupied[0]]
+    assert db.lookup_prefix(occupied[-1]) == entries[occupied[-1]]
+    for prefix, name in entries.items():
+        assert db.lookup_prefix(prefix) == name
+
+
+def test_prefixes_not_in_the_table_are_not_found(small_db):
+    db, entries, *_ = small_db
+    # Same home slot as an entry, so the probe walks past it before reaching an empty slot
+    missing = next(prefix for prefix in colliding(db._mask, db._mask, 4) if prefix not in entries)
+    assert db.lookup_prefix(missing) is None
+    assert db.lookup("00:00:5E:00:53:01") is None
+
+
+@pytest.mark.parametrize("mac", ["00:1A:11:AA:BB:CC", "00-1A-11-AA-BB-CC", "001A11AABBCC",
+                                 "00:1a:11:aa:bb:cc", "001a.11aa.bbcc", "00:1A:11"])
+def test_mac_formats(small_db, mac):
+    db, *_ = small_db
+    assert normalize_mac(mac) == 0x001A11
+    assert db.lookup(mac) == "Google"
+
+
+@pytest.mark.parametrize("mac", ["", "Unknown", "00:1A", "00:1A:11:AA:BB:CC:DD"])
+def test_invalid_macs(small_db, mac):
+    db, *_ = small_db
+    assert normalize_mac(mac) is None
+    assert db.lookup(mac) is None
+
+
+def test_len_comes_from_the_header(small_db):
+    db, entries, *_ = small_db
+    assert len(db) == len(entries)
+    assert HEADER.unpack_from(db._map, 0)[3] == len(entries)
+
+
+def test_bundled_database():
+    assert lookup_vendor("00:1a:11:00:00:01") == "Google"
+    assert lookup_vendor("02:00:00:00:00:01") == "Private (randomized MAC)"
+    assert lookup_vendor("Unknown") == "Unknown"
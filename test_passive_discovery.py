@@ -0,0 +1,112 @@
+"""
+Tests for passive_discovery: mDNS and SSDP answers from a local stub
+responder that answers like a Shark vacuum, parsed into device records, and
+merging them with active results.
+Run with: python -m pytest test_passive_discovery.py
+"""
+
+import asyncio
+import socket
+import struct
+import threading
+
+import pytest
+
+from passive_discovery import _multicast_socket, merge_device_records, passive_discover_async
+from probe_payloads import DNS_A, DNS_PTR, DNS_SRV, DNS_TXT
+
+
+def stub_responder(name="Shark-RV1001", ip="127.0.0.1"):
+    """
+    Start local UDP responders that answer the passive queries like a device
+    would. Returns (mdns_addr, ssdp_addr, sockets) for use in place of the
+    multicast groups.
+    """
+    def encode_name(text):
+        return b"".join(bytes([len(p)]) + p.encode() for p in text.split(".")) + b"\x00"
+
+    def rr(rname, rtype, rdata):
+        return encode_name(rname) + struct.pack("!HHIH", rtype, 1, 120, len(rdata)) + rdata
+
+    instance = f"{name}._http._tcp.local"
+    host = f"{name.lower()}.local"
+    answers = [
+        rr("_http._tcp.local", DNS_PTR, encode_name(instance)),
+        rr(instance, DNS_SRV, struct.pack("!HHH", 0, 0, 80) + encode_name(host)),
+        rr(instance, DNS_TXT, b"\x0bmodel=RV100"),
+        rr(host, DNS_A, socket.inet_aton(ip)),
+    ]
+    mdns_reply = struct.pack("!HHHHHH", 0, 0x8400, 0, len(answers), 0, 0) + b"".join(answers)
+    ssdp_reply = (
+        "HTTP/1.1 200 OK\r\n"
+        "CACHE-CONTROL: max-age=1800\r\n"
+        f"LOCATION: http://{ip}:80/description.xml\r\n"
+        "SERVER: Linux/4.9 UPnP/1.0 SharkNinja/1.0\r\n"
+        "ST: urn:schemas-upnp-org:device:Basic:1\r\n"
+        "USN: uuid:0000-stub::urn:schemas-upnp-org:device:Basic:1\r\n\r\n"
+    ).encode()
+
+    sockets = []
+    for reply in (mdns_reply, ssdp_reply):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((ip, 0))
+        sock.settimeout(0.2)
+        sockets.append(sock)
+
+        def serve(sock=sock, reply=reply):
+            while True:
+                try:
+                    _, addr = sock.recvfrom(2048)
+                    sock.sendto(reply, addr)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+
+        threading.Thread(target=serve, daemon=True).start()
+
+    return sockets[0].getsockname(), sockets[1].getsockname(), sockets
+
+
+@pytest.fixture
+def stub():
+    try:
+        _multicast_socket().close()
+    except OSError as e:
+        pytest.skip(f"multicast sockets are unavailable: {e}")
+    mdns_addr, ssdp_addr, sockets = stub_responder("Shark-RV1001", "127.0.0.1")
+    yield mdns_addr, ssdp_addr
+    for sock in sockets:
+        sock.close()
+
+
+def test_stub_answers_become_device_records(stub):
+    mdns_addr, ssdp_addr = stub
+    devices = asyncio.run(passive_discover_async(0.5, mdns_addr=mdns_addr, ssdp_addr=ssdp_addr,
+                                                 watch_arp=False))
+    assert list(devices) == ["127.0.0.1"]
+    record = devices["127.0.0.1"]
+    assert record["hostname"] == "shark-rv1001"
+    assert record["names"] == ["Shark-RV1001"]
+    assert sorted(record["services"]) == ["_http._tcp", "urn:schemas-upnp-org:device:Basic:1"]
+    assert record["open_ports"] == [80]
+    assert record["ssdp_server"] == "Linux/4.9 UPnP/1.0 SharkNinja/1.0"
+    assert record["location"] == "http://127.0.0.1:80/description.xml"
+    assert sorted(record["sources"]) == ["mdns", "ssdp"]
+
+
+def test_merge_fills_in_active_records_and_appends_new_devices(stub):
+    mdns_addr, ssdp_addr = stub
+    passive = asyncio.run(passive_discover_async(0.5, mdns_addr=mdns_addr, ssdp_addr=ssdp_addr,
+                                                 watch_arp=False))
+    active = [{"ip": "127.0.0.1", "mac": "Unknown", "hostname": "Unknown", "open_ports": [22]},
+              {"ip": "127.0.0.9", "mac": "Unknown", "hostname": "other", "open_ports": []}]
+    merged = merge_device_records(active, passive)
+    assert [device["ip"] for device in merged] == ["127.0.0.1", "127.0.0.9"]
+    assert merged[0]["hostname"] == "shark-rv1001"
+    assert merged[0]["open_ports"] == [22, 80]
+    assert "_http._tcp" in merged[0]["services"]
+    assert merged[1]["hostname"] == "other"
+
+    merged = merge_device_records([], passive)
+    assert [device["ip"] for device in merged] == ["127.0.0.1"]
@@ -0,0 +1,53 @@
+"""
+Tests for port_scanner: the UDP scan against a loopback echo responder.
+Run with: python -m pytest test_port_scanner.py
+"""
+
+import socket
+import threading
+
+import pytest
+
+from port_scanner import scan_udp_ports
+
+
+@pytest.fixture
+def udp_ports():
+    """One UDP port that echoes every datagram back and one that reads them and never answers."""
+    echo = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    echo.bind(("127.0.0.1", 0))
+    echo.settimeout(0.1)
+    # Bound, so the kernel sends no port-unreachable, but nothing ever replies
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    received = []
+    done = threading.Event()
+
+    def serve():
+        while not done.is_set():
+            try:
+                data, addr = echo.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            received.append(data)
+            echo.sendto(data or b"echo", addr)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield echo.getsockname()[1], silent.getsockname()[1], received
+    done.set()
+    thread.join()
+    echo.close()
+    silent.close()
+
+
+def test_only_the_answering_port_is_reported_open(udp_ports):
+    echo_port, silent_port, received = udp_ports
+    results = scan_udp_ports("127.0.0.1", [echo_port, silent_port], timeout=0.3, retries=1, verbose=False)
+    assert [r['port'] for r in results] == [echo_port]
+    assert results[0]['state'] == 'OPEN' and results[0]['protocol'] == 'udp'
+    assert results[0]['response'] == b"echo"
+    # The echo port answered the first probe, so only the silent one was retransmitted
+    assert len(received) == 1
@@ -0,0 +1,78 @@
+"""
+Tests for port_spec: parsing port specifications and top-N port lists.
+Run with: python -m pytest test_port_spec.py
+"""
+
+import pytest
+
+from port_spec import PortSpec, ranked_ports, top_ports
+
+
+def test_parse_ports_ranges_and_protocol_prefixes():
+    spec = PortSpec.parse("22,80,1000-1002,U:53,161,T:443")
+    assert list(spec.iter_ports("tcp")) == [22, 80, 443, 1000, 1001, 1002]
+    assert list(spec.iter_ports("udp")) == [53, 161]
+    assert len(spec) == 8
+    assert ("tcp", 80) in spec and ("udp", 80) not in spec
+
+
+def test_parse_default_protocol_applies_until_a_prefix():
+    spec = PortSpec.parse("53,161,T:22", "udp")
+    assert list(spec.iter_ports("udp")) == [53, 161]
+    assert list(spec.iter_ports("tcp")) == [22]
+
+
+def test_parse_open_ended_ranges():
+    assert PortSpec.parse("-1024").count("tcp") == 1024
+    assert PortSpec.parse("65530-").count("tcp") == 6
+
+
+def test_parse_service_names_and_duplicates():
+    spec = PortSpec.parse("ssh,22,22")
+    assert list(spec.iter_ports("tcp")) == [22]
+
+
+@pytest.mark.parametrize("text", ["0", "70000", "100-50", "nosuchservice", "unknown", "top-x"])
+def test_parse_rejects_invalid_items(text):
+    with pytest.raises(ValueError):
+        PortSpec.parse(text)
+
+
+def test_top_ports_follow_the_ranking():
+    ranked = [port for port, _ in ranked_ports()["tcp"]]
+    assert top_ports(10) == ranked[:10]
+    assert top_ports(5, "udp") == [port for port, _ in ranked_ports()["udp"][:5]]
+
+
+def test_top_1000_tcp_ports_are_ranked():
+    ports = top_ports(1000, "tcp")
+    assert len(ports) == len(set(ports)) == 1000
+    assert ports[:3] == [80, 23, 443]
+
+
+def test_top_ports_beyond_the_table_is_an_error():
+    size = len(ranked_ports()["tcp"])
+    assert len(top_ports(size)) == size
+    with pytest.raises(ValueError):
+        top_ports(size + 1)
+    with pytest.raises(ValueError):
+        PortSpec.parse(f"top{size + 1}")
+
+
+def test_frequency_order_yields_ranked_ports_first():
+    spec = PortSpec.parse("top20,1-1024")
+    ordered = list(spec.iter_ports("tcp", "frequency", seed=1))
+    assert ordered[:20] == top_ports(20)
+    assert sorted(ordered) == list(spec.iter_ports("tcp"))
+
+
+def test_random_order_visits_every_port_once():
+    spec = PortSpec.parse("1-2000")
+    ordered = list(spec.iter_ports("tcp", "random", seed=3))
+    assert sorted(ordered) == list(range(1, 2001))
+    assert ordered != sorted(ordered)
+
+
+def test_digest_identifies_the_port_set():
+    assert PortSpec.parse("22,80").digest() == PortSpec.parse("80,22").digest()
+    assert PortSpec.parse("22,80").digest() != PortSpec.parse("22,81").digest()
@@ -0,0 +1,135 @@
+"""
+Tests for prefetch: entity detection and the per-thread background searches.
+Run with: python -m pytest test_prefetch.py
+"""
+
+import threading
+
+import pytest
+
+from prefetch import MAX_ENTITIES, Prefetcher, build_query, detect_entities
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Is CVE-2024-3400 exploited?", ["CVE-2024-3400"]),
+    ("cve-2021-44228 and CVE-2023-1234567", ["CVE-2021-44228", "CVE-2023-1234567"]),
+    ("see GHSA-jfh8-c2jp-5v3q", ["GHSA-JFH8-C2JP-5V3Q"]),
+    ("MS17-010 and ADV190023", ["MS17-010", "ADV190023"]),
+    ("ICSA-24-011-02, VU#123456", ["ICSA-24-011-02", "VU#123456"]),
+    ("RHSA-2024:1234 DSA-5678-1 USN-6543-21", ["RHSA-2024:1234", "DSA-5678-1", "USN-6543-21"]),
+    ("We were hit by LockBit", ["Lockbit"]),
+    ("black-basta or Black Basta or blackbasta?", ["Black-Basta"]),
+    ("Is this Cobalt Strike or cobalt-strike beacon?", ["Cobalt Strike"]),
+    ("qakbot then QAKBOT again", ["Qakbot"]),
+])
+def test_detects_advisories_and_malware_families(text, expected):
+    assert detect_entities(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "How do I set up two-factor authentication?",
+    "CVE-24-3400 is not an ID, nor is CVE-2024-123",
+    "GHSA-abcd-efgh-ijkl uses letters outside the GHSA alphabet",
+    "Our contingency plan and conference schedule",        # contain "conti"
+    "a playbook for miraipoint mirage",                    # contain "mirai" and "play"
+    "the clopper and vidarsson accounts",
+    "MS170-010 and ADV12345",
+    "",
+    None,
+])
+def test_ignores_text_without_entities(text):
+    assert detect_entities(text) == []
+
+
+def test_detection_is_capped():
+    text = " ".join(f"CVE-2024-{n:04d}" for n in range(1, 10))
+    assert len(detect_entities(text)) == MAX_ENTITIES
+
+
+class StubSearch:
+    """Search that blocks until released, recording its queries."""
+
+    def __init__(self, fail=False):
+        self.queries = []
+        self.release = threading.Event()
+        self.fail = fail
+
+    def __call__(self, query):
+        self.queries.append(query)
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("search failed")
+        return {"results": [{"title": "Advisory", "url": "https://example.com", "content": query}]}
+
+
+@pytest.fixture
+def search():
+    stub = StubSearch()
+    yield stub
+    stub.release.set()
+
+
+def test_start_only_searches_messages_with_entities(search):
+    prefetcher = Prefetcher(search)
+    assert prefetcher.start("t1", "hello there") == []
+    assert not prefetcher.has("t1")
+    assert prefetcher.start("t1", "Is CVE-2024-3400 exploited?") == ["CVE-2024-3400"]
+    assert prefetcher.has("t1") and not prefetcher.has("t2")
+    search.release.set()
+    prefetcher.take("t1")
+    assert search.queries == [build_query(["CVE-2024-3400"])]
+
+
+def test_poll_leaves_a_running_search_pending(search):
+    prefetcher = Prefetcher(search)
+    prefetcher.start("t1", "CVE-2024-3400")
+    assert prefetcher.poll("t1") is None
+    assert prefetcher.poll("t1", timeout=0.05) is None
+    assert prefetcher.has("t1")
+
+    search.release.set()
+    context = prefetcher.poll("t1", timeout=5)
+    assert "CVE-2024-3400" in context and "https://example.com" in context
+    assert not prefetcher.has("t1")
+    assert prefetcher.poll("t1") is None
+
+
+def test_poll_waits_for_a_search_that_finishes_within_the_timeout(search):
+    prefetcher = Prefetcher(search)
+    prefetcher.start("t1", "CVE-2024-3400")
+    threading.Timer(0.05, search.release.set).start()
+    assert prefetcher.poll("t1", timeout=5) is not None
+
+
+def test_take_collects_once_and_gives_up_on_a_slow_search(search):
+    prefetcher = Prefetcher(search)
+    prefetcher.start("t1", "CVE-2024-3400")
+    assert prefetcher.take("t1", timeout=0.05) is None
+    assert not prefetcher.has("t1"), "a search that timed out is dropped"
+
+    prefetcher.start("t1", "LockBit")
+    search.release.set()
+    assert "Lockbit" in prefetcher.take("t1")
+    assert prefetcher.take("t1") is None
+
+
+def test_failed_search_gives_no_context():
+    search = StubSearch(fail=True)
+    search.release.set()
+    prefetcher = Prefetcher(search)
+    prefetcher.start("t1", "CVE-2024-3400")
+    assert prefetcher.take("t1") is None
+
+
+def test_threads_are_independent(search):
+    prefetcher = Prefetcher(search)
+    prefetcher.start("t1", "CVE-2024-3400")
+    prefetcher.start("t2", "Emotet")
+    prefetcher.discard("t1")
+    assert not prefetcher.has("t1") and prefetcher.has("t2")
+    prefetcher.discard("t1")
+
+    search.release.set()
+    assert prefetcher.take("t1") is None
+    context = prefetcher.take("t2")
+    assert "Emotet" in context and "CVE-2024-3400" not in context
@@ -0,0 +1,86 @@
+"""
+Tests for scan_checkpoint: the Bitmap and resuming saved scan state.
+Run with: python -m pytest test_scan_checkpoint.py
+"""
+
+import json
+
+from scan_checkpoint import Bitmap, ScanCheckpoint
+
+
+def test_bitmap_set_test_count_and_indexes():
+    bitmap = Bitmap(70000)
+    for index in (0, 7, 8, 65535, 69999):
+        bitmap.set(index)
+    assert bitmap.test(7) and bitmap.test(65535)
+    assert not bitmap.test(6) and not bitmap.test(9)
+    assert bitmap.count() == 5
+    assert bitmap.indexes() == [0, 7, 8, 65535, 69999]
+
+
+def test_bitmap_encode_round_trip():
+    bitmap = Bitmap(1000)
+    for index in range(0, 1000, 3):
+        bitmap.set(index)
+    decoded = Bitmap.decode(1000, bitmap.encode())
+    assert decoded.indexes() == bitmap.indexes()
+
+
+def test_bitmap_ignores_data_of_the_wrong_size():
+    assert Bitmap(16, b"\xff").count() == 0
+
+
+def test_resume_skips_finished_work(tmp_path):
+    path = str(tmp_path / "state")
+    checkpoint = ScanCheckpoint.load(path, "ports")
+    checkpoint.start("10.0.0.1", 65536, spec="tcp:1-100")
+    for port in range(1, 51):
+        checkpoint.mark("10.0.0.1", port, hit=port in (22, 25))
+    checkpoint.save()
+
+    resumed = ScanCheckpoint.load(path, "ports")
+    resumed.start("10.0.0.1", 65536, resume=True, spec="tcp:1-100")
+    assert resumed.done_count("10.0.0.1") == 50
+    assert resumed.is_done("10.0.0.1", 50) and not resumed.is_done("10.0.0.1", 51)
+    assert resumed.hits("10.0.0.1") == [22, 25]
+
+
+def test_state_for_a_different_spec_is_not_resumed(tmp_path):
+    path = str(tmp_path / "state")
+    checkpoint = ScanCheckpoint.load(path, "ports")
+    checkpoint.start("10.0.0.1", 65536, spec="tcp:1-100")
+    checkpoint.mark("10.0.0.1", 22, hit=True)
+    checkpoint.save()
+
+    resumed = ScanCheckpoint.load(path, "ports")
+    resumed.start("10.0.0.1", 65536, resume=True, spec="tcp:1-1000")
+    assert resumed.done_count("10.0.0.1") == 0
+
+
+def test_start_without_resume_discards_progress(tmp_path):
+    path = str(tmp_path / "state")
+    checkpoint = ScanCheckpoint.load(path, "ports")
+    checkpoint.start("10.0.0.1", 65536)
+    checkpoint.mark("10.0.0.1", 80)
+    checkpoint.save()
+
+    fresh = ScanCheckpoint.load(path, "ports")
+    fresh.start("10.0.0.1", 65536, resume=False)
+    assert fresh.done_count("10.0.0.1") == 0
+
+
+def test_finish_removes_the_state_file(tmp_path):
+    path = tmp_path / "state"
+    checkpoint = ScanCheckpoint.load(str(path), "ports")
+    checkpoint.start("10.0.0.1", 65536)
+    checkpoint.mark("10.0.0.1", 80)
+    checkpoint.save()
+    assert path.exists()
+    checkpoint.finish("10.0.0.1")
+    assert not path.exists()
+
+
+def test_state_of_another_kind_is_ignored(tmp_path):
+    path = tmp_path / "state"
+    path.write_text(json.dumps({"version": 1, "kind": "network", "targets": {}}))
+    assert ScanCheckpoint.load(str(path), "ports").targets == {}
@@ -0,0 +1,83 @@
+"""
+Tests for scan_jobs: cancelling running scans and listing job summaries.
+Run with: python -m pytest test_scan_jobs.py
+"""
+
+import ipaddress
+import time
+
+import pytest
+
+import scan_jobs
+from scan_jobs import ScanJobManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    jobs = ScanJobManager(max_workers=1, db_path=str(tmp_path / "jobs.db"),
+                          networks=[ipaddress.ip_network("127.0.0.0/8")])
+    yield jobs
+    jobs.shutdown()
+
+
+def wait_for(job, states, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in states and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return job.status
+
+
+def test_cancel_stops_a_scan_that_produces_no_events(manager):
+    # Closed UDP ports on loopback never answer, so the scan emits nothing until its retries run out
+    job = manager.submit("ports", {"target": "127.0.0.1", "ports": "U:40000-40100", "timeout": 5})
+    assert wait_for(job, ("running",)) == "running"
+    time.sleep(0.3)
+    cancelled_at = time.monotonic()
+    manager.cancel(job.job_id)
+    assert wait_for(job, ("cancelled", "completed", "failed")) == "cancelled"
+    assert time.monotonic() - cancelled_at < 1.0
+
+
+def test_list_jobs_returns_summaries_without_results(manager, tmp_path):
+    job = manager.submit("ports", {"target": "127.0.0.1", "ports": "1-20"})
+    assert wait_for(job, ("completed",)) == "completed"
+
+    [summary] = manager.list_jobs()
+    assert summary["job_id"] == job.job_id and summary["status"] == "completed"
+    assert "results" not in summary
+
+    # A job no longer in memory is summarized straight from the database
+    other = ScanJobManager(max_workers=1, db_path=str(tmp_path / "jobs.db"),
+                           networks=[ipaddress.ip_network("127.0.0.0/8")])
+    try:
+        [stored] = other.list_jobs()
+        assert "results" not in stored
+        assert stored["result_count"] == summary["result_count"]
+        assert stored["params"] == summary["params"] and stored["progress"] == summary["progress"]
+    finally:
+        other.shutdown()
+
+
+class HeldExecutor:
+    """Keeps submitted calls queued until the test runs them."""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn, *args))
+
+
+def test_jobs_cancelled_while_queued_are_evicted(manager, monkeypatch):
+    monkeypatch.setattr(scan_jobs, "MAX_CACHED_JOBS", 0)
+    held = HeldExecutor()
+    monkeypatch.setattr(manager, "executor", held)
+    job = manager.submit("ports", {"target": "127.0.0.1", "ports": "1-20"})
+    manager.cancel(job.job_id)
+    assert job.status == "cancelled" and job.job_id in manager.jobs
+
+    # The worker reaches the cancelled job and returns without running it
+    [(run, queued_job)] = held.calls
+    run(queued_job)
+    assert job.job_id not in manager.jobs
+    assert manager.get(job.job_id).status == "cancelled", "still readable from the database"
@@ -0,0 +1,86 @@
+"""
+Tests for scan_tool: the network allowlist, the per-target result cache and
+one scan per target at a time.
+Run with: python -m pytest test_scan_tool.py
+"""
+
+import ipaddress
+import json
+import threading
+import time
+
+import pytest
+
+import scan_tool
+from scan_tool import PortScanTool, allowed_networks, parse_networks
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    """Replace the engine with a slow stub that reports port 22 open and records overlap per target."""
+    record = {'calls': [], 'active': {}, 'overlap': False}
+    lock = threading.Lock()
+
+    def iter_scan(ip, spec, timeout=1.0):
+        with lock:
+            record['calls'].append(ip)
+            record['active'][ip] = record['active'].get(ip, 0) + 1
+            record['overlap'] |= record['active'][ip] > 1
+        time.sleep(0.2)
+        with lock:
+            record['active'][ip] -= 1
+        for port in spec.iter_ports('tcp'):
+            if port == 22:
+                yield {'type': 'port', 'protocol': 'tcp', 'port': 22, 'service': 'SSH'}
+
+    monkeypatch.setattr(scan_tool, "iter_scan", iter_scan)
+    return record
+
+
+def tool(**kwargs):
+    return PortScanTool(networks=[ipaddress.ip_network("127.0.0.0/8")], ttl=60, **kwargs)
+
+
+def test_invalid_allowlist_disables_scanning_instead_of_raising(monkeypatch, capsys):
+    monkeypatch.setenv("SCAN_ALLOWED_NETWORKS", "10.0.0.0/8, 192.168.1.0/33")
+    assert allowed_networks() == []
+    assert "192.168.1.0/33" in capsys.readouterr().out
+    with pytest.raises(ValueError, match="192.168.1.0/33"):
+        parse_networks("10.0.0.0/8, 192.168.1.0/33")
+    assert parse_networks(" 10.0.0.0/8,,192.168.1.7/24 ") == [ipaddress.ip_network("10.0.0.0/8"),
+                                                               ipaddress.ip_network("192.168.1.0/24")]
+
+
+def test_targets_outside_the_allowlist_are_refused(scans):
+    result = json.loads(tool().run("8.8.8.8", "22"))
+    assert "outside the networks" in result['error']
+    assert json.loads(PortScanTool(networks=[]).run("127.0.0.1", "22"))['error']
+    assert scans['calls'] == []
+
+
+def test_repeated_checks_are_answered_from_the_cache(scans):
+    scanner = tool()
+    first = scanner.check("127.0.0.1", "22,80")
+    assert first['open'] == [{'port': 22, 'protocol': 'tcp', 'service': 'SSH'}]
+    assert first['from_cache'] == 0
+    second = scanner.check("127.0.0.1", "22,80,443")
+    assert second['from_cache'] == 2 and second['ports_checked'] == 3
+    assert scans['calls'] == ["127.0.0.1", "127.0.0.1"]
+
+
+def test_evicting_a_target_does_not_split_its_lock(monkeypatch, scans):
+    monkeypatch.setattr(scan_tool, "MAX_CACHED_TARGETS", 1)
+    scanner = tool(max_concurrent=4)
+    threads = [threading.Thread(target=scanner.check, args=("127.0.0.1", "22"))]
+    threads[0].start()
+    time.sleep(0.05)
+    # Evicts 127.0.0.1's results while its scan is still running
+    threads.append(threading.Thread(target=scanner.check, args=("127.0.0.2", "22")))
+    threads[1].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=scanner.check, args=("127.0.0.1", "80")))
+    threads[2].start()
+    for thread in threads:
+        thread.join()
+    assert not scans['overlap'], "two scans of the same target ran at once"
+    assert set(scanner.target_locks) <= set(scanner.cache)